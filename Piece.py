@@ -5,9 +5,15 @@
 
 # General chess piece
 from enums import Player
+from attack_tables import KNIGHT_TARGETS, KING_TARGETS
+import bitboard
 
 
 class Piece:
+    # Fixed attribute slots instead of a dictionary per piece; every subclass declares its own __slots__ too,
+    # or its pieces would get a dictionary back
+    __slots__ = ("_name", "row_number", "col_number", "_player")
+
     # Initialize the piece
     def __init__(self, name, row_number, col_number, player):
         self._name = name
@@ -55,9 +61,20 @@ class Piece:
     def get_valid_piece_moves(self, board):
         pass
 
+    # Split an attack bitboard into moves to empty squares and takes of opposing pieces
+    # the occupancy comes from the game state's bitboards, which set_piece and the moves keep in step with the board
+    def split_attacks(self, game_state, attacks):
+        opposing_pieces = game_state.get_occupancy(bitboard.opponent(self.get_player()))
+        _peaceful_moves = [bitboard.SQUARES[square] for square in
+                           bitboard.bitboard_squares(attacks & ~game_state.get_occupancy())]
+        _piece_takes = [bitboard.SQUARES[square] for square in bitboard.bitboard_squares(attacks & opposing_pieces)]
+        return (_peaceful_moves, _piece_takes)
+
 
 # Rook (R)
 class Rook(Piece):
+    __slots__ = ("has_moved",)
+
     def __init__(self, name, row_number, col_number, player):
         super().__init__(name, row_number, col_number, player)
         self.has_moved = False
@@ -69,107 +86,34 @@ class Rook(Piece):
         return self.traverse(game_state)[1]
 
     def get_valid_piece_moves(self, game_state):
-        return self.get_valid_peaceful_moves(game_state) + self.get_valid_piece_takes(game_state)
+        # one traversal for both lists
+        _peaceful_moves, _piece_takes = self.traverse(game_state)
+        return _peaceful_moves + _piece_takes
 
     def traverse(self, game_state):
-        _peaceful_moves = []
-        _piece_takes = []
-
-        self._up = 1
-        self._down = 1
-        self._left = 1
-        self._right = 1
-
-        # Left of the Rook
-        self._breaking_point = False
-        while self.get_col_number() - self._left >= 0 and not self._breaking_point:
-            # when the square to the left is empty
-            if game_state.get_piece(self.get_row_number(), self.get_col_number() - self._left) is Player.EMPTY:
-                _peaceful_moves.append((self.get_row_number(), self.get_col_number() - self._left))
-                self._left += 1
-            # when the square contains an opposing piece
-            elif game_state.is_valid_piece(self.get_row_number(), self.get_col_number() - self._left) and \
-                    not game_state.get_piece(self.get_row_number(), self.get_col_number() - self._left).is_player(self.get_player()):
-                _piece_takes.append((self.get_row_number(), self.get_col_number() - self._left))
-                self._breaking_point = True
-            else:
-                self._breaking_point = True
-
-        # Right of the Rook
-        self._breaking_point = False
-        while self.get_col_number() + self._right < 8 and not self._breaking_point:
-            # when the square to the left is empty
-            if game_state.get_piece(self.get_row_number(), self.get_col_number() + self._right) is Player.EMPTY:
-                _peaceful_moves.append((self.get_row_number(), self.get_col_number() + self._right))
-                self._right += 1
-            # when the square contains an opposing piece
-            elif game_state.is_valid_piece(self.get_row_number(), self.get_col_number() + self._right) and \
-                    not game_state.get_piece(self.get_row_number(), self.get_col_number() + self._right).is_player(self.get_player()):
-                _piece_takes.append((self.get_row_number(), self.get_col_number() + self._right))
-                self._breaking_point = True
-            else:
-                self._breaking_point = True
-
-        # Below the Rook
-        self._breaking_point = False
-        while self.get_row_number() + self._down < 8 and not self._breaking_point:
-            # when the square to the left is empty
-            if game_state.get_piece(self.get_row_number() + self._down, self.get_col_number()) is Player.EMPTY:
-                _peaceful_moves.append((self.get_row_number() + self._down, self.get_col_number()))
-                self._down += 1
-            # when the square contains an opposing piece
-            elif game_state.is_valid_piece(self.get_row_number() + self._down, self.get_col_number()) and \
-                    not game_state.get_piece(self.get_row_number() + self._down, self.get_col_number()).is_player(self.get_player()):
-                _piece_takes.append((self.get_row_number() + self._down, self.get_col_number()))
-                self._breaking_point = True
-            else:
-                self._breaking_point = True
-
-        # Above the Rook
-        self._breaking_point = False
-        while self.get_row_number() - self._up >= 0 and not self._breaking_point:
-            # when the square to the left is empty
-            if game_state.get_piece(self.get_row_number() - self._up, self.get_col_number()) is Player.EMPTY:
-                _peaceful_moves.append((self.get_row_number() - self._up, self.get_col_number()))
-                self._up += 1
-            # when the square contains an opposing piece
-            elif game_state.is_valid_piece(self.get_row_number() - self._up, self.get_col_number()) and \
-                    not game_state.get_piece(self.get_row_number() - self._up, self.get_col_number()).is_player(self.get_player()):
-                _piece_takes.append((self.get_row_number() - self._up, self.get_col_number()))
-                self._breaking_point = True
-            else:
-                self._breaking_point = True
-        return (_peaceful_moves, _piece_takes)
+        return self.split_attacks(game_state, bitboard.rook_attacks(
+            bitboard.square_index(self.get_row_number(), self.get_col_number()), game_state.get_occupancy()))
 
 
 # Knight (N)
 class Knight(Piece):
+    __slots__ = ()
+
     def get_valid_peaceful_moves(self, game_state):
         _moves = []
-        row_change = [-2, -2, -1, -1, +1, +1, +2, +2]
-        col_change = [-1, +1, -2, +2, -2, +2, +1, -1]
-
-        for i in range(0, 8):
-            new_row = self.get_row_number() + row_change[i]
-            new_col = self.get_col_number() + col_change[i]
-            evaluating_square = game_state.get_piece(new_row, new_col)
-            # when the square with new_row and new_col is empty
-            if evaluating_square == Player.EMPTY:
-                _moves.append((new_row, new_col))
+        for square in KNIGHT_TARGETS[self.get_row_number()][self.get_col_number()]:
+            # when the square is empty
+            if game_state.get_piece(square[0], square[1]) is Player.EMPTY:
+                _moves.append(square)
         return _moves
 
     def get_valid_piece_takes(self, game_state):
         _moves = []
-        row_change = [-2, -2, -1, -1, +1, +1, +2, +2]
-        col_change = [-1, +1, -2, +2, -2, +2, +1, -1]
-
-        for i in range(0, 8):
-            new_row = self.get_row_number() + row_change[i]
-            new_col = self.get_col_number() + col_change[i]
-            evaluating_square = game_state.get_piece(new_row, new_col)
-            # when the square with new_row and new_col contains a valid piece and the player is different
-            if game_state.is_valid_piece(new_row, new_col) and self.get_player() is not evaluating_square.get_player():
-                _moves.append((new_row, new_col))
+        for square in KNIGHT_TARGETS[self.get_row_number()][self.get_col_number()]:
+            evaluating_square = game_state.get_piece(square[0], square[1])
+            # when the square contains a valid piece and the player is different
+            if evaluating_square is not Player.EMPTY and not evaluating_square.is_player(self.get_player()):
+                _moves.append(square)
         return _moves
 
     def get_valid_piece_moves(self, game_state):
@@ -199,6 +143,8 @@ class Knight(Piece):
         return self.get_valid_peaceful_moves(game_state) + self.get_valid_piece_takes(game_state)
 # Bishop
 class Bishop(Piece):
+    __slots__ = ()
+
     def __init__(self, name, row_number, col_number, player):
         super().__init__(name, row_number, col_number, player)
 
@@ -209,97 +155,18 @@ class Bishop(Piece):
         return self.traverse(game_state)[0]
 
     def get_valid_piece_moves(self, game_state):
-        return self.get_valid_piece_takes(game_state) + self.get_valid_peaceful_moves(game_state)
+        _peaceful_moves, _piece_takes = self.traverse(game_state)
+        return _piece_takes + _peaceful_moves
 
     def traverse(self, game_state):
-        _peaceful_moves = []
-        _piece_takes = []
-
-        self._breaking_point = False
-        self._up = 1
-        self._down = 1
-        self._left = 1
-        self._right = 1
-        while self.get_col_number() - self._left >= 0 and self.get_row_number() - self._up >= 0 and not self._breaking_point:
-            # when the square is empty
-            if game_state.get_piece(self.get_row_number() - self._up, self.get_col_number() - self._left) is Player.EMPTY:
-                _peaceful_moves.append((self.get_row_number() - self._up, self.get_col_number() - self._left))
-                self._left += 1
-                self._up += 1
-            # when the square contains an opposing piece
-            elif game_state.is_valid_piece(self.get_row_number() - self._up, self.get_col_number() - self._left) and \
-                    not game_state.get_piece(self.get_row_number() - self._up, self.get_col_number() - self._left).is_player(self.get_player()):
-                _piece_takes.append((self.get_row_number() - self._up, self.get_col_number() - self._left))
-                self._breaking_point = True
-            else:
-                self._breaking_point = True
-
-        # Right up of the bishop
-        self._breaking_point = False
-        self._up = 1
-        self._down = 1
-        self._left = 1
-        self._right = 1
-        while self.get_col_number() + self._right < 8 and self.get_row_number() - self._up >= 0 and not self._breaking_point:
-            # when the square is empty
-            if game_state.get_piece(self.get_row_number() - self._up, self.get_col_number() + self._right) is Player.EMPTY:
-                _peaceful_moves.append((self.get_row_number() - self._up, self.get_col_number() + self._right))
-                self._right += 1
-                self._up += 1
-            # when the square contains an opposing piece
-            elif game_state.is_valid_piece(self.get_row_number() - self._up, self.get_col_number() + self._right) and \
-                    not game_state.get_piece(self.get_row_number() - self._up, self.get_col_number() + self._right).is_player(self.get_player()):
-                _piece_takes.append((self.get_row_number() - self._up, self.get_col_number() + self._right))
-                self._breaking_point = True
-            else:
-                self._breaking_point = True
-
-        # Down left of the bishop
-        self._breaking_point = False
-        self._up = 1
-        self._down = 1
-        self._left = 1
-        self._right = 1
-        while self.get_col_number() - self._left >= 0 and self.get_row_number() + self._down < 8 and not self._breaking_point:
-            # when the square is empty
-            if game_state.get_piece(self.get_row_number() + self._down, self.get_col_number() - self._left) is Player.EMPTY:
-                _peaceful_moves.append((self.get_row_number() + self._down, self.get_col_number() - self._left))
-                self._down += 1
-                self._left += 1
-            # when the square contains an opposing piece
-            elif game_state.is_valid_piece(self.get_row_number() + self._down, self.get_col_number() - self._left) and \
-                    not game_state.get_piece(self.get_row_number() + self._down, self.get_col_number() - self._left).is_player(self.get_player()):
-                _piece_takes.append((self.get_row_number() + self._down, self.get_col_number() - self._left))
-                self._breaking_point = True
-            else:
-                self._breaking_point = True
-
-        # Down right of the bishop
-        self._breaking_point = False
-        self._up = 1
-        self._down = 1
-        self._left = 1
-        self._right = 1
-        while self.get_col_number() + self._right < 8 and self.get_row_number() + self._down < 8 and not self._breaking_point:
-            # when the square is empty
-            if game_state.get_piece(self.get_row_number() + self._down, self.get_col_number() + self._right) is Player.EMPTY:
-                _peaceful_moves.append((self.get_row_number() + self._down, self.get_col_number() + self._right))
-                self._down += 1
-                self._right += 1
-            # when the square contains an opposing piece
-            elif game_state.is_valid_piece(self.get_row_number() + self._down, self.get_col_number() + self._right) and \
-                    not game_state.get_piece(self.get_row_number() + self._down, self.get_col_number() + self._right).is_player(
-                        self.get_player()):
-                _piece_takes.append((self.get_row_number() + self._down, self.get_col_number() + self._right))
-                self._breaking_point = True
-            else:
-                self._breaking_point = True
-        return (_peaceful_moves, _piece_takes)
-
+        return self.split_attacks(game_state, bitboard.bishop_attacks(
+            bitboard.square_index(self.get_row_number(), self.get_col_number()), game_state.get_occupancy()))
 
 
 # Pawn
 class Pawn(Piece):
+    __slots__ = ()
+
     def get_valid_piece_takes(self, game_state):
         _moves = []
         if self.is_player(Player.PLAYER_1):
@@ -408,58 +275,39 @@ class Pawn(Piece):
 
 # Queen
 class Queen(Rook, Bishop):
-    def get_valid_peaceful_moves(self, game_state):
-        return (Rook.get_valid_peaceful_moves(Rook(self.get_name(), self.get_row_number(), self.get_col_number(), self.get_player()), game_state) +
-                Bishop.get_valid_peaceful_moves(Bishop(self.get_name(), self.get_row_number(), self.get_col_number(), self.get_player()), game_state))
-
-    def get_valid_piece_takes(self, game_state):
-        return (Rook.get_valid_piece_takes( Rook(self.get_name(), self.get_row_number(), self.get_col_number(), self.get_player()), game_state) +
-                Bishop.get_valid_piece_takes(Bishop(self.get_name(), self.get_row_number(), self.get_col_number(), self.get_player()), game_state))
+    __slots__ = ()
 
-    def get_valid_piece_moves(self, game_state):
-        return (Rook.get_valid_piece_moves(Rook(self.get_name(), self.get_row_number(), self.get_col_number(), self.get_player()), game_state) +
-                Bishop.get_valid_piece_moves(Bishop(self.get_name(), self.get_row_number(), self.get_col_number(), self.get_player()), game_state))
+    # one lookup covers both the rook and the bishop lines
+    def traverse(self, game_state):
+        return self.split_attacks(game_state, bitboard.queen_attacks(
+            bitboard.square_index(self.get_row_number(), self.get_col_number()), game_state.get_occupancy()))
 
 # King
 class King(Piece):
+    __slots__ = ()
+
     def get_valid_piece_takes(self, game_state):
         _moves = []
-        row_change = [-1, +0, +1, -1, +1, -1, +0, +1]
-        col_change = [-1, -1, -1, +0, +0, +1, +1, +1]
-
-        for i in range(0, 8):
-            new_row = self.get_row_number() + row_change[i]
-            new_col = self.get_col_number() + col_change[i]
-            evaluating_square = game_state.get_piece(new_row, new_col)
-            # when the square with new_row and new_col contains a valid piece
-            if game_state.is_valid_piece(new_row, new_col):
-                # when the king is white and the piece near the king is black
-                if self.is_player(Player.PLAYER_1) and evaluating_square.is_player(Player.PLAYER_2):
-                    _moves.append((new_row, new_col))
-                # when the king is black and the piece near the king is white
-                elif self.is_player(Player.PLAYER_2) and evaluating_square.is_player(Player.PLAYER_1):
-                    _moves.append((new_row, new_col))
+        for square in KING_TARGETS[self.get_row_number()][self.get_col_number()]:
+            evaluating_square = game_state.get_piece(square[0], square[1])
+            # when the square contains a piece of the other player
+            if evaluating_square is not Player.EMPTY and not evaluating_square.is_player(self.get_player()):
+                _moves.append(square)
         return _moves
 
     def get_valid_peaceful_moves(self, game_state):
         _moves = []
-        row_change = [-1, +0, +1, -1, +1, -1, +0, +1]
-        col_change = [-1, -1, -1, +0, +0, +1, +1, +1]
-
-        for i in range(0, 8):
-            new_row = self.get_row_number() + row_change[i]
-            new_col = self.get_col_number() + col_change[i]
-            evaluating_square = game_state.get_piece(new_row, new_col)
-            # when the square with new_row and new_col is empty
-            if evaluating_square == Player.EMPTY:
-                _moves.append((new_row, new_col))
+        for square in KING_TARGETS[self.get_row_number()][self.get_col_number()]:
+            # when the square is empty
+            if game_state.get_piece(square[0], square[1]) is Player.EMPTY:
+                _moves.append(square)
 
         if game_state.king_can_castle_left(self.get_player()):
             if self.is_player(Player.PLAYER_1):
                 _moves.append((0, 1))
             elif self.is_player(Player.PLAYER_2):
                 _moves.append((7, 1))
-        elif game_state.king_can_castle_right(self.get_player()):
+        if game_state.king_can_castle_right(self.get_player()):
             if self.is_player(Player.PLAYER_1):
                 _moves.append((0, 5))
             elif self.is_player(Player.PLAYER_2):
@@ -1,136 +1,645 @@
 #
 # The Chess AI class
-# Will utilize minimax and alpha beta pruning
+# Will utilize negamax and alpha beta pruning
 #
 # Author: Boo Sung Kim
 # Note: Code inspired from the pseudocode by Sebastian Lague
 # from enums import Player
-# TODO: switch undo moves to stack data structure
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
 import chess_engine
-from enums import Player
+import evaluation
+import moves
+from enums import Player, Bound
+from evaluation_cache import evaluation_cache
+from transposition_table import transposition_table, shared_transposition_table
+
+
+# piece values used to sort captures, most valuable victim first and then least valuable attacker first
+_ORDERING_VALUES = {"p": 10, "n": 30, "b": 30, "r": 50, "q": 100, "k": 1000}
+# how far down the list of moves each kind of move is tried, see _order_moves
+_HASH_MOVE_ORDER = 3
+_CAPTURE_ORDER = 2
+_KILLER_ORDER = 1
+_QUIET_ORDER = 0
+_MAX_PLY = 64
+# a capture is skipped in the quiescence search when even winning the victim and this much more cannot raise the score
+_DELTA_MARGIN = 20
+# the score of being checkmated at the root, a mate n plies away scores MATE_SCORE - n for the winning side
+MATE_SCORE = 5000000
+# searched depth when search() is given neither a depth nor a budget
+DEFAULT_DEPTH = 3
+# late move reductions start with this move in the ordered list, at nodes with at least _REDUCTION_DEPTH plies left
+_REDUCTION_MOVE = 3
+_REDUCTION_DEPTH = 3
+# margins by plies left for futility pruning and razoring, in evaluate_board units (a pawn is 10)
+_FUTILITY_MARGINS = (0, 30, 50)
+_RAZOR_MARGINS = (0, 40, 60)
+
+
+class _search_aborted(Exception):
+    # raised inside the search when the time or node budget runs out
+    pass
+
+
+# set in every worker process of chess_ai.parallel_search: the alpha shared by the root moves being searched
+# and the AI doing the searching, whose transposition table is the shared one every worker probes and stores into
+_worker_alpha = None
+_worker_ai = None
+
+
+def _initialize_worker(shared_alpha, table_name, options):
+    global _worker_alpha, _worker_ai
+    _worker_alpha = shared_alpha
+    _worker_ai = chess_ai(options=options, table=shared_transposition_table(name=table_name))
+
+
+def _search_root_move(position, move, depth, deadline):
+    '''
+    search one root move (packed) of a serialized position in a worker process
+    the move is first searched with a null window at the best score any worker has found so far for this depth,
+    and only searched with a full window if it beats it
+    returns (move, score, principal variation, nodes), the score is None if the deadline passed first
+    '''
+    game_state = chess_engine.game_state.deserialize(position)
+    ai = _worker_ai
+    ai.nodes = 0
+    ai._deadline = deadline
+    alpha = _worker_alpha.value
+    game_state.make_move(move)
+    try:
+        score = -ai._negamax(game_state, depth - 1, -alpha - 1, -alpha, 1)
+        if score > alpha:
+            score = -ai._negamax(game_state, depth - 1, -MATE_SCORE - 1, -alpha, 1)
+    except _search_aborted:
+        return move, None, [], ai.nodes
+    finally:
+        ai._deadline = None
+    with _worker_alpha.get_lock():
+        if score > _worker_alpha.value:
+            _worker_alpha.value = score
+    return move, score, [move] + ai._principal_variations[1], ai.nodes
+
+
+class search_options:
+    '''
+    switches for the parts of the search that can be turned off, e.g. to compare node counts with and without them
+    quiescence: search captures at the leaves instead of evaluating the position as it stands
+    principal_variation_search: search every move after the first with a null window, again with the full
+    window only if it turns out better
+    aspiration_windows: search each depth after the first in a window of aspiration_window around the score of
+    the depth before, widening it when the score falls outside
+    null_move_pruning: let the side to move pass and search the reply null_move_reduction plies shallower,
+    if the position still holds beta the node is cut off without searching its moves
+    late_move_reductions: search quiet moves late in the ordered list one ply shallower, and again at full depth
+    only if they turn out to beat alpha
+    futility_pruning: one or two plies from the leaves, skip the quiet moves that do not give check when the static
+    evaluation is so far below alpha that even a margin of a minor piece (rook two plies out) would not reach it
+    razoring: one or two plies from the leaves, when the static evaluation is far below alpha, ask the quiescence
+    search first and give up on the node if it confirms the score stays below alpha
+    piece_square_tables: add the piece-square scores of evaluation to the material when evaluating a position
+    pawn_structure: add the doubled, isolated and passed pawn terms, looked up in the pawn hash table
+    with both turned off the evaluation is material only, as evaluate_board counts it
+    evaluation_cache: remember the evaluation of every position by its zobrist key
+    '''
+    def __init__(self, quiescence=True, principal_variation_search=True, aspiration_windows=True,
+                 aspiration_window=15, null_move_pruning=True, null_move_reduction=2, late_move_reductions=True,
+                 futility_pruning=True, razoring=True, piece_square_tables=True, pawn_structure=True,
+                 evaluation_cache=True):
+        self.quiescence = quiescence
+        self.principal_variation_search = principal_variation_search
+        self.aspiration_windows = aspiration_windows
+        self.aspiration_window = aspiration_window
+        self.null_move_pruning = null_move_pruning
+        self.null_move_reduction = null_move_reduction
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
+        self.razoring = razoring
+        self.piece_square_tables = piece_square_tables
+        self.pawn_structure = pawn_structure
+        self.evaluation_cache = evaluation_cache
+
+
+class search_result:
+    '''
+    what chess_ai.search found for the side to move
+    move: the best move, None if there are no legal moves
+    score: the score of the best move from the side to move's point of view
+    principal_variation: the best move followed by the line both sides are expected to play
+    depth: the last depth searched completely, nodes: positions visited, elapsed: seconds taken
+    '''
+    def __init__(self, move, score, principal_variation, depth, nodes, elapsed):
+        self.move = move
+        self.score = score
+        self.principal_variation = principal_variation
+        self.depth = depth
+        self.nodes = nodes
+        self.elapsed = elapsed
 
 
 class chess_ai:
     '''
-    call minimax with alpha beta pruning
+    call negamax with alpha beta pruning
     evaluate board
     get the value of each piece
     '''
-    def minimax_white(self, game_state, depth, alpha, beta, maximizing_player, player_color):
-        csc = game_state.checkmate_stalemate_checker()
-        if maximizing_player:
-            if csc == 0:
-                return 5000000
-            elif csc == 1:
-                return -5000000
-            elif csc == 2:
-                return 100
-        elif not maximizing_player:
-            if csc == 1:
-                return 5000000
-            elif csc == 0:
-                return -5000000
-            elif csc == 2:
-                return 100
-
-        if depth <= 0 or csc != 3:
-            return self.evaluate_board(game_state, Player.PLAYER_1)
-
-        if maximizing_player:
-            max_evaluation = -10000000
-            all_possible_moves = game_state.get_all_legal_moves("black")
-            for move_pair in all_possible_moves:
-                game_state.move_piece(move_pair[0], move_pair[1], True)
-                evaluation = self.minimax_white(game_state, depth - 1, alpha, beta, False, "white")
-                game_state.undo_move()
+    # tt_size_mb is the memory budget of the transposition table shared by every search of this AI
+    # options is a search_options, the defaults turn everything on
+    # table is a transposition table to search with instead of a new one, such as a shared_transposition_table
+    # evaluation_cache_kb and pawn_hash_kb are the memory budgets of the evaluation cache and the pawn hash table
+    def __init__(self, tt_size_mb=16, options=None, table=None, evaluation_cache_kb=1024, pawn_hash_kb=256):
+        self.transposition_table = table if table is not None else transposition_table(tt_size_mb)
+        self.evaluation_cache = evaluation_cache(evaluation_cache_kb)
+        self.pawn_hash_table = evaluation_cache(pawn_hash_kb)
+        self.tt_size_mb = tt_size_mb
+        self.options = options if options is not None else search_options()
+        # the worker processes of parallel_search with the alpha and the transposition table they share,
+        # started on first use
+        self._pool = None
+        self._pool_workers = 0
+        self._shared_alpha = None
+        self._shared_table = None
+        self.nodes = 0
+        # moves searched again with the full window after a null window search, and aspiration windows that failed
+        self.re_searches = 0
+        self.aspiration_failures = 0
+        # null moves tried and how many of them cut the node off
+        self.null_move_searches = 0
+        self.null_move_cutoffs = 0
+        # moves searched with a reduced depth and how many of them had to be searched again at full depth
+        self.reductions = 0
+        self.reduction_re_searches = 0
+        # quiet moves skipped by futility pruning, and nodes razoring gave up on
+        self.futility_prunes = 0
+        self.razor_cutoffs = 0
+        # two quiet moves per ply that caused a cutoff, and a score per (starting square, ending square) of how often
+        # and how deep quiet moves caused cutoffs, both used to order the quiet moves
+        self.killer_moves = [[None, None] for _ in range(_MAX_PLY)]
+        self.history = [0] * 4096
+        # how many nodes were cut off and how many of them on the first move searched
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # the principal variation found below each ply of the current search
+        self._principal_variations = [[] for _ in range(_MAX_PLY + 1)]
+        # set by search while it runs, so the later depths can be cut short
+        self._deadline = None
+        self._node_limit = None
 
-                if max_evaluation < evaluation:
-                    max_evaluation = evaluation
-                    best_possible_move = move_pair
-                alpha = max(alpha, evaluation)
-                if beta <= alpha:
+    def search(self, game_state, depth=None, time_limit=None, node_limit=None):
+        '''
+        search the position for the side to move, deepening one ply at a time from depth 1
+        stops after depth, or when time_limit seconds or node_limit nodes are used up, whichever comes first
+        without a depth or a budget DEFAULT_DEPTH is searched
+        returns a search_result for the last depth that was searched completely; depth 1 always completes,
+        so a move is returned however small the budget is
+        '''
+        if depth is None:
+            depth = DEFAULT_DEPTH if time_limit is None and node_limit is None else _MAX_PLY
+        depth = min(depth, _MAX_PLY)
+        root_moves = len(game_state.move_log)
+        self.nodes = 0
+        self.re_searches = 0
+        self.aspiration_failures = 0
+        self.null_move_searches = 0
+        self.null_move_cutoffs = 0
+        self.reductions = 0
+        self.reduction_re_searches = 0
+        self.futility_prunes = 0
+        self.razor_cutoffs = 0
+        self.reset_move_ordering()
+        start_time = time.perf_counter()
+
+        result = search_result(None, 0, [], 0, 0, 0.0)
+        player = Player.PLAYER_1 if game_state.whose_turn() else Player.PLAYER_2
+        if game_state.get_all_legal_moves(player):
+            for iteration_depth in range(1, depth + 1):
+                try:
+                    if self.options.aspiration_windows and iteration_depth > 1:
+                        score = self._aspiration_search(game_state, iteration_depth, result.score)
+                    else:
+                        score = self._negamax(game_state, iteration_depth, -MATE_SCORE - 1, MATE_SCORE + 1, 0)
+                except _search_aborted:
+                    # unwind the moves the interrupted search left on the board
+                    while len(game_state.move_log) > root_moves:
+                        game_state.undo_move()
+                    break
+                finally:
+                    self._deadline = None
+                    self._node_limit = None
+                principal_variation = [moves.decode_move(move) for move in self._principal_variations[0]]
+                result = search_result(principal_variation[0], score, principal_variation, iteration_depth,
+                                       self.nodes, time.perf_counter() - start_time)
+                if (time_limit is not None and time.perf_counter() - start_time >= time_limit) or \
+                        (node_limit is not None and self.nodes >= node_limit):
                     break
-            if depth == 3:
-                return best_possible_move
+                # the later depths may be stopped part way through
+                if time_limit is not None:
+                    self._deadline = start_time + time_limit
+                self._node_limit = node_limit
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start_time
+        return result
+
+    def parallel_search(self, game_state, depth=None, time_limit=None, workers=None):
+        '''
+        like search, but the root moves of every depth are shared out to a pool of worker processes
+        (os.cpu_count() unless workers is given), each searching its own copy of the position with one
+        transposition table in shared memory, so what one worker learns is found by the others
+        the best move of the depth before is searched first on its own, so the other root moves start with its score
+        as alpha, and every root move that finishes raises the alpha the workers share
+        returns a search_result for the last depth every root move finished; call close() to stop the workers
+        '''
+        if depth is None:
+            depth = DEFAULT_DEPTH if time_limit is None else _MAX_PLY
+        depth = min(depth, _MAX_PLY)
+        start_time = time.perf_counter()
+        deadline = start_time + time_limit if time_limit is not None else None
+        pool = self._get_pool(workers or os.cpu_count() or 1)
+        position = game_state.serialize()
+        player = Player.PLAYER_1 if game_state.whose_turn() else Player.PLAYER_2
+        root_moves = game_state.get_all_legal_moves(player, packed=True)
+        self.nodes = 0
+
+        result = search_result(None, 0, [], 0, 0, 0.0)
+        best_move = None
+        for iteration_depth in range(1, depth + 1 if root_moves else 1):
+            ordered_moves = self._order_moves(game_state, list(root_moves), best_move, 0)
+            # depth 1 always completes, so a move is returned however small the budget is
+            iteration_deadline = deadline if iteration_depth > 1 else None
+            self._shared_alpha.value = -MATE_SCORE - 1
+            first = pool.submit(_search_root_move, position, ordered_moves[0], iteration_depth,
+                                iteration_deadline).result()
+            results = [first]
+            if first[1] is not None:
+                futures = [pool.submit(_search_root_move, position, move, iteration_depth, iteration_deadline)
+                           for move in ordered_moves[1:]]
+                results += [future.result() for future in futures]
+            self.nodes += sum(root_result[3] for root_result in results)
+            if any(root_result[1] is None for root_result in results):
+                break
+            best = results[0]
+            for root_result in results[1:]:
+                if root_result[1] > best[1]:
+                    best = root_result
+            best_move = best[0]
+            result = search_result(moves.decode_move(best[0]), best[1], [moves.decode_move(move) for move in best[2]],
+                                   iteration_depth, 0, 0.0)
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start_time
+        return result
+
+    def _get_pool(self, workers):
+        if self._pool is None or self._pool_workers != workers:
+            self.close()
+            self._shared_alpha = multiprocessing.Value('q', -MATE_SCORE - 1)
+            self._shared_table = shared_transposition_table(self.tt_size_mb)
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_initialize_worker,
+                initargs=(self._shared_alpha, self._shared_table.name, self.options))
+            self._pool_workers = workers
+        return self._pool
+
+    def close(self):
+        # stop the worker processes of parallel_search and free their shared transposition table,
+        # both are started again when needed
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_workers = 0
+            self._shared_table.close()
+            self._shared_table.unlink()
+            self._shared_table = None
+
+    def iterative_deepening(self, game_state, time_limit=None, node_limit=None, max_depth=_MAX_PLY):
+        # the best move search finds within the budget, None if there are no legal moves
+        return self.search(game_state, max_depth, time_limit, node_limit).move
+
+    def _aspiration_search(self, game_state, depth, previous_score):
+        # search the root in a narrow window around the previous depth's score, widening it on the side it failed
+        window = self.options.aspiration_window
+        alpha = max(previous_score - window, -MATE_SCORE - 1)
+        beta = min(previous_score + window, MATE_SCORE + 1)
+        while True:
+            score = self._negamax(game_state, depth, alpha, beta, 0)
+            if score <= alpha and alpha > -MATE_SCORE - 1:
+                self.aspiration_failures += 1
+                window *= 2
+                alpha = max(score - window, -MATE_SCORE - 1)
+            elif score >= beta and beta < MATE_SCORE + 1:
+                self.aspiration_failures += 1
+                window *= 2
+                beta = min(score + window, MATE_SCORE + 1)
             else:
-                return max_evaluation
-        else:
-            min_evaluation = 10000000
-            all_possible_moves = game_state.get_all_legal_moves("white")
-            for move_pair in all_possible_moves:
-                game_state.move_piece(move_pair[0], move_pair[1], True)
-                evaluation = self.minimax_white(game_state, depth - 1, alpha, beta, True, "black")
+                return score
+
+    def _negamax(self, game_state, depth, alpha, beta, ply):
+        '''
+        alpha beta search of the side to move, scores are always from the side to move's point of view
+        so the score of a move is minus the score the opponent gets after it
+        '''
+        self._count_node()
+        self._principal_variations[ply] = []
+        player = Player.PLAYER_1 if game_state.whose_turn() else Player.PLAYER_2
+
+        if depth <= 0 or ply >= _MAX_PLY:
+            return self._leaf_evaluation(game_state, alpha, beta, ply)
+
+        score, alpha, beta, hash_move = self._probe_transposition_table(game_state, depth, alpha, beta, ply)
+        if score is not None:
+            return score
+        window_alpha = alpha
+        in_check = self._in_check(game_state, player)
+        # the static evaluation is only needed, and only meaningful, when not in check
+        static_evaluation = None if in_check else self.evaluate(game_state)
+        frontier = depth < len(_FUTILITY_MARGINS) and ply > 0 and static_evaluation is not None and \
+                   -MATE_SCORE + _MAX_PLY < alpha < MATE_SCORE - _MAX_PLY
+
+        if self.options.razoring and frontier and static_evaluation + _RAZOR_MARGINS[depth] <= alpha:
+            # hopelessly behind: if the captures cannot win the material back either, the node is not worth searching
+            evaluation = self._leaf_evaluation(game_state, alpha, alpha + 1, ply)
+            if evaluation <= alpha:
+                self.razor_cutoffs += 1
+                return evaluation
+
+        if self.options.null_move_pruning and ply > 0 and not in_check and \
+                depth > self.options.null_move_reduction and beta < MATE_SCORE - _MAX_PLY and \
+                game_state.move_log[-1] != moves.NULL_MOVE and self._has_pieces(game_state, player) and \
+                static_evaluation >= beta:
+            # if passing still holds beta, a real move will too (unless it is zugzwang, hence _has_pieces)
+            self.null_move_searches += 1
+            game_state.make_null_move()
+            evaluation = -self._negamax(game_state, depth - 1 - self.options.null_move_reduction, -beta, -beta + 1,
+                                        ply + 1)
+            game_state.undo_move()
+            if evaluation >= beta:
+                self.null_move_cutoffs += 1
+                return beta
+
+        all_possible_moves = game_state.get_all_legal_moves(player, packed=True)
+        if not all_possible_moves:
+            # checkmated, or stalemate when the king is not attacked
+            return -MATE_SCORE + ply if in_check else 0
+
+        best_evaluation = -MATE_SCORE - 1
+        best_possible_move = None
+        principal_variation_search = self.options.principal_variation_search
+        may_reduce = self.options.late_move_reductions and depth >= _REDUCTION_DEPTH and not in_check
+        killers = self.killer_moves[ply] if ply < _MAX_PLY else (None, None)
+        futility_score = static_evaluation + _FUTILITY_MARGINS[depth] if frontier else None
+        # a mate score in the window means the margins say nothing about the outcome
+        futile = self.options.futility_pruning and futility_score is not None and futility_score <= alpha and \
+                 beta < MATE_SCORE - _MAX_PLY
+        opponent = Player.PLAYER_2 if player == Player.PLAYER_1 else Player.PLAYER_1
+        for move_number, move in enumerate(self._order_moves(game_state, all_possible_moves, hash_move, ply)):
+            quiet = not move & (moves.CAPTURE | moves.PROMOTION_MASK)
+            game_state.make_move(move)
+            if futile and quiet and move_number > 0 and not self._in_check(game_state, opponent):
+                # not even the margin would lift this quiet move to alpha, and it does not give check,
+                # so it is not searched
                 game_state.undo_move()
+                self.futility_prunes += 1
+                best_evaluation = max(best_evaluation, futility_score)
+                continue
+            reduce = may_reduce and quiet and move_number >= _REDUCTION_MOVE and move not in killers
+            if move_number == 0:
+                evaluation = -self._negamax(game_state, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                full_depth = True
+                if reduce:
+                    # a quiet move this late in the ordering is unlikely to matter, so first search it shallower
+                    self.reductions += 1
+                    evaluation = -self._negamax(game_state, depth - 2, -alpha - 1, -alpha, ply + 1)
+                    full_depth = evaluation > alpha
+                    if full_depth:
+                        self.reduction_re_searches += 1
+                if full_depth and principal_variation_search:
+                    # a null window only answers whether the move beats alpha, which is all a non-PV move should need
+                    evaluation = -self._negamax(game_state, depth - 1, -alpha - 1, -alpha, ply + 1)
+                    if alpha < evaluation < beta:
+                        self.re_searches += 1
+                        evaluation = -self._negamax(game_state, depth - 1, -beta, -alpha, ply + 1)
+                elif full_depth:
+                    evaluation = -self._negamax(game_state, depth - 1, -beta, -alpha, ply + 1)
+            game_state.undo_move()
 
-                if min_evaluation > evaluation:
-                    min_evaluation = evaluation
-                    best_possible_move = move_pair
-                beta = min(beta, evaluation)
-                if beta <= alpha:
-                    break
-            if depth == 3:
-                return best_possible_move
+            if evaluation > best_evaluation:
+                best_evaluation = evaluation
+                best_possible_move = move
+                if evaluation > alpha:
+                    alpha = evaluation
+                    self._principal_variations[ply] = [move] + self._principal_variations[ply + 1]
+            if alpha >= beta:
+                self._record_cutoff(move, move_number, depth, ply)
+                break
+        if not self._principal_variations[ply]:
+            self._principal_variations[ply] = [best_possible_move]
+
+        self._store_transposition_table(game_state, depth, best_evaluation, window_alpha, beta, best_possible_move,
+                                        ply)
+        return best_evaluation
+
+    def _leaf_evaluation(self, game_state, alpha, beta, ply):
+        if self.options.quiescence:
+            return self.quiescence_search(game_state, alpha, beta, ply)
+        return self.evaluate(game_state)
+
+    @staticmethod
+    def _in_check(game_state, player):
+        analysis = game_state.get_check_analysis(player)
+        return analysis is not None and bool(analysis[0])
+
+    @staticmethod
+    def _has_pieces(game_state, player):
+        # a side with only its king and pawns is where zugzwang happens, so it never gets a null move
+        return bool(game_state.get_bitboard(player, "n") | game_state.get_bitboard(player, "b") |
+                    game_state.get_bitboard(player, "r") | game_state.get_bitboard(player, "q"))
+
+    def reset_move_ordering(self):
+        # killers only make sense for the position they were found in, the history is halved so it slowly ages
+        self.killer_moves = [[None, None] for _ in range(_MAX_PLY)]
+        self.history = [score // 2 for score in self.history]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def first_move_cutoff_rate(self):
+        # the share of cutoffs that came from the first move searched, the closer to 1 the better the ordering
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def _order_moves(self, game_state, legal_moves, hash_move, ply):
+        '''
+        order the packed moves to search the ones most likely to cause a cutoff first:
+        the hash move, then captures by most valuable victim and least valuable attacker, then the two killer moves
+        of this ply, then the quiet moves by their history score
+        '''
+        killers = self.killer_moves[ply] if ply < _MAX_PLY else (None, None)
+        history = self.history
+        board = game_state.board
+
+        def ordering_key(move):
+            if move == hash_move:
+                return _HASH_MOVE_ORDER, 0
+            if move & moves.CAPTURE:
+                starting_index, ending_index = move & 0x3F, move >> 6 & 0x3F
+                victim = "p" if move & moves.EN_PASSANT else board[ending_index >> 3][ending_index & 7].get_name()
+                attacker = board[starting_index >> 3][starting_index & 7].get_name()
+                return _CAPTURE_ORDER, _ORDERING_VALUES[victim] * 100 - _ORDERING_VALUES[attacker]
+            if move == killers[0]:
+                return _KILLER_ORDER, 1
+            if move == killers[1]:
+                return _KILLER_ORDER, 0
+            return _QUIET_ORDER, history[move & moves.SQUARES_MASK]
+
+        legal_moves.sort(key=ordering_key, reverse=True)
+        return legal_moves
+
+    def _record_cutoff(self, move, move_number, depth, ply):
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if move & moves.CAPTURE or ply >= _MAX_PLY:
+            return
+        killers = self.killer_moves[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move & moves.SQUARES_MASK] += depth * depth
+
+    def quiescence_search(self, game_state, alpha, beta, ply=0):
+        '''
+        search only captures until the position is quiet, so the leaves are not scored in the middle of an exchange
+        the side to move may also stop capturing and take the evaluation as it stands (stand pat),
+        captures that cannot bring the score back up to alpha even with a margin are not searched (delta pruning)
+        a side in check may not stand pat: all of its evasions are searched, and having none is mate at this ply
+        scores are from the side to move's point of view, like _negamax
+        '''
+        self._count_node()
+        player = Player.PLAYER_1 if game_state.whose_turn() else Player.PLAYER_2
+        if ply < _MAX_PLY and self._in_check(game_state, player):
+            return self._quiescence_evasions(game_state, player, alpha, beta, ply)
+
+        stand_pat = self.evaluate(game_state)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        best_evaluation = stand_pat
+        captures = game_state.get_all_legal_captures(player, packed=True)
+        for move in self._order_moves(game_state, captures, None, _MAX_PLY):
+            if move & moves.EN_PASSANT:
+                victim = "p"
             else:
-                return min_evaluation
-
-    def minimax_black(self, game_state, depth, alpha, beta, maximizing_player, player_color):
-        csc = game_state.checkmate_stalemate_checker()
-        if maximizing_player:
-            if csc == 1:
-                return 5000000
-            elif csc == 0:
-                return -5000000
-            elif csc == 2:
-                return 100
-        elif not maximizing_player:
-            if csc == 0:
-                return 5000000
-            elif csc == 1:
-                return -5000000
-            elif csc == 2:
-                return 100
-
-        if depth <= 0 or csc != 3:
-            return self.evaluate_board(game_state, Player.PLAYER_2)
-
-        if maximizing_player:
-            max_evaluation = -10000000
-            all_possible_moves = game_state.get_all_legal_moves("white")
-            for move_pair in all_possible_moves:
-                game_state.move_piece(move_pair[0], move_pair[1], True)
-                evaluation = self.minimax_black(game_state, depth - 1, alpha, beta, False, "black")
-                game_state.undo_move()
+                victim = game_state.get_piece(move >> 9 & 7, move >> 6 & 7).get_name()
+            if stand_pat + _ORDERING_VALUES[victim] + _DELTA_MARGIN <= alpha:
+                continue
+            game_state.make_move(move)
+            evaluation = -self.quiescence_search(game_state, -beta, -alpha, ply + 1)
+            game_state.undo_move()
 
-                if max_evaluation < evaluation:
-                    max_evaluation = evaluation
-                    best_possible_move = move_pair
-                alpha = max(alpha, evaluation)
-                if beta <= alpha:
-                    break
-            if depth == 3:
-                return best_possible_move
+            best_evaluation = max(best_evaluation, evaluation)
+            alpha = max(alpha, evaluation)
+            if alpha >= beta:
+                break
+        return best_evaluation
+
+    def _quiescence_evasions(self, game_state, player, alpha, beta, ply):
+        # every legal move of a side in check gets it out of check, quiet ones included
+        evasions = game_state.get_all_legal_moves(player, packed=True)
+        if not evasions:
+            return -MATE_SCORE + ply
+        best_evaluation = -MATE_SCORE - 1
+        for move in self._order_moves(game_state, evasions, None, _MAX_PLY):
+            game_state.make_move(move)
+            evaluation = -self.quiescence_search(game_state, -beta, -alpha, ply + 1)
+            game_state.undo_move()
+
+            best_evaluation = max(best_evaluation, evaluation)
+            alpha = max(alpha, evaluation)
+            if alpha >= beta:
+                break
+        return best_evaluation
+
+    def _count_node(self):
+        self.nodes += 1
+        if (self._node_limit is not None and self.nodes > self._node_limit) or \
+                (self._deadline is not None and time.perf_counter() > self._deadline):
+            raise _search_aborted()
+
+    def _probe_transposition_table(self, game_state, depth, alpha, beta, ply):
+        '''
+        look the position up before searching it
+        returns (score or None, alpha, beta, hash move): a score means the stored result already settles this node,
+        otherwise the window may have been narrowed and the stored best move should be searched first
+        the root (ply 0) never takes a stored score, it has to find its move
+        '''
+        entry = self.transposition_table.probe(game_state.zobrist_key)
+        if entry is None:
+            return None, alpha, beta, None
+        stored_depth, score, bound, move = entry
+        if stored_depth >= depth and ply > 0:
+            # mate scores are stored counted from the stored position, here they count from the root
+            if score > MATE_SCORE - _MAX_PLY:
+                score -= ply
+            elif score < -MATE_SCORE + _MAX_PLY:
+                score += ply
+            if bound == Bound.EXACT:
+                return score, alpha, beta, move
+            if bound == Bound.LOWER:
+                alpha = max(alpha, score)
             else:
-                return max_evaluation
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score, alpha, beta, move
+        return None, alpha, beta, move
+
+    def _store_transposition_table(self, game_state, depth, score, alpha, beta, move, ply):
+        # alpha and beta are the window the node was searched with
+        if score <= alpha:
+            bound = Bound.UPPER
+        elif score >= beta:
+            bound = Bound.LOWER
         else:
-            min_evaluation = 10000000
-            all_possible_moves = game_state.get_all_legal_moves("black")
-            for move_pair in all_possible_moves:
-                game_state.move_piece(move_pair[0], move_pair[1], True)
-                evaluation = self.minimax_black(game_state, depth - 1, alpha, beta, True, "white")
-                game_state.undo_move()
+            bound = Bound.EXACT
+        if score > MATE_SCORE - _MAX_PLY:
+            score += ply
+        elif score < -MATE_SCORE + _MAX_PLY:
+            score -= ply
+        self.transposition_table.store(game_state.zobrist_key, depth, score, bound, move)
 
-                if min_evaluation > evaluation:
-                    min_evaluation = evaluation
-                    best_possible_move = move_pair
-                beta = min(beta, evaluation)
-                if beta <= alpha:
-                    break
-            if depth == 3:
-                return best_possible_move
-            else:
-                return min_evaluation
+    def evaluate(self, game_state):
+        '''
+        the static evaluation from the side to move's point of view, read from the sums game_state keeps
+        with the piece-square tables and pawn structure off it equals evaluate_board for the opponent of the side
+        to move
+        '''
+        if self.options.evaluation_cache:
+            score = self.evaluation_cache.probe(game_state.zobrist_key)
+            if score is not None:
+                return score
+        if game_state.whose_turn():
+            player, opponent = Player.PLAYER_1, Player.PLAYER_2
+        else:
+            player, opponent = Player.PLAYER_2, Player.PLAYER_1
+        score = game_state.get_material(player) - game_state.get_material(opponent)
+        if self.options.piece_square_tables:
+            score += game_state.get_piece_square_score(player) - game_state.get_piece_square_score(opponent)
+        if self.options.pawn_structure:
+            pawn_score = self.pawn_hash_table.probe(game_state.pawn_key)
+            if pawn_score is None:
+                pawn_score = evaluation.pawn_structure_score(game_state.get_bitboard(Player.PLAYER_1, "p"),
+                                                             game_state.get_bitboard(Player.PLAYER_2, "p"))
+                self.pawn_hash_table.store(game_state.pawn_key, pawn_score)
+            score += pawn_score if player is Player.PLAYER_1 else -pawn_score
+        if self.options.evaluation_cache:
+            self.evaluation_cache.store(game_state.zobrist_key, score)
+        return score
 
     def evaluate_board(self, game_state, player):
+        # the full scan of the board that evaluate is checked against
         evaluation_score = 0
         for row in range(0, 8):
             for col in range(0, 8):
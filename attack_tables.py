@@ -0,0 +1,18 @@
+#
+# Per-square move tables for the chess pieces
+# Built once at import so the knight and king never have to add offsets or check the board edges for their moves.
+# Sliding pieces look their moves up in the magic bitboard tables instead (see bitboard).
+# Every table is indexed as TABLE[row][col] and only holds squares that are on the board.
+#
+
+KNIGHT_OFFSETS = [(-2, -1), (-2, +1), (-1, -2), (-1, +2), (+1, -2), (+1, +2), (+2, +1), (+2, -1)]
+KING_OFFSETS = [(-1, -1), (+0, -1), (+1, -1), (-1, +0), (+1, +0), (-1, +1), (+0, +1), (+1, +1)]
+
+
+def _targets(row, col, offsets):
+    return tuple((row + row_change, col + col_change) for row_change, col_change in offsets
+                 if 0 <= row + row_change < 8 and 0 <= col + col_change < 8)
+
+
+KNIGHT_TARGETS = [[_targets(row, col, KNIGHT_OFFSETS) for col in range(8)] for row in range(8)]
+KING_TARGETS = [[_targets(row, col, KING_OFFSETS) for col in range(8)] for row in range(8)]
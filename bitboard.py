@@ -0,0 +1,303 @@
+#
+# Bitboard helpers for the chess engine
+# A bitboard is a 64-bit integer with one bit per square. Square (r, c) is bit r * 8 + c, so bit 0 is (r=0, c=0)
+# and bit 63 is (r=7, c=7), following the row/col layout documented in chess_engine.
+#
+from array import array
+import logging
+
+from enums import Player
+from attack_tables import KNIGHT_TARGETS, KING_TARGETS
+
+FULL_BOARD = 0xFFFFFFFFFFFFFFFF
+
+# (row, col) of every square index, so the move generator never has to divmod
+SQUARES = [(row, col) for row in range(8) for col in range(8)]
+
+
+def square_index(row, col):
+    return row * 8 + col
+
+
+def square_bit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def lowest_square(bitboard):
+    return (bitboard & -bitboard).bit_length() - 1
+
+
+def highest_square(bitboard):
+    return bitboard.bit_length() - 1
+
+
+def bitboard_squares(bitboard):
+    # list of the square indices set in the bitboard, lowest first
+    _squares = []
+    while bitboard:
+        lsb = bitboard & -bitboard
+        _squares.append(lsb.bit_length() - 1)
+        bitboard ^= lsb
+    return _squares
+
+
+if hasattr(int, "bit_count"):
+    def popcount(bitboard):
+        return bitboard.bit_count()
+else:
+    def popcount(bitboard):
+        return bin(bitboard).count("1")
+
+
+def _squares_mask(squares):
+    mask = 0
+    for row, col in squares:
+        mask |= square_bit(row, col)
+    return mask
+
+
+def _ray_mask(row, col, row_change, col_change):
+    mask = 0
+    new_row = row + row_change
+    new_col = col + col_change
+    while 0 <= new_row < 8 and 0 <= new_col < 8:
+        mask |= square_bit(new_row, new_col)
+        new_row += row_change
+        new_col += col_change
+    return mask
+
+
+# Rays are split by whether they run towards higher or lower square indices, because the first blocker on a
+# ray is the lowest set bit for the former and the highest set bit for the latter.
+ORTHOGONAL_POSITIVE = [(0, +1), (+1, 0)]
+ORTHOGONAL_NEGATIVE = [(0, -1), (-1, 0)]
+DIAGONAL_POSITIVE = [(+1, +1), (+1, -1)]
+DIAGONAL_NEGATIVE = [(-1, -1), (-1, +1)]
+
+KNIGHT_ATTACKS = [_squares_mask(KNIGHT_TARGETS[row][col]) for row, col in SQUARES]
+KING_ATTACKS = [_squares_mask(KING_TARGETS[row][col]) for row, col in SQUARES]
+# White pawns move towards row 7 and black pawns towards row 0
+PAWN_ATTACKS = {
+    Player.PLAYER_1: [_squares_mask([(row + 1, col + col_change) for col_change in (-1, +1)
+                                     if row < 7 and 0 <= col + col_change < 8]) for row, col in SQUARES],
+    Player.PLAYER_2: [_squares_mask([(row - 1, col + col_change) for col_change in (-1, +1)
+                                     if row > 0 and 0 <= col + col_change < 8]) for row, col in SQUARES],
+}
+
+_RAYS = {direction: [_ray_mask(row, col, direction[0], direction[1]) for row, col in SQUARES]
+         for direction in ORTHOGONAL_POSITIVE + ORTHOGONAL_NEGATIVE + DIAGONAL_POSITIVE + DIAGONAL_NEGATIVE}
+
+
+def _slider_attacks(square, occupied, positive_directions, negative_directions):
+    attacks = 0
+    for direction in positive_directions:
+        ray = _RAYS[direction]
+        ray_attacks = ray[square]
+        blockers = ray_attacks & occupied
+        if blockers:
+            ray_attacks ^= ray[lowest_square(blockers)]
+        attacks |= ray_attacks
+    for direction in negative_directions:
+        ray = _RAYS[direction]
+        ray_attacks = ray[square]
+        blockers = ray_attacks & occupied
+        if blockers:
+            ray_attacks ^= ray[highest_square(blockers)]
+        attacks |= ray_attacks
+    return attacks
+
+
+def ray_rook_attacks(square, occupied):
+    # reference implementation that walks the rays, used to fill the magic tables
+    return _slider_attacks(square, occupied, ORTHOGONAL_POSITIVE, ORTHOGONAL_NEGATIVE)
+
+
+def ray_bishop_attacks(square, occupied):
+    return _slider_attacks(square, occupied, DIAGONAL_POSITIVE, DIAGONAL_NEGATIVE)
+
+
+#
+# Magic bitboards
+# Only the occupancy of a slider's relevant squares (its rays without the edge square at the end of each ray)
+# changes its attack set. Multiplying those bits by the square's magic number and keeping the top bits gives a
+# collision free index into a per-square table of precomputed attack sets.
+# The magics below were found with a random sparse search and are checked whenever the tables are built.
+#
+ROOK_MAGICS = [
+    0x2080001440022581, 0x1080200040001080, 0x4080100008200080, 0x0280080080100254,
+    0x4D8004000A180080, 0x0100080400020100, 0x1080010040800200, 0x0200004402002081,
+    0x0068800024884004, 0x1000804000802002, 0x000200208A001040, 0x3008801000800800,
+    0x2006001060440A00, 0x1000800200800400, 0x0004000441024810, 0xA001000082004100,
+    0x0040808000204014, 0x0000424002201000, 0x0010110041002000, 0x0000090021041000,
+    0x0204008004800800, 0x0000808004000200, 0x6006040021485042, 0x0000020002409924,
+    0x2000401980028020, 0x4000400100308100, 0x0000820200201041, 0xB100100080800800,
+    0x3004080080040080, 0x0802000200041009, 0x01A0580400021110, 0x00020042000408A1,
+    0x4218884000800023, 0x0480201000400045, 0x0010200080801000, 0x1200200901001000,
+    0x0000100801000500, 0x0080020080800400, 0x004A000100404080, 0x0480005402001081,
+    0x258000402000C000, 0xA010004820084002, 0x0480200010008080, 0x244100100021000C,
+    0x2040080005010010, 0x0012000810020004, 0x0011000200B9000C, 0x1121000080410002,
+    0x00082080410A0600, 0x4002008100402600, 0x0A0300E008544100, 0x7B00080010008080,
+    0x0300080100100500, 0x0002020080040080, 0x0042521810214400, 0x8A00004089140200,
+    0x00001280010A2041, 0x0400401102042086, 0x41902000100C4101, 0x0043020420900009,
+    0x00E2000410082002, 0x4402000108041002, 0x2100101A00814804, 0x0400010400218246,
+]
+
+BISHOP_MAGICS = [
+    0x0102040418220020, 0x0108024802002028, 0x8010044040400001, 0x0022209200044800,
+    0x4004504005040114, 0x0022010420A80800, 0x0008441008090002, 0x0000420801480200,
+    0x1100220244011C00, 0x00883004081AB020, 0x4400100152002000, 0x4019080841004000,
+    0x2861021210000000, 0x400EA10108400020, 0x4800208208A24000, 0x0020A500A0842085,
+    0x3410000802504400, 0x0010E0200C010060, 0x0014182042408200, 0x4094006840112109,
+    0x2014200202010000, 0x000100020080C400, 0x800400420D2C0200, 0x0002200182251000,
+    0x0010F10304C41000, 0x001024A008281084, 0x0088110002040100, 0x0820080001004008,
+    0x0104040020410050, 0x0110002027040500, 0x418C008009182100, 0x2C00A9040C80480B,
+    0x008110C8005020A4, 0x4004210802041000, 0x0004020108208100, 0x0000080800120A00,
+    0x430C008400820102, 0x1400808100020108, 0x005006020010A8A0, 0x000801868004A220,
+    0x00420105C00C2000, 0x1010921032019040, 0x0300222028103000, 0x0008004208001080,
+    0x5410202248811400, 0x0008010800800808, 0x3C02C20404000900, 0x0408022282040032,
+    0x0000941002100000, 0x0112209A10100804, 0x080C020111210000, 0x442002A442022008,
+    0x00084A181B040000, 0x00115021021C2080, 0x4010051000A20000, 0x0404688085060000,
+    0x0000220110011000, 0x140000220734200C, 0x0440010424020800, 0x2204828883460800,
+    0x0020000004050410, 0x4060004A20082080, 0x00489034B002C201, 0x0444049010410300,
+]
+
+# Path of the file the lookup tables are cached in, None to always build them in memory
+MAGIC_TABLE_CACHE = None
+
+
+def _relevant_mask(row, col, directions):
+    mask = 0
+    for row_change, col_change in directions:
+        new_row = row + row_change
+        new_col = col + col_change
+        while 0 <= new_row + row_change < 8 and 0 <= new_col + col_change < 8:
+            mask |= square_bit(new_row, new_col)
+            new_row += row_change
+            new_col += col_change
+    return mask
+
+
+ROOK_MASKS = [_relevant_mask(row, col, ORTHOGONAL_POSITIVE + ORTHOGONAL_NEGATIVE) for row, col in SQUARES]
+BISHOP_MASKS = [_relevant_mask(row, col, DIAGONAL_POSITIVE + DIAGONAL_NEGATIVE) for row, col in SQUARES]
+ROOK_SHIFTS = [64 - popcount(mask) for mask in ROOK_MASKS]
+BISHOP_SHIFTS = [64 - popcount(mask) for mask in BISHOP_MASKS]
+
+_rook_table = []
+_bishop_table = []
+
+
+def _occupancy_subsets(mask):
+    # every subset of mask, using the carry-rippler trick
+    _subsets = []
+    subset = 0
+    while True:
+        _subsets.append(subset)
+        subset = (subset - mask) & mask
+        if not subset:
+            return _subsets
+
+
+def _build_magic_table(masks, magics, shifts, attack_function):
+    table = []
+    for square in range(64):
+        entries = [0] * (1 << (64 - shifts[square]))
+        for occupied in _occupancy_subsets(masks[square]):
+            index = ((occupied * magics[square]) & FULL_BOARD) >> shifts[square]
+            attacks = attack_function(square, occupied)
+            # a slider always attacks at least one square, so 0 marks an unused entry
+            if entries[index] and entries[index] != attacks:
+                raise ValueError("magic number for square %d maps two attack sets to one entry" % square)
+            entries[index] = attacks
+        table.append(entries)
+    return table
+
+
+def _magic_cache_header():
+    # the magics and masks the tables were built from, a cache written for any others is rebuilt
+    return array("Q", ROOK_MAGICS + BISHOP_MAGICS + ROOK_MASKS + BISHOP_MASKS)
+
+
+def _read_magic_cache(cache_path):
+    header = _magic_cache_header()
+    sizes = [1 << (64 - shift) for shift in ROOK_SHIFTS + BISHOP_SHIFTS]
+    entries = array("Q")
+    try:
+        with open(cache_path, "rb") as cache_file:
+            entries.frombytes(cache_file.read())
+    except (OSError, ValueError):
+        return None
+    if len(entries) != len(header) + sum(sizes) or entries[:len(header)] != header:
+        return None
+    tables = []
+    offset = len(header)
+    for size in sizes:
+        tables.append(entries[offset:offset + size].tolist())
+        offset += size
+    return tables[:64], tables[64:]
+
+
+def _write_magic_cache(cache_path, rook_table, bishop_table):
+    entries = _magic_cache_header()
+    for table in rook_table + bishop_table:
+        entries.extend(table)
+    try:
+        with open(cache_path, "wb") as cache_file:
+            entries.tofile(cache_file)
+    except OSError:
+        logging.warning("could not write the magic bitboard cache to %s", cache_path)
+
+
+def load_magic_tables(cache_path=None):
+    '''
+    fill the rook and bishop lookup tables and switch the attack functions over to them
+    the tables are read from cache_path when it holds a valid cache, otherwise they are built and written there
+    '''
+    global _rook_table, _bishop_table, rook_attacks, bishop_attacks, queen_attacks
+    tables = _read_magic_cache(cache_path) if cache_path else None
+    if tables is None:
+        tables = (_build_magic_table(ROOK_MASKS, ROOK_MAGICS, ROOK_SHIFTS, ray_rook_attacks),
+                  _build_magic_table(BISHOP_MASKS, BISHOP_MAGICS, BISHOP_SHIFTS, ray_bishop_attacks))
+        if cache_path:
+            _write_magic_cache(cache_path, tables[0], tables[1])
+    _rook_table, _bishop_table = tables
+    rook_attacks = _magic_rook_attacks
+    bishop_attacks = _magic_bishop_attacks
+    queen_attacks = _magic_queen_attacks
+
+
+def _magic_rook_attacks(square, occupied):
+    return _rook_table[square][((occupied & ROOK_MASKS[square]) * ROOK_MAGICS[square] & FULL_BOARD) >>
+                               ROOK_SHIFTS[square]]
+
+
+def _magic_bishop_attacks(square, occupied):
+    return _bishop_table[square][((occupied & BISHOP_MASKS[square]) * BISHOP_MAGICS[square] & FULL_BOARD) >>
+                                 BISHOP_SHIFTS[square]]
+
+
+def _magic_queen_attacks(square, occupied):
+    return (_rook_table[square][((occupied & ROOK_MASKS[square]) * ROOK_MAGICS[square] & FULL_BOARD) >>
+                                ROOK_SHIFTS[square]] |
+            _bishop_table[square][((occupied & BISHOP_MASKS[square]) * BISHOP_MAGICS[square] & FULL_BOARD) >>
+                                  BISHOP_SHIFTS[square]])
+
+
+# Until the first lookup the attack functions point at these, which build the tables and rebind themselves.
+# Callers should go through the module (bitboard.rook_attacks) so they pick up the table lookups afterwards.
+def rook_attacks(square, occupied):
+    load_magic_tables(MAGIC_TABLE_CACHE)
+    return rook_attacks(square, occupied)
+
+
+def bishop_attacks(square, occupied):
+    load_magic_tables(MAGIC_TABLE_CACHE)
+    return bishop_attacks(square, occupied)
+
+
+def queen_attacks(square, occupied):
+    load_magic_tables(MAGIC_TABLE_CACHE)
+    return queen_attacks(square, occupied)
+
+
+def opponent(player):
+    return Player.PLAYER_2 if player == Player.PLAYER_1 else Player.PLAYER_1
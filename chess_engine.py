@@ -5,7 +5,11 @@
 # Note: move log class inspired by Eddie Sharick
 #
 from Piece import Rook, Knight, Bishop, Queen, King, Pawn
-from enums import Player
+from enums import Player, Backend
+import bitboard
+import evaluation
+import moves
+import zobrist
 import logging
 import logging_feature
 '''
@@ -20,6 +24,28 @@ r \ c     0           1           2           3           4           5
 7   [(r=7, c=0), (r=7, c=1), (r=7, c=2), (r=7, c=3), (r=7, c=4), (r=7, c=5), (r=7, c=6), (r=7, c=7)]
 '''
 
+# Squares the king stands on and crosses when castling, none of them may be attacked
+_WHITE_CASTLE_LEFT_PATH = bitboard.square_bit(0, 1) | bitboard.square_bit(0, 2) | bitboard.square_bit(0, 3)
+_WHITE_CASTLE_RIGHT_PATH = bitboard.square_bit(0, 3) | bitboard.square_bit(0, 4) | bitboard.square_bit(0, 5)
+_BLACK_CASTLE_LEFT_PATH = bitboard.square_bit(7, 1) | bitboard.square_bit(7, 2) | bitboard.square_bit(7, 3)
+_BLACK_CASTLE_RIGHT_PATH = bitboard.square_bit(7, 3) | bitboard.square_bit(7, 4) | bitboard.square_bit(7, 5)
+
+# Undo records made up front, deeper than any search goes; a longer game adds more as it needs them
+_UNDO_STACK_SIZE = 256
+
+
+class board_row(list):
+    '''
+    a row of game_state.board, which can be read like a list but not written to
+    a piece written straight into a row would bypass the bitboards, the zobrist keys, the attack maps, the piece
+    lists and the evaluation sums, so the board only changes through game_state.set_piece and the moves
+    '''
+    def __setitem__(self, index, value):
+        raise TypeError("the board is read-only, place pieces with game_state.set_piece")
+
+    def __delitem__(self, index):
+        raise TypeError("the board is read-only, place pieces with game_state.set_piece")
+
 
 # TODO: Flip the board according to the player
 # TODO: Pawns are usually indicated by no letters
@@ -28,12 +54,27 @@ r \ c     0           1           2           3           4           5
 # TODO: change move method argument about is_ai into something more elegant
 class game_state:
     # Initialize 2D array to represent the chess board
-    def __init__(self):
+    # backend picks the move generator: Backend.BOARD asks each Piece object for its moves, Backend.BITBOARD
+    # generates every move from the bitboards at once
+    # either way the move generation reads the bitboards and occupancy kept by _set_square (the sliders' lines
+    # and the pieces' squares), which is why the rows of board are read-only
+    # zobrist_debug checks the incrementally kept zobrist_key and pawn_key against a full recompute after every move
+    # and undo
+    # evaluation_debug does the same for the material and piece-square sums
+    def __init__(self, backend=Backend.BOARD, zobrist_debug=False, evaluation_debug=False):
         # The board is a 2D array
         # TODO: Change to a numpy format later
+        self.backend = backend
+        self.zobrist_debug = zobrist_debug
+        self.evaluation_debug = evaluation_debug
         self.white_captives = []
         self.black_captives = []
+        # the moves played so far as packed ints of the moves module, a null move is moves.NULL_MOVE
+        # get_move_log builds chess_move objects from them for showing the game
         self.move_log = []
+        # one undo_record per move in the move log, reused from move to move; _undo_depth is how many are in use
+        self._undo_stack = [undo_record() for _ in range(_UNDO_STACK_SIZE)]
+        self._undo_depth = 0
         self.white_turn = True
         self.can_en_passant_bool = False
         self._en_passant_previous = (-1, -1)
@@ -41,6 +82,10 @@ class game_state:
         self.stalemate = False
 
         self._is_check = False
+        # check_for_check result per player for the current position, None until asked for
+        self._check_analysis = {Player.PLAYER_1: None, Player.PLAYER_2: None}
+        # (zobrist key, white_turn, game_status) of the last position game_status answered for
+        self._game_status = None
         self._white_king_location = [0, 3]
         self._black_king_location = [7, 3]
 
@@ -65,10 +110,6 @@ class game_state:
         white_pawn_6 = Pawn('p', 1, 5, Player.PLAYER_1)
         white_pawn_7 = Pawn('p', 1, 6, Player.PLAYER_1)
         white_pawn_8 = Pawn('p', 1, 7, Player.PLAYER_1)
-        self.white_pieces = [white_rook_1, white_rook_2, white_knight_1, white_knight_2, white_bishop_1, white_bishop_2,
-                             white_queen, white_king, white_pawn_1, white_pawn_2, white_pawn_3, white_pawn_4,
-                             white_pawn_5,
-                             white_pawn_6, white_pawn_7, white_pawn_8]
 
         # Initialize Black Pieces
         black_rook_1 = Rook('r', 7, 0, Player.PLAYER_2)
@@ -87,11 +128,8 @@ class game_state:
         black_pawn_6 = Pawn('p', 6, 5, Player.PLAYER_2)
         black_pawn_7 = Pawn('p', 6, 6, Player.PLAYER_2)
         black_pawn_8 = Pawn('p', 6, 7, Player.PLAYER_2)
-        self.black_pieces = [black_rook_1, black_rook_2, black_knight_1, black_knight_2, black_bishop_1, black_bishop_2,
-                             black_queen, black_king, black_pawn_1, black_pawn_2, black_pawn_3, black_pawn_4,
-                             black_pawn_5,
-                             black_pawn_6, black_pawn_7, black_pawn_8]
 
+        # Assigning self.board rebuilds the bitboards and the white_pieces and black_pieces lists from it
         self.board = [
             [white_rook_1, white_knight_1, white_bishop_1, white_king, white_queen, white_bishop_2, white_knight_2,
              white_rook_2],
@@ -114,9 +152,251 @@ class game_state:
         self.white_knights_moves_counter=0
         self.black_knights_moves_counter=0
 
+    # the rows are read-only board_rows, assigning a whole new board is the one way to replace it
+    @property
+    def board(self):
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        self._board = tuple(board_row(row) for row in board)
+        self._rebuild_bitboards()
+
+    def _rebuild_bitboards(self):
+        # One bitboard per piece type and colour plus the occupancy of each colour, derived from self.board
+        self._invalidate_check_analysis()
+        self._bitboards = {Player.PLAYER_1: {"r": 0, "n": 0, "b": 0, "q": 0, "k": 0, "p": 0},
+                           Player.PLAYER_2: {"r": 0, "n": 0, "b": 0, "q": 0, "k": 0, "p": 0}}
+        self._occupancy = {Player.PLAYER_1: 0, Player.PLAYER_2: 0}
+        # The pieces each side has on the board, kept up to date by _set_square
+        self.white_pieces = []
+        self.black_pieces = []
+        self._pieces = {Player.PLAYER_1: self.white_pieces, Player.PLAYER_2: self.black_pieces}
+        for row in range(0, 8):
+            for col in range(0, 8):
+                if self.is_valid_piece(row, col):
+                    piece = self.get_piece(row, col)
+                    self._bitboards[piece.get_player()][piece.get_name()] |= bitboard.square_bit(row, col)
+                    self._occupancy[piece.get_player()] |= bitboard.square_bit(row, col)
+                    self._pieces[piece.get_player()].append(piece)
+
+        self.zobrist_key = zobrist.compute_key(self)
+        self.pawn_key = zobrist.compute_pawn_key(self)
+        # Each side's material and piece-square score, kept up to date by _set_square
+        self._material, self._piece_square_scores = evaluation.compute_scores(self)
+
+        # Attack maps: the squares each piece attacks, how many pieces of each side attack every square
+        # and the bitboard of the squares each side attacks at least once
+        self._square_attacks = [0] * 64
+        self._attack_counts = {Player.PLAYER_1: [0] * 64, Player.PLAYER_2: [0] * 64}
+        self._attack_maps = {Player.PLAYER_1: 0, Player.PLAYER_2: 0}
+        occupied = self.get_occupancy()
+        for square in bitboard.bitboard_squares(occupied):
+            piece = self._board[square // 8][square % 8]
+            attacks = self._piece_attacks(piece, square, occupied)
+            self._square_attacks[square] = attacks
+            self._add_attacks(piece.get_player(), attacks)
+
+    def _set_square(self, row, col, piece):
+        '''
+        every real change to the board goes through here so the bitboards, the attack maps and the piece
+        coordinates stay in sync
+        besides the piece leaving and the piece arriving, only the sliders whose lines run through the square
+        change what they attack, and only when the square turns from empty to occupied or back
+        '''
+        square = row * 8 + col
+        bit = 1 << square
+        previous_piece = self._board[row][col]
+        if previous_piece is not Player.EMPTY:
+            self._bitboards[previous_piece.get_player()][previous_piece.get_name()] ^= bit
+            self._occupancy[previous_piece.get_player()] ^= bit
+            self._pieces[previous_piece.get_player()].remove(previous_piece)
+            self.zobrist_key ^= zobrist.PIECE_KEYS[previous_piece.get_player()][previous_piece.get_name()][square]
+            if previous_piece.get_name() == "p":
+                self.pawn_key ^= zobrist.PIECE_KEYS[previous_piece.get_player()]["p"][square]
+            self._material[previous_piece.get_player()] -= evaluation.PIECE_VALUES[previous_piece.get_name()]
+            self._piece_square_scores[previous_piece.get_player()] -= \
+                evaluation.PIECE_SQUARE_SCORES[previous_piece.get_player()][previous_piece.get_name()][square]
+            self._remove_attacks(previous_piece.get_player(), self._square_attacks[square])
+            self._square_attacks[square] = 0
+        list.__setitem__(self._board[row], col, piece)
+        if piece is not Player.EMPTY:
+            self._bitboards[piece.get_player()][piece.get_name()] |= bit
+            self._occupancy[piece.get_player()] |= bit
+            self._pieces[piece.get_player()].append(piece)
+            self.zobrist_key ^= zobrist.PIECE_KEYS[piece.get_player()][piece.get_name()][square]
+            if piece.get_name() == "p":
+                self.pawn_key ^= zobrist.PIECE_KEYS[piece.get_player()]["p"][square]
+            self._material[piece.get_player()] += evaluation.PIECE_VALUES[piece.get_name()]
+            self._piece_square_scores[piece.get_player()] += \
+                evaluation.PIECE_SQUARE_SCORES[piece.get_player()][piece.get_name()][square]
+            piece.change_row_number(row)
+            piece.change_col_number(col)
+
+        occupied = self._occupancy[Player.PLAYER_1] | self._occupancy[Player.PLAYER_2]
+        if (previous_piece is Player.EMPTY) != (piece is Player.EMPTY):
+            white, black = self._bitboards[Player.PLAYER_1], self._bitboards[Player.PLAYER_2]
+            queens = white["q"] | black["q"]
+            sliders = (bitboard.rook_attacks(square, occupied) & (white["r"] | black["r"] | queens)) | \
+                      (bitboard.bishop_attacks(square, occupied) & (white["b"] | black["b"] | queens))
+            for slider_square in bitboard.bitboard_squares(sliders):
+                slider = self._board[slider_square // 8][slider_square % 8]
+                old_attacks = self._square_attacks[slider_square]
+                new_attacks = self._piece_attacks(slider, slider_square, occupied)
+                self._remove_attacks(slider.get_player(), old_attacks & ~new_attacks)
+                self._add_attacks(slider.get_player(), new_attacks & ~old_attacks)
+                self._square_attacks[slider_square] = new_attacks
+        if piece is not Player.EMPTY:
+            attacks = self._piece_attacks(piece, square, occupied)
+            self._square_attacks[square] = attacks
+            self._add_attacks(piece.get_player(), attacks)
+
+    @staticmethod
+    def _piece_attacks(piece, square, occupied):
+        name = piece.get_name()
+        if name == "p":
+            return bitboard.PAWN_ATTACKS[piece.get_player()][square]
+        if name == "n":
+            return bitboard.KNIGHT_ATTACKS[square]
+        if name == "k":
+            return bitboard.KING_ATTACKS[square]
+        if name == "r":
+            return bitboard.rook_attacks(square, occupied)
+        if name == "b":
+            return bitboard.bishop_attacks(square, occupied)
+        return bitboard.queen_attacks(square, occupied)
+
+    def _add_attacks(self, player, attacks):
+        counts = self._attack_counts[player]
+        for square in bitboard.bitboard_squares(attacks):
+            counts[square] += 1
+        self._attack_maps[player] |= attacks
+
+    def _remove_attacks(self, player, attacks):
+        counts = self._attack_counts[player]
+        for square in bitboard.bitboard_squares(attacks):
+            counts[square] -= 1
+            if not counts[square]:
+                self._attack_maps[player] ^= 1 << square
+
+    def is_square_attacked(self, square, by_player):
+        # square is a (row, col) pair, answered from the attack maps kept up to date by every board change
+        return bool(self._attack_maps[by_player] >> (square[0] * 8 + square[1]) & 1)
+
+    def get_attacker_count(self, square, by_player):
+        return self._attack_counts[by_player][square[0] * 8 + square[1]]
+
+    def get_attack_map(self, player):
+        return self._attack_maps[player]
+
+    # Put a piece (or Player.EMPTY) on a square without making a move, e.g. to set up a position
+    def set_piece(self, row, col, piece):
+        # the way to place a piece on the board or empty a square outside of a move, the rows of board are read-only
+        self._set_square(row, col, piece)
+        self._invalidate_check_analysis()
+
+    def serialize(self):
+        '''
+        a compact copy of the position for sending to another process: the backend, a 64 character string of the
+        pieces in square order (upper case white, lower case black, '.' empty), whose turn it is, the castling flags
+        and the en passant pawn
+        the move log is not part of it, deserialize rebuilds the position without its history
+        '''
+        pieces = "".join("." if piece is Player.EMPTY else
+                         piece.get_name().upper() if piece.get_player() is Player.PLAYER_1 else piece.get_name()
+                         for row in self._board for piece in row)
+        return (self.backend, pieces, self.white_turn, tuple(self.white_king_can_castle),
+                tuple(self.black_king_can_castle), self._en_passant_previous)
+
+    @staticmethod
+    def deserialize(data):
+        backend, pieces, white_turn, white_king_can_castle, black_king_can_castle, en_passant_previous = data
+        piece_classes = {"r": Rook, "n": Knight, "b": Bishop, "q": Queen, "k": King, "p": Pawn}
+        position = game_state(backend)
+        position.white_turn = white_turn
+        position.white_king_can_castle = list(white_king_can_castle)
+        position.black_king_can_castle = list(black_king_can_castle)
+        position._en_passant_previous = en_passant_previous
+        board = [[Player.EMPTY for _ in range(8)] for _ in range(8)]
+        for square, letter in enumerate(pieces):
+            if letter == ".":
+                continue
+            row, col = divmod(square, 8)
+            player = Player.PLAYER_1 if letter.isupper() else Player.PLAYER_2
+            board[row][col] = piece_classes[letter.lower()](letter.lower(), row, col, player)
+            if letter == "K":
+                position._white_king_location = (row, col)
+            elif letter == "k":
+                position._black_king_location = (row, col)
+        # assigning the board rebuilds the bitboards, the attack maps and the zobrist key from everything above
+        position.board = board
+        return position
+
+    def _invalidate_check_analysis(self):
+        self._check_analysis = {Player.PLAYER_1: None, Player.PLAYER_2: None}
+
+    def get_check_analysis(self, player):
+        '''
+        the [checks, pins, pins_check] triple of check_for_check for the player's king in the current position
+        computed once and reused by every legality query until the board changes through move_piece, undo_move,
+        set_piece or a new board; None if the player has no king
+        '''
+        analysis = self._check_analysis[player]
+        if analysis is None:
+            king = self._bitboards[player]["k"]
+            if not king:
+                return None
+            analysis = self.check_for_check(bitboard.SQUARES[bitboard.lowest_square(king)], player)
+            self._check_analysis[player] = analysis
+        return analysis
+
+    # the part of the zobrist key that is not piece placement or side to move
+    def _get_rights_key(self):
+        return zobrist.castling_key(self.white_king_can_castle, self.black_king_can_castle) ^ \
+               zobrist.en_passant_key(self._en_passant_previous)
+
+    def _verify_zobrist_key(self):
+        expected_key = zobrist.compute_key(self)
+        if self.zobrist_key != expected_key:
+            raise RuntimeError(f"zobrist key {self.zobrist_key:#018x} does not match the position ({expected_key:#018x})")
+        expected_key = zobrist.compute_pawn_key(self)
+        if self.pawn_key != expected_key:
+            raise RuntimeError(f"pawn key {self.pawn_key:#018x} does not match the position ({expected_key:#018x})")
+
+    def get_material(self, player):
+        # the sum of evaluation.PIECE_VALUES over the player's pieces
+        return self._material[player]
+
+    def get_piece_square_score(self, player):
+        # the sum of evaluation.PIECE_SQUARE_SCORES over the player's pieces
+        return self._piece_square_scores[player]
+
+    def _verify_evaluation(self):
+        if (self._material, self._piece_square_scores) != evaluation.compute_scores(self):
+            raise RuntimeError(f"material {self._material} and piece-square scores {self._piece_square_scores} "
+                               f"do not match the position")
+
+    def get_bitboard(self, player, name):
+        return self._bitboards[player][name]
+
+    def get_pieces(self, player, name=None):
+        '''
+        the player's pieces on the board, only those named name if it is given
+        read from the piece lists and bitboards kept up to date by every board change, so no square is scanned
+        '''
+        if name is None:
+            return list(self._pieces[player])
+        return [self._board[square // 8][square % 8]
+                for square in bitboard.bitboard_squares(self._bitboards[player][name])]
+
+    def get_occupancy(self, player=None):
+        if player is None:
+            return self._occupancy[Player.PLAYER_1] | self._occupancy[Player.PLAYER_2]
+        return self._occupancy[player]
+
     def get_piece(self, row, col):
         if (0 <= row < 8) and (0 <= col < 8):
-            return self.board[row][col]
+            return self._board[row][col]
 
     def is_valid_piece(self, row, col):
         evaluated_piece = self.get_piece(row, col)
@@ -124,146 +404,132 @@ class game_state:
 
     def get_valid_moves(self, starting_square):
         '''
-        remove pins from valid moves (unless the pinned piece move can get rid of a check and checks is empty
-        remove move from valid moves if the move falls within a check piece's valid move
-        if the moving piece is a king, the ending square cannot be in a check
+        generate the piece's pseudo-legal moves, then keep the ones that do not leave its own king attacked
+        king moves are read off the enemy attack map, other pieces only need testing when pinned, capturing
+        en passant or answering a check
         '''
 
         current_row = starting_square[0]
         current_col = starting_square[1]
 
+        if self.backend == Backend.BITBOARD:
+            if self.is_valid_piece(current_row, current_col):
+                moving_piece = self.get_piece(current_row, current_col)
+                return [bitboard.SQUARES[move[1]] for move in
+                        self._get_bitboard_moves(moving_piece.get_player(),
+                                                 bitboard.square_bit(current_row, current_col))]
+            return None
+
         if self.is_valid_piece(current_row, current_col):
-            valid_moves = []
             moving_piece = self.get_piece(current_row, current_col)
-            if self.get_piece(current_row, current_col).is_player(Player.PLAYER_1):
-                king_location = self._white_king_location
-            else:
-                king_location = self._black_king_location
-            group = self.check_for_check(king_location, moving_piece.get_player())
-            checking_pieces = group[0]
-            pinned_pieces = group[1]
-            pinned_checks = group[2]
-            initial_valid_piece_moves = moving_piece.get_valid_piece_moves(self)
-
-            # immediate check
-            if checking_pieces:
-                for move in initial_valid_piece_moves:
-                    can_move = True
-                    for piece in checking_pieces:
-                        if moving_piece.get_name() == "k":
-                            temp = self.board[current_row][current_col]
-                            self.board[current_row][current_col] = Player.EMPTY
-                            temp2 = self.board[move[0]][move[1]]
-                            self.board[move[0]][move[1]] = temp
-                            if not self.check_for_check(move, moving_piece.get_player())[0]:
-                                pass
-                            else:
-                                can_move = False
-                            self.board[current_row][current_col] = temp
-                            self.board[move[0]][move[1]] = temp2
-                        elif move == piece and len(checking_pieces) == 1 and moving_piece.get_name() != "k" and \
-                                (current_row, current_col) not in pinned_pieces:
-                            pass
-                        elif move != piece and len(checking_pieces) == 1 and moving_piece.get_name() != "k" and \
-                                (current_row, current_col) not in pinned_pieces:
-                            temp = self.board[move[0]][move[1]]
-                            self.board[move[0]][move[1]] = moving_piece
-                            self.board[current_row][current_col] = Player.EMPTY
-                            if self.check_for_check(king_location, moving_piece.get_player())[0]:
-                                can_move = False
-                            self.board[current_row][current_col] = moving_piece
-                            self.board[move[0]][move[1]] = temp
-                        else:
-                            can_move = False
-                    if can_move:
-                        valid_moves.append(move)
-                self._is_check = True
-            # pinned checks
-            elif pinned_pieces and moving_piece.get_name() != "k":
-                if starting_square not in pinned_pieces:
-                    for move in initial_valid_piece_moves:
-                        valid_moves.append(move)
-                elif starting_square in pinned_pieces:
-                    for move in initial_valid_piece_moves:
-
-                        temp = self.board[move[0]][move[1]]
-                        self.board[move[0]][move[1]] = moving_piece
-                        self.board[current_row][current_col] = Player.EMPTY
-                        if not self.check_for_check(king_location, moving_piece.get_player())[0]:
-                            valid_moves.append(move)
-                        self.board[current_row][current_col] = moving_piece
-                        self.board[move[0]][move[1]] = temp
-            else:
-                if moving_piece.get_name() == "k":
-                    for move in initial_valid_piece_moves:
-                        temp = self.board[current_row][current_col]
-                        temp2 = self.board[move[0]][move[1]]
-                        self.board[current_row][current_col] = Player.EMPTY
-                        self.board[move[0]][move[1]] = temp
-                        if not self.check_for_check(move, moving_piece.get_player())[0]:
-                            valid_moves.append(move)
-                        self.board[current_row][current_col] = temp
-                        self.board[move[0]][move[1]] = temp2
-                else:
-                    for move in initial_valid_piece_moves:
-                        valid_moves.append(move)
-            # if not valid_moves:
-            #     if self._is_check:
-            #         self.checkmate = True
-            #     else:
-            #         self.stalemate = True
-            # else:
-            #     self.checkmate = False
-            #     self.stalemate = False
-            return valid_moves
+            return self._get_legal_moves(moving_piece, starting_square, moving_piece.get_valid_piece_moves(self))
         else:
             return None
 
+    def _get_legal_moves(self, moving_piece, starting_square, pseudo_legal_moves):
+        # keep the moves of moving_piece that do not leave its own king attacked
+        analysis = self.get_check_analysis(moving_piece.get_player())
+        if analysis is None:
+            return pseudo_legal_moves
+        checks, pins = analysis[0], analysis[1]
+        if checks:
+            self._is_check = True
+        if moving_piece.get_name() == "k":
+            danger = self._get_king_danger(moving_piece.get_player(), checks)
+            return [move for move in pseudo_legal_moves if not danger >> (move[0] * 8 + move[1]) & 1]
+        is_pawn = moving_piece.get_name() == "p"
+        needs_test = checks or (starting_square[0], starting_square[1]) in pins
+
+        valid_moves = []
+        for move in pseudo_legal_moves:
+            # a pawn moving diagonally onto an empty square is an en passant capture
+            if needs_test or (is_pawn and move[1] != starting_square[1] and self._board[move[0]][move[1]] is Player.EMPTY):
+                if self._leaves_king_attacked(moving_piece, starting_square, move):
+                    continue
+            valid_moves.append(move)
+        return valid_moves
+
+    def _leaves_king_attacked(self, moving_piece, starting_square, ending_square):
+        # test the square of the moving side's king against the occupancy the move would leave behind
+        # only for pieces other than the king, which never moves the square being tested
+        player = moving_piece.get_player()
+        from_bit = bitboard.square_bit(starting_square[0], starting_square[1])
+        to_bit = bitboard.square_bit(ending_square[0], ending_square[1])
+        captured = to_bit
+        # an en passant capture takes the pawn next to the starting square
+        if moving_piece.get_name() == "p" and starting_square[1] != ending_square[1] and \
+                self._board[ending_square[0]][ending_square[1]] is Player.EMPTY:
+            captured = bitboard.square_bit(starting_square[0], ending_square[1])
+        after_occupancy = (self.get_occupancy() ^ from_bit ^ captured) | to_bit
+        return self._is_square_attacked_bitboard(bitboard.lowest_square(self._bitboards[player]["k"]),
+                                                 bitboard.opponent(player), after_occupancy, captured)
+
+    def _get_king_danger(self, player, checks):
+        '''
+        squares the player's king may not move to: everything the enemy attacks, defended pieces included,
+        plus the squares a checking slider reaches once the king stops blocking its line
+        '''
+        danger = self._attack_maps[bitboard.opponent(player)]
+        if checks:
+            occupied = self.get_occupancy() ^ self._bitboards[player]["k"]
+            for check_row, check_col in checks:
+                checking_piece = self._board[check_row][check_col]
+                if checking_piece.get_name() in ("r", "b", "q"):
+                    danger |= self._piece_attacks(checking_piece, check_row * 8 + check_col, occupied)
+        return danger
+
     # 0 if white lost, 1 if black lost, 2 if stalemate, 3 if not game over
     def checkmate_stalemate_checker(self):
-        all_white_moves = self.get_all_legal_moves(Player.PLAYER_1)
-        all_black_moves = self.get_all_legal_moves(Player.PLAYER_2)
-        white_king_moves=self.get_valid_moves(self._white_king_location)
-        all_white_moves_seconds=[pair[1] for pair in all_white_moves]
-        all_black_moves_seconds=[pair[1] for pair in all_black_moves]
-        black_king_moves=self.get_valid_moves(self._black_king_location)
-
-        if self._is_check and self.whose_turn() and not all_white_moves:
-            print("white lost")
-            logging.info("white lost")
-            print(f"white knights moved {self.white_knights_moves_counter} times")
-            logging.info(f"white knights moved {self.white_knights_moves_counter} times")
-            print(f"black knights moved {self.black_knights_moves_counter} times")
-            logging.info(f"black knights moved {self.black_knights_moves_counter} times")
-            return 0
-        elif self._is_check and not self.whose_turn() and not all_black_moves:
-            print("black lost")
-            logging.info("black lost")
-            print(f"white knights moved {self.white_knights_moves_counter} times")
-            logging.info(f"white knights moved {self.white_knights_moves_counter} times")
-            print(f"black knights moved {self.black_knights_moves_counter} times")
-            logging.info(f"black knights moved {self.black_knights_moves_counter} times")
-            return 1
-        elif not all_white_moves and not all_black_moves:
-            print("stalemate")
-            logging.info("stalemate")
-            print(f"white knights moved {self.white_knights_moves_counter} times")
-            logging.info(f"white knights moved {self.white_knights_moves_counter} times")
-            print(f"black knights moved {self.black_knights_moves_counter} times")
-            logging.info(f"black knights moved {self.black_knights_moves_counter} times")
-            return 2
-        elif white_king_moves == all_white_moves_seconds and black_king_moves == all_black_moves_seconds:
-            print("stalemate")
-            logging.info("stalemate")
+        # game_status, reporting how the game ended when it did
+        status = self.game_status()
+        if status != 3:
+            message = {0: "white lost", 1: "black lost", 2: "stalemate"}[status]
+            print(message)
+            logging.info(message)
             print(f"white knights moved {self.white_knights_moves_counter} times")
             logging.info(f"white knights moved {self.white_knights_moves_counter} times")
             print(f"black knights moved {self.black_knights_moves_counter} times")
             logging.info(f"black knights moved {self.black_knights_moves_counter} times")
-            return 2
+        return status
+
+    def game_status(self):
+        '''
+        0 if white is checkmated, 1 if black is checkmated, 2 for stalemate, 3 while the game goes on
+        stalemate is the side to move having no legal move without being in check, or neither side having a legal
+        move for anything but its king
+        stops at the first legal move that settles the answer, prints and logs nothing, leaves the game state as it
+        was and remembers the answer until the position changes
+        '''
+        if self._game_status is not None and self._game_status[:2] == (self.zobrist_key, self.white_turn):
+            return self._game_status[2]
+        # generating moves marks the sticky check flag, which asking for the status must not do
+        is_check = self._is_check
+        player = Player.PLAYER_1 if self.white_turn else Player.PLAYER_2
+        opponent = bitboard.opponent(player)
+        king = self._bitboards[player]["k"]
+        if self._has_legal_move(player, ~king):
+            status = 3
+        elif self._has_legal_move(player, king):
+            status = 3 if self._has_legal_move(opponent, ~self._bitboards[opponent]["k"]) else 2
         else:
-            return 3
+            analysis = self.get_check_analysis(player)
+            if analysis is not None and analysis[0]:
+                status = 0 if self.white_turn else 1
+            else:
+                status = 2
+        self._is_check = is_check
+        self._game_status = (self.zobrist_key, self.white_turn, status)
+        return status
+
+    def _has_legal_move(self, player, pieces_mask):
+        # whether any of the player's pieces on pieces_mask has a legal move, stopping at the first one found
+        for square in bitboard.bitboard_squares(self._occupancy[player] & pieces_mask & bitboard.FULL_BOARD):
+            if self.get_valid_moves(bitboard.SQUARES[square]):
+                return True
+        return False
 
-    def get_all_legal_moves(self, player):
+    def get_all_legal_moves(self, player, packed=False):
+        # packed returns the moves as the ints of the moves module instead of ((row, col), (row, col)) pairs
         # _all_valid_moves = [[], []]
         # for row in range(0, 8):
         #     for col in range(0, 8):
@@ -272,60 +538,219 @@ class game_state:
         #             if valid_moves:
         #                 _all_valid_moves[0].append((row, col))
         #                 _all_valid_moves[1].append(valid_moves)
+        if self.backend == Backend.BITBOARD:
+            if packed:
+                return [self._pack_move(move[0], move[1])
+                        for move in self._get_bitboard_moves(player, bitboard.FULL_BOARD)]
+            return [(bitboard.SQUARES[move[0]], bitboard.SQUARES[move[1]])
+                    for move in self._get_bitboard_moves(player, bitboard.FULL_BOARD)]
+
+        if packed:
+            return [self.pack_move(move[0], move[1]) for move in self.get_all_legal_moves(player)]
+        # the player's occupancy gives its pieces in the same order as scanning the board row by row
         _all_valid_moves = []
-        for row in range(0, 8):
-            for col in range(0, 8):
-                if self.is_valid_piece(row, col) and self.get_piece(row, col).is_player(player):
-                    valid_moves = self.get_valid_moves((row, col))
-                    for move in valid_moves:
-                        _all_valid_moves.append(((row, col), move))
+        for square in bitboard.bitboard_squares(self._occupancy[player]):
+            row, col = bitboard.SQUARES[square]
+            for move in self.get_valid_moves((row, col)):
+                _all_valid_moves.append(((row, col), move))
         return _all_valid_moves
 
+    def get_all_legal_captures(self, player, packed=False):
+        # like get_all_legal_moves, but only the moves that take a piece, for the AI's quiescence search
+        if self.backend == Backend.BITBOARD:
+            captures = self._get_bitboard_moves(player, bitboard.FULL_BOARD,
+                                                self._occupancy[bitboard.opponent(player)])
+            if packed:
+                return [self._pack_move(move[0], move[1]) for move in captures]
+            return [(bitboard.SQUARES[move[0]], bitboard.SQUARES[move[1]]) for move in captures]
+
+        if packed:
+            return [self.pack_move(move[0], move[1]) for move in self.get_all_legal_captures(player)]
+
+        _all_valid_captures = []
+        for square in bitboard.bitboard_squares(self._occupancy[player]):
+            row, col = bitboard.SQUARES[square]
+            capturing_piece = self._board[row][col]
+            for move in self._get_legal_moves(capturing_piece, (row, col),
+                                              capturing_piece.get_valid_piece_takes(self)):
+                _all_valid_captures.append(((row, col), move))
+        return _all_valid_captures
+
+    def pack_move(self, starting_square, ending_square):
+        # the packed int of a legal move given as (row, col) squares, with its kind read off the current position
+        return self._pack_move(starting_square[0] * 8 + starting_square[1], ending_square[0] * 8 + ending_square[1])
+
+    def _pack_move(self, starting_index, ending_index):
+        move = starting_index | ending_index << 6
+        name = self._board[starting_index >> 3][starting_index & 7].get_name()
+        if self._board[ending_index >> 3][ending_index & 7] is not Player.EMPTY:
+            move |= moves.CAPTURE
+        if name == "p":
+            if (starting_index ^ ending_index) & 7 and not move & moves.CAPTURE:
+                move |= moves.CAPTURE | moves.EN_PASSANT
+            elif starting_index - ending_index in (16, -16):
+                move |= moves.DOUBLE_PUSH
+            if ending_index >> 3 in (0, 7):
+                # the AI always promotes to a queen
+                move |= moves.QUEEN_PROMOTION
+        elif name == "k" and starting_index - ending_index in (2, -2):
+            move |= moves.CASTLE
+        return move
+
+    def make_move(self, move):
+        # play a packed move, see move_piece
+        starting_square, ending_square = moves.decode_move(move)
+        self.move_piece(starting_square, ending_square, True, moves.promotion_piece(move) or "q")
+
+    def get_packed_move_log(self):
+        # the moves played so far as packed ints, a null move is 0
+        return list(self.move_log)
+
+    def get_move_log(self):
+        '''
+        the moves played so far as chess_move objects, built from the move log and the undo records on every call
+        for showing the game, the search only ever needs the packed ints
+        '''
+        return [self._undo_stack[index].to_chess_move(move) for index, move in enumerate(self.move_log)]
+
+    def _get_bitboard_moves(self, player, from_mask, to_mask=bitboard.FULL_BOARD):
+        '''
+        generate the moves of the player's pieces on from_mask to the squares on to_mask straight from the bitboards
+        only king moves, pinned pieces, en passant and check evasions are tested against the king being attacked,
+        every other pseudo-legal move is already legal
+        returns (starting square index, ending square index) pairs in board scan order
+        '''
+        enemy = bitboard.opponent(player)
+        own_occupancy = self._occupancy[player]
+        enemy_occupancy = self._occupancy[enemy]
+        occupied = own_occupancy | enemy_occupancy
+        empty = ~occupied & bitboard.FULL_BOARD
+        not_own = ~own_occupancy & bitboard.FULL_BOARD
+        king = self._bitboards[player]["k"]
+        king_square = bitboard.lowest_square(king) if king else -1
+        in_check = False
+        pinned = 0
+        if king:
+            checks, pins = self.get_check_analysis(player)[:2]
+            in_check = bool(checks)
+            if in_check:
+                self._is_check = True
+            for pinned_row, pinned_col in pins:
+                pinned |= bitboard.square_bit(pinned_row, pinned_col)
+            king_danger = self._get_king_danger(player, checks)
+
+        _legal_moves = []
+        for from_square in bitboard.bitboard_squares(own_occupancy & from_mask):
+            row, col = bitboard.SQUARES[from_square]
+            name = self._board[row][col].get_name()
+            en_passant_square = -1
+            if name == "n":
+                targets = bitboard.KNIGHT_ATTACKS[from_square] & not_own
+            elif name == "b":
+                targets = bitboard.bishop_attacks(from_square, occupied) & not_own
+            elif name == "r":
+                targets = bitboard.rook_attacks(from_square, occupied) & not_own
+            elif name == "q":
+                targets = bitboard.queen_attacks(from_square, occupied) & not_own
+            elif name == "k":
+                targets = bitboard.KING_ATTACKS[from_square] & not_own
+                back_row = 0 if player == Player.PLAYER_1 else 7
+                if self.king_can_castle_left(player):
+                    targets |= bitboard.square_bit(back_row, 1)
+                if self.king_can_castle_right(player):
+                    targets |= bitboard.square_bit(back_row, 5)
+                for to_square in bitboard.bitboard_squares(targets & ~king_danger & to_mask):
+                    _legal_moves.append((from_square, to_square))
+                continue
+            else:
+                targets = bitboard.PAWN_ATTACKS[player][from_square] & enemy_occupancy
+                direction = 1 if player == Player.PLAYER_1 else -1
+                start_row = 1 if player == Player.PLAYER_1 else 6
+                if 0 <= row + direction < 8 and empty >> (from_square + 8 * direction) & 1:
+                    targets |= 1 << (from_square + 8 * direction)
+                    if row == start_row and empty >> (from_square + 16 * direction) & 1:
+                        targets |= 1 << (from_square + 16 * direction)
+                if self.can_en_passant(row, col):
+                    en_passant_square = bitboard.square_index(row + direction, self.previous_piece_en_passant()[1])
+                    targets |= 1 << en_passant_square
+            # an en passant capture ends on an empty square but still takes a piece
+            targets &= to_mask if en_passant_square < 0 else to_mask | (1 << en_passant_square)
+
+            if not king or not (in_check or pinned >> from_square & 1 or en_passant_square >= 0):
+                for to_square in bitboard.bitboard_squares(targets):
+                    _legal_moves.append((from_square, to_square))
+                continue
+            from_bit = 1 << from_square
+            for to_square in bitboard.bitboard_squares(targets):
+                to_bit = 1 << to_square
+                captured = to_bit
+                # an en passant capture removes a pawn that is not on the ending square
+                if to_square == en_passant_square:
+                    captured = bitboard.square_bit(row, to_square % 8)
+                after_occupancy = (occupied ^ from_bit ^ captured) | to_bit
+                if not self._is_square_attacked_bitboard(king_square, enemy, after_occupancy, captured):
+                    _legal_moves.append((from_square, to_square))
+        return _legal_moves
+
+    def _is_square_attacked_bitboard(self, square, by_player, occupied, captured):
+        # captured masks out an attacker that the move being tested would take
+        attackers = self._bitboards[by_player]
+        remaining = ~captured
+        if bitboard.KNIGHT_ATTACKS[square] & attackers["n"] & remaining:
+            return True
+        if bitboard.PAWN_ATTACKS[bitboard.opponent(by_player)][square] & attackers["p"] & remaining:
+            return True
+        if bitboard.KING_ATTACKS[square] & attackers["k"]:
+            return True
+        if bitboard.rook_attacks(square, occupied) & (attackers["r"] | attackers["q"]) & remaining:
+            return True
+        if bitboard.bishop_attacks(square, occupied) & (attackers["b"] | attackers["q"]) & remaining:
+            return True
+        return False
+
+    # the king may not castle out of, through or into check: the squares it stands on and crosses must be safe
     def king_can_castle_left(self, player):
         if player is Player.PLAYER_1:
             return self.white_king_can_castle[0] and self.white_king_can_castle[1] and \
-                   self.get_piece(0, 1) is Player.EMPTY and self.get_piece(0, 2) is Player.EMPTY and not self._is_check
+                   self.get_piece(0, 1) is Player.EMPTY and self.get_piece(0, 2) is Player.EMPTY and \
+                   not self._attack_maps[Player.PLAYER_2] & _WHITE_CASTLE_LEFT_PATH
         else:
             return self.black_king_can_castle[0] and self.black_king_can_castle[1] and \
-                   self.get_piece(7, 1) is Player.EMPTY and self.get_piece(7, 2) is Player.EMPTY and not self._is_check
+                   self.get_piece(7, 1) is Player.EMPTY and self.get_piece(7, 2) is Player.EMPTY and \
+                   not self._attack_maps[Player.PLAYER_1] & _BLACK_CASTLE_LEFT_PATH
 
     def king_can_castle_right(self, player):
         if player is Player.PLAYER_1:
             return self.white_king_can_castle[0] and self.white_king_can_castle[2] and \
-                   self.get_piece(0, 6) is Player.EMPTY and self.get_piece(0, 5) is Player.EMPTY and not self._is_check
+                   self.get_piece(0, 6) is Player.EMPTY and self.get_piece(0, 5) is Player.EMPTY and \
+                   self.get_piece(0, 4) is Player.EMPTY and not self._attack_maps[Player.PLAYER_2] & _WHITE_CASTLE_RIGHT_PATH
         else:
             return self.black_king_can_castle[0] and self.black_king_can_castle[2] and \
-                   self.get_piece(7, 6) is Player.EMPTY and self.get_piece(7, 5) is Player.EMPTY and not self._is_check
+                   self.get_piece(7, 6) is Player.EMPTY and self.get_piece(7, 5) is Player.EMPTY and \
+                   self.get_piece(7, 4) is Player.EMPTY and not self._attack_maps[Player.PLAYER_1] & _BLACK_CASTLE_RIGHT_PATH
 
     def promote_pawn(self, starting_square, moved_piece, ending_square):
         while True:
             new_piece_name = input("Change pawn to (r, n, b, q):\n")
             piece_classes = {"r": Rook, "n": Knight, "b": Bishop, "q": Queen}
             if new_piece_name in piece_classes:
-                move = chess_move(starting_square, ending_square, self, self._is_check)
-
                 new_piece = piece_classes[new_piece_name](new_piece_name, ending_square[0],
                                                           ending_square[1], moved_piece.get_player())
-                self.board[ending_square[0]][ending_square[1]] = new_piece
-                self.board[moved_piece.get_row_number()][moved_piece.get_col_number()] = Player.EMPTY
-                moved_piece.change_row_number(ending_square[0])
-                moved_piece.change_col_number(ending_square[1])
-                move.pawn_promotion_move(new_piece)
-                self.move_log.append(move)
+                self._set_square(moved_piece.get_row_number(), moved_piece.get_col_number(), Player.EMPTY)
+                self._set_square(ending_square[0], ending_square[1], new_piece)
+                self._undo_stack[self._undo_depth - 1].pawn_promotion_move(new_piece)
                 break
             else:
                 print("Please choose from these four: r, n, b, q.\n")
 
-    def promote_pawn_ai(self, starting_square, moved_piece, ending_square):
-        move = chess_move(starting_square, ending_square, self, self._is_check)
-        # The ai can only promote the pawn to queen
-        new_piece = Queen("q", ending_square[0], ending_square[1], moved_piece.get_player())
-        self.board[ending_square[0]][ending_square[1]] = new_piece
-        self.board[moved_piece.get_row_number()][moved_piece.get_col_number()] = Player.EMPTY
-        moved_piece.change_row_number(ending_square[0])
-        moved_piece.change_col_number(ending_square[1])
-        move.pawn_promotion_move(new_piece)
-        self.move_log.append(move)
+    def promote_pawn_ai(self, starting_square, moved_piece, ending_square, new_piece_name="q"):
+        # The ai promotes the pawn to queen unless it is told otherwise
+        piece_classes = {"r": Rook, "n": Knight, "b": Bishop, "q": Queen}
+        new_piece = piece_classes[new_piece_name](new_piece_name, ending_square[0], ending_square[1],
+                                                  moved_piece.get_player())
+        self._set_square(moved_piece.get_row_number(), moved_piece.get_col_number(), Player.EMPTY)
+        self._set_square(ending_square[0], ending_square[1], new_piece)
+        self._undo_stack[self._undo_depth - 1].pawn_promotion_move(new_piece)
 
     # have to fix en passant for ai
     def can_en_passant(self, current_square_row, current_square_col):
@@ -340,7 +765,8 @@ class game_state:
         return self._en_passant_previous
 
     # Move a piece
-    def move_piece(self, starting_square, ending_square, is_ai):
+    # promotion is the piece an AI move (is_ai) promotes a pawn to, a person is asked instead
+    def move_piece(self, starting_square, ending_square, is_ai, promotion="q"):
         current_square_row = starting_square[0]  # The integer row value of the starting square
         current_square_col = starting_square[1]  # The integer col value of the starting square
         next_square_row = ending_square[0]  # The integer row value of the ending square
@@ -360,73 +786,58 @@ class game_state:
             temp = True
 
             if ending_square in valid_moves:
+                rights_key = self._get_rights_key()
+                moved_two = False
                 moved_to_piece = self.get_piece(next_square_row, next_square_col)
+                record = self._push_undo_record(self.pack_move(starting_square, ending_square), moving_piece,
+                                                moved_to_piece)
                 if moving_piece.get_name() == "k":
                     if moving_piece.is_player(Player.PLAYER_1):
                         if moved_to_piece == Player.EMPTY and next_square_col == 1 and self.king_can_castle_left(
                                 moving_piece.get_player()):
-                            move = chess_move(starting_square, ending_square, self, self._is_check)
-                            move.castling_move((0, 0), (0, 2), self)
-                            self.move_log.append(move)
+                            record.castling_move((0, 0), (0, 2), self.get_piece(0, 0))
 
                             # move rook
-                            self.get_piece(0, 0).change_col_number(2)
-
-                            self.board[0][2] = self.board[0][0]
-                            self.board[0][0] = Player.EMPTY
+                            self._set_square(0, 2, self.get_piece(0, 0))
+                            self._set_square(0, 0, Player.EMPTY)
 
                             self.white_king_can_castle[0] = False
                             self.white_king_can_castle[1] = False
 
                         elif moved_to_piece == Player.EMPTY and next_square_col == 5 and self.king_can_castle_right(
                                 moving_piece.get_player()):
-                            move = chess_move(starting_square, ending_square, self, self._is_check)
-                            move.castling_move((0, 7), (0, 4), self)
-                            self.move_log.append(move)
+                            record.castling_move((0, 7), (0, 4), self.get_piece(0, 7))
                             # move rook
-                            self.get_piece(0, 7).change_col_number(4)
-
-                            self.board[0][4] = self.board[0][7]
-                            self.board[0][7] = Player.EMPTY
+                            self._set_square(0, 4, self.get_piece(0, 7))
+                            self._set_square(0, 7, Player.EMPTY)
 
                             self.white_king_can_castle[0] = False
                             self.white_king_can_castle[2] = False
                         else:
-                            move = chess_move(starting_square, ending_square, self, self._is_check)
-                            self.move_log.append(move)
                             self.white_king_can_castle[0] = False
                         self._white_king_location = (next_square_row, next_square_col)
                     else:
                         if moved_to_piece == Player.EMPTY and next_square_col == 1 and self.king_can_castle_left(
                                 moving_piece.get_player()):
-                            move = chess_move(starting_square, ending_square, self, self._is_check)
-                            move.castling_move((7, 0), (7, 2), self)
-                            self.move_log.append(move)
+                            record.castling_move((7, 0), (7, 2), self.get_piece(7, 0))
 
-                            self.get_piece(7, 0).change_col_number(2)
                             # move rook
-                            self.board[7][2] = self.board[7][0]
-                            self.board[7][0] = Player.EMPTY
+                            self._set_square(7, 2, self.get_piece(7, 0))
+                            self._set_square(7, 0, Player.EMPTY)
 
                             self.black_king_can_castle[0] = False
                             self.black_king_can_castle[1] = False
                         elif moved_to_piece == Player.EMPTY and next_square_col == 5 and self.king_can_castle_right(
                                 moving_piece.get_player()):
-                            move = chess_move(starting_square, ending_square, self, self._is_check)
-                            move.castling_move((7, 7), (7, 4), self)
-                            self.move_log.append(move)
-
-                            self.get_piece(0, 7).change_col_number(4)
+                            record.castling_move((7, 7), (7, 4), self.get_piece(7, 7))
 
                             # move rook
-                            self.board[7][4] = self.board[7][7]
-                            self.board[7][7] = Player.EMPTY
+                            self._set_square(7, 4, self.get_piece(7, 7))
+                            self._set_square(7, 7, Player.EMPTY)
 
                             self.black_king_can_castle[0] = False
                             self.black_king_can_castle[2] = False
                         else:
-                            move = chess_move(starting_square, ending_square, self, self._is_check)
-                            self.move_log.append(move)
                             self.black_king_can_castle[0] = False
                         self._black_king_location = (next_square_row, next_square_col)
                         # self.can_en_passant_bool = False  WHAT IS THIS
@@ -436,10 +847,9 @@ class game_state:
                     elif moving_piece.is_player(Player.PLAYER_1) and current_square_col == 7:
                         self.white_king_can_castle[2] = False
                     elif moving_piece.is_player(Player.PLAYER_2) and current_square_col == 0:
-                        self.white_king_can_castle[1] = False
+                        self.black_king_can_castle[1] = False
                     elif moving_piece.is_player(Player.PLAYER_2) and current_square_col == 7:
-                        self.white_king_can_castle[2] = False
-                    self.move_log.append(chess_move(starting_square, ending_square, self, self._is_check))
+                        self.black_king_can_castle[2] = False
                     self.can_en_passant_bool = False
                 # Add move class here
                 elif moving_piece.get_name() == "p":
@@ -447,7 +857,7 @@ class game_state:
                     if moving_piece.is_player(Player.PLAYER_1) and next_square_row == 7:
                         # print("promoting white pawn")
                         if is_ai:
-                            self.promote_pawn_ai(starting_square, moving_piece, ending_square)
+                            self.promote_pawn_ai(starting_square, moving_piece, ending_square, promotion)
                         else:
                             self.promote_pawn(starting_square, moving_piece, ending_square)
                         temp = False
@@ -455,7 +865,7 @@ class game_state:
                     elif moving_piece.is_player(Player.PLAYER_2) and next_square_row == 0:
                         # print("promoting black pawn")
                         if is_ai:
-                            self.promote_pawn_ai(starting_square, moving_piece, ending_square)
+                            self.promote_pawn_ai(starting_square, moving_piece, ending_square, promotion)
                         else:
                             self.promote_pawn(starting_square, moving_piece, ending_square)
                         temp = False
@@ -463,32 +873,26 @@ class game_state:
                     # Problem with Pawn en passant ai
                     elif abs(next_square_row - current_square_row) == 2 and current_square_col == next_square_col:
                         # print("move pawn forward")
-                        self.move_log.append(chess_move(starting_square, ending_square, self, self._is_check))
                         # self.can_en_passant_bool = True
                         self._en_passant_previous = (next_square_row, next_square_col)
+                        moved_two = True
                     # en passant
                     elif abs(next_square_row - current_square_row) == 1 and abs(
                             current_square_col - next_square_col) == 1 and \
                             self.can_en_passant(current_square_row, current_square_col):
                         # print("en passant")
                         if moving_piece.is_player(Player.PLAYER_1):
-                            move = chess_move(starting_square, ending_square, self, self._is_check)
-                            move.en_passant_move(self.board[next_square_row - 1][next_square_col],
-                                                 (next_square_row - 1, next_square_col))
-                            self.move_log.append(move)
-                            self.board[next_square_row - 1][next_square_col] = Player.EMPTY
+                            record.en_passant_move(self.get_piece(next_square_row - 1, next_square_col),
+                                                   (next_square_row - 1, next_square_col))
+                            self._set_square(next_square_row - 1, next_square_col, Player.EMPTY)
                         else:
-                            move = chess_move(starting_square, ending_square, self, self._is_check)
-                            move.en_passant_move(self.board[next_square_row + 1][next_square_col],
-                                                 (next_square_row + 1, next_square_col))
-                            self.move_log.append(move)
-                            self.board[next_square_row + 1][next_square_col] = Player.EMPTY
+                            record.en_passant_move(self.get_piece(next_square_row + 1, next_square_col),
+                                                   (next_square_row + 1, next_square_col))
+                            self._set_square(next_square_row + 1, next_square_col, Player.EMPTY)
                     # moving forward by one or taking a piece
                     else:
-                        self.move_log.append(chess_move(starting_square, ending_square, self, self._is_check))
                         self.can_en_passant_bool = False
                 else:
-                    self.move_log.append(chess_move(starting_square, ending_square, self, self._is_check))
                     # counting the knights movements
                     if moving_piece.get_name() == "n":
                         if moving_piece.get_player() == Player.PLAYER_1:
@@ -498,95 +902,105 @@ class game_state:
                     self.can_en_passant_bool = False
 
                 if temp:
-                    moving_piece.change_row_number(next_square_row)
-                    moving_piece.change_col_number(next_square_col)
-                    self.board[next_square_row][next_square_col] = self.board[current_square_row][current_square_col]
-                    self.board[current_square_row][current_square_col] = Player.EMPTY
+                    self._set_square(current_square_row, current_square_col, Player.EMPTY)
+                    self._set_square(next_square_row, next_square_col, moving_piece)
 
+                if not moved_two:
+                    self._en_passant_previous = (-1, -1)
+                self.move_log.append(record.move)
                 self.white_turn = not self.white_turn
+                self.zobrist_key ^= rights_key ^ self._get_rights_key() ^ zobrist.SIDE_KEY
+                self._invalidate_check_analysis()
+                if self.zobrist_debug:
+                    self._verify_zobrist_key()
+                if self.evaluation_debug:
+                    self._verify_evaluation()
 
             else:
                 pass
 
+    def _push_undo_record(self, move, moving_piece, captured_piece):
+        # write down the move and the state it is about to change, before it changes any of it
+        if self._undo_depth == len(self._undo_stack):
+            self._undo_stack.append(undo_record())
+        record = self._undo_stack[self._undo_depth]
+        self._undo_depth += 1
+        record.move = move
+        record.moving_piece = moving_piece
+        record.captured_piece = captured_piece
+        record.captured_square = None
+        record.rook = None
+        record.promoted_piece = None
+        record.in_check = self._is_check
+        record.white_king_could_castle[:] = self.white_king_can_castle
+        record.black_king_could_castle[:] = self.black_king_can_castle
+        record.en_passant_previous = self._en_passant_previous
+        record.white_king_location = self._white_king_location
+        record.black_king_location = self._black_king_location
+        record.zobrist_key = self.zobrist_key
+        record.pawn_key = self.pawn_key
+        record.white_material = self._material[Player.PLAYER_1]
+        record.black_material = self._material[Player.PLAYER_2]
+        record.white_piece_square_score = self._piece_square_scores[Player.PLAYER_1]
+        record.black_piece_square_score = self._piece_square_scores[Player.PLAYER_2]
+        return record
+
+    def make_null_move(self):
+        '''
+        let the side to move pass without moving a piece, for the AI's null move pruning
+        logged like any other move, so undo_move takes it back
+        '''
+        self._push_undo_record(moves.NULL_MOVE, None, Player.EMPTY)
+        self.move_log.append(moves.NULL_MOVE)
+        rights_key = self._get_rights_key()
+        self._en_passant_previous = (-1, -1)
+        self.white_turn = not self.white_turn
+        self.zobrist_key ^= rights_key ^ self._get_rights_key() ^ zobrist.SIDE_KEY
+        if self.zobrist_debug:
+            self._verify_zobrist_key()
+
     def undo_move(self):
+        # takes back the last move and returns it as a packed int
         if self.move_log:
             undoing_move = self.move_log.pop()
-            if undoing_move.castled is True:
-                self.board[undoing_move.starting_square_row][
-                    undoing_move.starting_square_col] = undoing_move.moving_piece
-                self.board[undoing_move.ending_square_row][undoing_move.ending_square_col] = undoing_move.removed_piece
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_row_number(
-                    undoing_move.starting_square_row)
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_col_number(
-                    undoing_move.starting_square_col)
-
-                self.board[undoing_move.rook_starting_square[0]][
-                    undoing_move.rook_starting_square[1]] = undoing_move.moving_rook
-                self.board[undoing_move.rook_ending_square[0]][undoing_move.rook_ending_square[1]] = Player.EMPTY
-                undoing_move.moving_rook.change_row_number(undoing_move.rook_starting_square[0])
-                undoing_move.moving_rook.change_col_number(undoing_move.rook_starting_square[1])
-                if undoing_move.moving_piece is Player.PLAYER_1:
-                    if undoing_move.rook_starting_square[1] == 0:
-                        self.white_king_can_castle[0] = True
-                        self.white_king_can_castle[1] = True
-                    elif undoing_move.rook_starting_square[1] == 7:
-                        self.white_king_can_castle[0] = True
-                        self.white_king_can_castle[2] = True
+            self._undo_depth -= 1
+            record = self._undo_stack[self._undo_depth]
+            if undoing_move != moves.NULL_MOVE:
+                # a null move did not change the board, any other move puts the moving piece back (a pawn for
+                # a promotion) and whatever it took, and castling puts the rook back too
+                starting_index = moves.starting_index(undoing_move)
+                ending_index = moves.ending_index(undoing_move)
+                self._set_square(starting_index >> 3, starting_index & 7, record.moving_piece)
+                if undoing_move & moves.EN_PASSANT:
+                    self._set_square(ending_index >> 3, ending_index & 7, Player.EMPTY)
+                    self._set_square(record.captured_square[0], record.captured_square[1], record.captured_piece)
+                    self.can_en_passant_bool = True
                 else:
-                    if undoing_move.rook_starting_square[1] == 0:
-                        self.black_king_can_castle[0] = True
-                        self.black_king_can_castle[1] = True
-                    elif undoing_move.rook_starting_square[1] == 7:
-                        self.black_king_can_castle[0] = True
-                        self.black_king_can_castle[2] = True
-            elif undoing_move.pawn_promoted is True:
-                self.board[undoing_move.starting_square_row][
-                    undoing_move.starting_square_col] = undoing_move.moving_piece
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_row_number(
-                    undoing_move.starting_square_row)
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_col_number(
-                    undoing_move.starting_square_col)
-
-                self.board[undoing_move.ending_square_row][undoing_move.ending_square_col] = undoing_move.removed_piece
-                if undoing_move.removed_piece != Player.EMPTY:
-                    self.get_piece(undoing_move.ending_square_row, undoing_move.ending_square_col).change_row_number(
-                        undoing_move.ending_square_row)
-                    self.get_piece(undoing_move.ending_square_row, undoing_move.ending_square_col).change_col_number(
-                        undoing_move.ending_square_col)
-            elif undoing_move.en_passaned is True:
-                self.board[undoing_move.starting_square_row][
-                    undoing_move.starting_square_col] = undoing_move.moving_piece
-                self.board[undoing_move.ending_square_row][undoing_move.ending_square_col] = undoing_move.removed_piece
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_row_number(
-                    undoing_move.starting_square_row)
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_col_number(
-                    undoing_move.starting_square_col)
-
-                self.board[undoing_move.en_passant_eaten_square[0]][
-                    undoing_move.en_passant_eaten_square[1]] = undoing_move.en_passant_eaten_piece
-                self.can_en_passant_bool = True
-            else:
-                self.board[undoing_move.starting_square_row][
-                    undoing_move.starting_square_col] = undoing_move.moving_piece
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_row_number(
-                    undoing_move.starting_square_row)
-                self.get_piece(undoing_move.starting_square_row, undoing_move.starting_square_col).change_col_number(
-                    undoing_move.starting_square_col)
-
-                self.board[undoing_move.ending_square_row][undoing_move.ending_square_col] = undoing_move.removed_piece
-                if undoing_move.removed_piece != Player.EMPTY:
-                    self.get_piece(undoing_move.ending_square_row, undoing_move.ending_square_col).change_row_number(
-                        undoing_move.ending_square_row)
-                    self.get_piece(undoing_move.ending_square_row, undoing_move.ending_square_col).change_col_number(
-                        undoing_move.ending_square_col)
-
+                    self._set_square(ending_index >> 3, ending_index & 7, record.captured_piece)
+                if record.rook is not None:
+                    self._set_square(record.rook_starting_square[0], record.rook_starting_square[1], record.rook)
+                    self._set_square(record.rook_ending_square[0], record.rook_ending_square[1], Player.EMPTY)
+
+            # everything else is copied back from the record instead of being worked out again
+            self.white_king_can_castle[:] = record.white_king_could_castle
+            self.black_king_can_castle[:] = record.black_king_could_castle
+            self._en_passant_previous = record.en_passant_previous
+            self._white_king_location = record.white_king_location
+            self._black_king_location = record.black_king_location
+            self.zobrist_key = record.zobrist_key
+            self.pawn_key = record.pawn_key
+            self._material[Player.PLAYER_1] = record.white_material
+            self._material[Player.PLAYER_2] = record.black_material
+            self._piece_square_scores[Player.PLAYER_1] = record.white_piece_square_score
+            self._piece_square_scores[Player.PLAYER_2] = record.black_piece_square_score
             self.white_turn = not self.white_turn
+            self._invalidate_check_analysis()
+            if self.zobrist_debug:
+                self._verify_zobrist_key()
+            if self.evaluation_debug:
+                self._verify_evaluation()
             # if undoing_move.in_check:
             #     self._is_check = True
-            if undoing_move.moving_piece.get_name() == 'k' and undoing_move.moving_piece.get_player() is Player.PLAYER_1:
-                self._white_king_location = (undoing_move.starting_square_row, undoing_move.starting_square_col)
-            elif undoing_move.moving_piece.get_name() == 'k' and undoing_move.moving_piece.get_player() is Player.PLAYER_2:
-                self._black_king_location = (undoing_move.starting_square_row, undoing_move.starting_square_col)
 
             return undoing_move
         else:
@@ -608,311 +1022,120 @@ class game_state:
     '''
 
     def check_for_check(self, king_location, player):
-        # self._is_check = False
+        # the player's own king never blocks a ray, so a king stepping along a checking line stays in check
         _checks = []
         _pins = []
         _pins_check = []
 
-        king_location_row = king_location[0]
-        king_location_col = king_location[1]
-
-        _up = 1
-        _down = 1
-        _left = 1
-        _right = 1
-
-        # Left of the king
-        _possible_pin = ()
-        while king_location_col - _left >= 0 and self.get_piece(king_location_row,
-                                                                king_location_col - _left) is not None:
-            if self.is_valid_piece(king_location_row, king_location_col - _left) and \
-                    self.get_piece(king_location_row, king_location_col - _left).is_player(player) and \
-                    self.get_piece(king_location_row, king_location_col - _left).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row, king_location_col - _left)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row, king_location_col - _left) and \
-                    not self.get_piece(king_location_row, king_location_col - _left).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row,
-                                                                                king_location_col - _left).get_valid_piece_takes(
-                            self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row, king_location_col - _left))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row,
-                                                                                king_location_col - _left).get_valid_piece_takes(
-                            self):
-                        # self._is_check = True
-                        _checks.append((king_location_row, king_location_col - _left))
-                break
-            _left += 1
-
-        # right of the king
-        _possible_pin = ()
-        while king_location_col + _right < 8 and self.get_piece(king_location_row,
-                                                                king_location_col + _right) is not None:
-            if self.is_valid_piece(king_location_row, king_location_col + _right) and \
-                    self.get_piece(king_location_row, king_location_col + _right).is_player(player) and \
-                    self.get_piece(king_location_row, king_location_col + _right).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row, king_location_col + _right)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row, king_location_col + _right) and \
-                    not self.get_piece(king_location_row, king_location_col + _right).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row,
-                                                                                king_location_col + _right).get_valid_piece_takes(
-                            self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row, king_location_col + _right))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row,
-                                                                                king_location_col + _right).get_valid_piece_takes(
-                            self):
-                        # self._is_check = True
-                        _checks.append((king_location_row, king_location_col + _right))
-                break
-            _right += 1
-
-        # below the king
-        _possible_pin = ()
-        while king_location_row + _down < 8 and self.get_piece(king_location_row + _down,
-                                                               king_location_col) is not None:
-            if self.is_valid_piece(king_location_row + _down, king_location_col) and \
-                    self.get_piece(king_location_row + _down, king_location_col).is_player(player) and \
-                    self.get_piece(king_location_row + _down, king_location_col).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row + _down, king_location_col)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row + _down, king_location_col) and \
-                    not self.get_piece(king_location_row + _down, king_location_col).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row + _down,
-                                                                                king_location_col).get_valid_piece_takes(
-                            self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row + _down, king_location_col))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row + _down,
-                                                                                king_location_col).get_valid_piece_takes(
-                        self):
-                        # self._is_check = True
-                        _checks.append((king_location_row + _down, king_location_col))
-                break
-            _down += 1
-
-        # above the king
-        _possible_pin = ()
-        while king_location_row - _up >= 0 and self.get_piece(king_location_row - _up, king_location_col) is not None:
-            if self.is_valid_piece(king_location_row - _up, king_location_col) and \
-                    self.get_piece(king_location_row - _up, king_location_col).is_player(player) and \
-                    self.get_piece(king_location_row - _up, king_location_col).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row - _up, king_location_col)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row - _up, king_location_col) and \
-                    not self.get_piece(king_location_row - _up, king_location_col).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row - _up,
-                                                                                king_location_col).get_valid_piece_takes(
-                            self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row - _up, king_location_col))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row - _up,
-                                                                                king_location_col).get_valid_piece_takes(
-                            self):
-                        # self._is_check = True
-                        _checks.append((king_location_row - _up, king_location_col))
-                break
-            _up += 1
-
-        # left up
-        _up = 1
-        _left = 1
-        _possible_pin = ()
-        while king_location_col - _left >= 0 and king_location_row - _up >= 0 and \
-                self.get_piece(king_location_row - _up, king_location_col - _left) is not None:
-            if self.is_valid_piece(king_location_row - _up, king_location_col - _left) and \
-                    self.get_piece(king_location_row - _up, king_location_col - _left).is_player(player) and \
-                    self.get_piece(king_location_row - _up, king_location_col - _left).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row - _up, king_location_col - _left)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row - _up, king_location_col - _left) and \
-                    not self.get_piece(king_location_row - _up, king_location_col - _left).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row - _up,
-                                                                                king_location_col - _left).get_valid_piece_takes(
-                            self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row - _up, king_location_col - _left))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row - _up,
-                                                                                king_location_col - _left).get_valid_piece_takes(
-                        self):
-                        # self._is_check = True
-                        _checks.append((king_location_row - _up, king_location_col - _left))
-                break
-            _left += 1
-            _up += 1
-
-        # right up
-        _up = 1
-        _right = 1
-        _possible_pin = ()
-        while king_location_col + _right < 8 and king_location_row - _up >= 0 and \
-                self.get_piece(king_location_row - _up, king_location_col + _right) is not None:
-            if self.is_valid_piece(king_location_row - _up, king_location_col + _right) and \
-                    self.get_piece(king_location_row - _up, king_location_col + _right).is_player(player) and \
-                    self.get_piece(king_location_row - _up, king_location_col + _right).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row - _up, king_location_col + _right)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row - _up, king_location_col + _right) and \
-                    not self.get_piece(king_location_row - _up, king_location_col + _right).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row - _up,
-                                                                                king_location_col + _right).get_valid_piece_takes(
-                            self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row - _up, king_location_col + _right))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row - _up,
-                                                                                king_location_col + _right).get_valid_piece_takes(
-                        self):
-                        # self._is_check = True
-                        _checks.append((king_location_row - _up, king_location_col + _right))
+        king_square = bitboard.square_index(king_location[0], king_location[1])
+        enemy_pieces = self._bitboards[bitboard.opponent(player)]
+        own_occupancy = self._occupancy[player] & ~self._bitboards[player]["k"]
+        occupied = own_occupancy | self._occupancy[bitboard.opponent(player)]
+
+        # rooks, bishops and queens, including the ones pinning a single own piece to the king
+        for attack_function, sliders in ((bitboard.rook_attacks, enemy_pieces["r"] | enemy_pieces["q"]),
+                                         (bitboard.bishop_attacks, enemy_pieces["b"] | enemy_pieces["q"])):
+            if not sliders:
+                continue
+            attacks = attack_function(king_square, occupied)
+            for checking_square in bitboard.bitboard_squares(attacks & sliders):
+                _checks.append(bitboard.SQUARES[checking_square])
+            for blocker in bitboard.bitboard_squares(attacks & own_occupancy):
+                pinning = attack_function(king_square, occupied ^ (1 << blocker)) & ~attacks & sliders
+                if pinning:
+                    _pins.append(bitboard.SQUARES[blocker])
+                    _pins_check.append(bitboard.SQUARES[bitboard.lowest_square(pinning)])
+
+        # knights, pawns and the other king
+        for checking_square in bitboard.bitboard_squares(
+                (bitboard.KNIGHT_ATTACKS[king_square] & enemy_pieces["n"]) |
+                (bitboard.PAWN_ATTACKS[player][king_square] & enemy_pieces["p"]) |
+                (bitboard.KING_ATTACKS[king_square] & enemy_pieces["k"])):
+            _checks.append(bitboard.SQUARES[checking_square])
 
-                break
-            _right += 1
-            _up += 1
-
-        # left down
-        _down = 1
-        _left = 1
-        _possible_pin = ()
-        while king_location_col - _left >= 0 and king_location_row + _down < 8 and \
-                self.get_piece(king_location_row + _down, king_location_col - _left) is not None:
-            if self.is_valid_piece(king_location_row + _down, king_location_col - _left) and \
-                    self.get_piece(king_location_row + _down, king_location_col - _left).is_player(player) and \
-                    self.get_piece(king_location_row + _down, king_location_col - _left).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row + _down, king_location_col - _left)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row + _down, king_location_col - _left) and \
-                    not self.get_piece(king_location_row + _down, king_location_col - _left).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row + _down,
-                                                                                king_location_col - _left).get_valid_piece_takes(
-                            self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row + _down, king_location_col - _left))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row + _down,
-                                                                                king_location_col - _left).get_valid_piece_takes(
-                        self):
-                        # self._is_check = True
-                        _checks.append((king_location_row + _down, king_location_col - _left))
+        return [_checks, _pins, _pins_check]
 
-                break
-            _left += 1
-            _down += 1
-
-        # right down
-        _down = 1
-        _right = 1
-        _possible_pin = ()
-        while king_location_col + _right < 8 and king_location_row + _down < 8 and \
-                self.get_piece(king_location_row + _down, king_location_col + _right) is not None:
-            if self.is_valid_piece(king_location_row + _down, king_location_col + _right) and \
-                    self.get_piece(king_location_row + _down, king_location_col + _right).is_player(player) and \
-                    self.get_piece(king_location_row + _down, king_location_col + _right).get_name() != "k":
-                if not _possible_pin:
-                    _possible_pin = (king_location_row + _down, king_location_col + _right)
-                else:
-                    break
-            elif self.is_valid_piece(king_location_row + _down, king_location_col + _right) and \
-                    not self.get_piece(king_location_row + _down, king_location_col + _right).is_player(player):
-                if _possible_pin:
-                    temp = self.board[_possible_pin[0]][_possible_pin[1]]
-                    self.board[_possible_pin[0]][_possible_pin[1]] = Player.EMPTY
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row + _down,
-                                                                                king_location_col + _right).get_valid_piece_takes(
-                            self):
-                        _pins.append(_possible_pin)
-                        _pins_check.append((king_location_row + _down, king_location_col + _right))
-                    self.board[_possible_pin[0]][_possible_pin[1]] = temp
-                else:
-                    if (king_location_row, king_location_col) in self.get_piece(king_location_row + _down,
-                                                                                king_location_col + _right).get_valid_piece_takes(
-                        self):
-                        # self._is_check = True
-                        _checks.append((king_location_row + _down, king_location_col + _right))
 
-                break
-            _right += 1
-            _down += 1
-
-        # knights
-        row_change = [-2, -2, -1, -1, +1, +1, +2, +2]
-        col_change = [-1, +1, -2, +2, -2, +2, +1, -1]
-        for i in range(0, 8):
-            if self.is_valid_piece(king_location_row + row_change[i], king_location_col + col_change[i]) and \
-                    not self.get_piece(king_location_row + row_change[i], king_location_col + col_change[i]).is_player(
-                        player):
-                if (king_location_row, king_location_col) in self.get_piece(king_location_row + row_change[i],
-                                                                            king_location_col + col_change[
-                                                                                i]).get_valid_piece_takes(self):
-                    # self._is_check = True
-                    _checks.append((king_location_row + row_change[i], king_location_col + col_change[i]))
-
-        # print([_checks, _pins, _pins_check])
-        return [_checks, _pins, _pins_check]
+class undo_record():
+    '''
+    a move of the move log with the pieces it moved and took, and what else it changed as it was before the move
+    game_state keeps a stack of these next to the move log and fills the same records in again move after move,
+    so undo_move puts the pieces back and copies the old state back instead of working it out
+    '''
+    __slots__ = ("move", "moving_piece", "captured_piece", "captured_square", "rook", "rook_starting_square",
+                 "rook_ending_square", "promoted_piece", "in_check", "white_king_could_castle", "black_king_could_castle",
+                 "en_passant_previous", "white_king_location", "black_king_location", "zobrist_key", "pawn_key",
+                 "white_material", "black_material", "white_piece_square_score", "black_piece_square_score")
+
+    def __init__(self):
+        self.move = moves.NULL_MOVE
+        self.moving_piece = None
+        # the piece the move took, and for en passant the square it stood on (None when it is the ending square)
+        self.captured_piece = Player.EMPTY
+        self.captured_square = None
+        # the rook a castling move moved, None for any other move
+        self.rook = None
+        self.rook_starting_square = None
+        self.rook_ending_square = None
+        # the piece a pawn promoted to, None for any other move
+        self.promoted_piece = None
+        self.in_check = False
+        self.white_king_could_castle = [True, True, True]
+        self.black_king_could_castle = [True, True, True]
+        self.en_passant_previous = (-1, -1)
+        self.white_king_location = None
+        self.black_king_location = None
+        self.zobrist_key = 0
+        self.pawn_key = 0
+        self.white_material = 0
+        self.black_material = 0
+        self.white_piece_square_score = 0
+        self.black_piece_square_score = 0
+
+    def castling_move(self, rook_starting_square, rook_ending_square, rook):
+        self.rook = rook
+        self.rook_starting_square = rook_starting_square
+        self.rook_ending_square = rook_ending_square
+
+    def pawn_promotion_move(self, new_piece):
+        self.promoted_piece = new_piece
+        self.move = moves.with_promotion(self.move, new_piece.get_name())
+
+    def en_passant_move(self, eaten_piece, eaten_piece_square):
+        self.captured_piece = eaten_piece
+        self.captured_square = eaten_piece_square
+
+    def to_chess_move(self, move):
+        # the chess_move of the logged move this record belongs to
+        if move == moves.NULL_MOVE:
+            logged_move = chess_move((-1, -1), (-1, -1), None, Player.EMPTY, self.in_check)
+            logged_move.null_move()
+            return logged_move
+        starting_square, ending_square = moves.decode_move(move)
+        if move & moves.EN_PASSANT:
+            logged_move = chess_move(starting_square, ending_square, self.moving_piece, Player.EMPTY, self.in_check)
+            logged_move.en_passant_move(self.captured_piece, self.captured_square)
+        else:
+            logged_move = chess_move(starting_square, ending_square, self.moving_piece, self.captured_piece,
+                                     self.in_check)
+        if self.rook is not None:
+            logged_move.castling_move(self.rook_starting_square, self.rook_ending_square, self.rook)
+        if self.promoted_piece is not None:
+            logged_move.pawn_promotion_move(self.promoted_piece)
+        return logged_move
 
 
 class chess_move():
-    def __init__(self, starting_square, ending_square, game_state, in_check):
+    # a move of the game for showing it, see game_state.get_move_log
+    def __init__(self, starting_square, ending_square, moving_piece, removed_piece, in_check):
         self.starting_square_row = starting_square[0]
         self.starting_square_col = starting_square[1]
-        self.moving_piece = game_state.get_piece(self.starting_square_row, self.starting_square_col)
+        self.moving_piece = moving_piece
         self.in_check = in_check
 
         self.ending_square_row = ending_square[0]
         self.ending_square_col = ending_square[1]
-        if game_state.is_valid_piece(self.ending_square_row, self.ending_square_col):
-            self.removed_piece = game_state.get_piece(self.ending_square_row, self.ending_square_col)
-        else:
-            self.removed_piece = Player.EMPTY
+        self.removed_piece = removed_piece
 
         self.castled = False
         self.rook_starting_square = None
@@ -926,11 +1149,13 @@ class chess_move():
         self.en_passant_eaten_piece = None
         self.en_passant_eaten_square = None
 
-    def castling_move(self, rook_starting_square, rook_ending_square, game_state):
+        self.passed = False
+
+    def castling_move(self, rook_starting_square, rook_ending_square, moving_rook):
         self.castled = True
         self.rook_starting_square = rook_starting_square
         self.rook_ending_square = rook_ending_square
-        self.moving_rook = game_state.get_piece(rook_starting_square[0], rook_starting_square[1])
+        self.moving_rook = moving_rook
 
     def pawn_promotion_move(self, new_piece):
         self.pawn_promoted = True
@@ -941,6 +1166,26 @@ class chess_move():
         self.en_passant_eaten_piece = eaten_piece
         self.en_passant_eaten_square = eaten_piece_square
 
+    def null_move(self):
+        self.passed = True
+
+    def packed_move(self):
+        # the move as a packed int of the moves module, 0 for a null move
+        if self.passed:
+            return 0
+        flags = 0
+        if self.removed_piece is not Player.EMPTY:
+            flags |= moves.CAPTURE
+        if self.castled:
+            flags |= moves.CASTLE
+        if self.en_passaned:
+            flags |= moves.CAPTURE | moves.EN_PASSANT
+        if self.moving_piece.get_name() == "p" and abs(self.ending_square_row - self.starting_square_row) == 2:
+            flags |= moves.DOUBLE_PUSH
+        return moves.encode_move((self.starting_square_row, self.starting_square_col),
+                                 (self.ending_square_row, self.ending_square_col),
+                                 self.replacement_piece.get_name() if self.pawn_promoted else None, flags)
+
     def get_moving_piece(self):
         return self.moving_piece
 
@@ -62,12 +62,9 @@ def draw_pieces(screen, game_state):
     :param screen:          -- the pygame screen
     :param game_state:      -- the current state of the chess game
     '''
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = game_state.get_piece(r, c)
-            if piece is not None and piece != Player.EMPTY:
-                screen.blit(IMAGES[piece.get_player() + "_" + piece.get_name()],
-                            py.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    for piece in game_state.get_pieces(Player.PLAYER_1) + game_state.get_pieces(Player.PLAYER_2):
+        screen.blit(IMAGES[piece.get_player() + "_" + piece.get_name()],
+                    py.Rect(piece.get_col_number() * SQ_SIZE, piece.get_row_number() * SQ_SIZE, SQ_SIZE, SQ_SIZE))
 
 
 def highlight_square(screen, game_state, valid_moves, square_selected):
@@ -135,7 +132,7 @@ def main():
     ai = ai_engine.chess_ai()
     game_state = chess_engine.game_state()
     if human_player == 'b':
-        ai_move = ai.minimax_black(game_state, 3, -100000, 100000, True, Player.PLAYER_1)
+        ai_move = ai.search(game_state, 3).move
         game_state.move_piece(ai_move[0], ai_move[1], True)
 
     round = 0
@@ -172,12 +169,10 @@ def main():
                             player_clicks = []
                             valid_moves = []
 
-                            if human_player == 'w':
-                                ai_move = ai.minimax_white(game_state, 3, -100000, 100000, True, Player.PLAYER_2)
-                                game_state.move_piece(ai_move[0], ai_move[1], True)
-                            elif human_player == 'b':
-                                ai_move = ai.minimax_black(game_state, 3, -100000, 100000, True, Player.PLAYER_1)
-                                game_state.move_piece(ai_move[0], ai_move[1], True)
+                            if human_player == 'w' or human_player == 'b':
+                                ai_move = ai.search(game_state, 3).move
+                                if ai_move is not None:
+                                    game_state.move_piece(ai_move[0], ai_move[1], True)
                     else:
                         valid_moves = game_state.get_valid_moves((row, col))
                         if valid_moves is None:
@@ -196,7 +191,10 @@ def main():
 
         draw_game_state(screen, game_state, valid_moves, square_selected)
 
-        endgame = game_state.checkmate_stalemate_checker()
+        endgame = game_state.game_status()
+        if endgame != 3:
+            # report how the game ended, only on the frame it ends
+            game_state.checkmate_stalemate_checker()
         if endgame == 0:
             game_over = True
             draw_text(screen, "Black wins.")
@@ -4,3 +4,14 @@ class Player:
     EMPTY = -9
     PIECES = ['white_r', 'white_n', 'white_b', 'white_q', 'white_k', 'white_p',
               'black_r', 'black_n', 'black_b', 'black_q', 'black_k', 'black_p']
+
+
+class Backend:
+    BOARD = 'board'
+    BITBOARD = 'bitboard'
+
+
+class Bound:
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
@@ -0,0 +1,284 @@
+#
+# Material and piece-square scores for the static evaluation
+# game_state keeps each side's material and piece-square sums up to date as pieces come and go (see
+# game_state._set_square), so evaluating a position reads four numbers instead of scanning the board.
+# compute_scores is the full scan the running sums must always equal.
+# pawn_structure_score scores the pawns alone, so chess_ai can keep its results in a pawn hash table.
+#
+# The batch functions score many positions at once with NumPy, for analysing large sets of positions without a
+# Python loop per square. A position is encoded as 12 planes of 64 squares, one per colour and piece type in
+# PLANES order, and the batch score adds pawn structure and mobility terms to the material and piece-square scores.
+# The search does not use them: a position there is scored by reading the running sums, which costs less than one
+# NumPy call. NumPy is optional: without it everything but the batch functions still works.
+#
+import bitboard
+from enums import Player
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the same values as chess_ai.get_piece_value, a pawn is 10
+PIECE_VALUES = {"k": 1000, "q": 100, "r": 50, "b": 30, "n": 30, "p": 10}
+
+# pawn structure terms, a pawn is 10: per pawn sharing its file with one of its own pawns in front or behind,
+# per pawn with no pawn of its own on the files next to it, and per passed pawn by how many rows it has advanced
+DOUBLED_PAWN = -2
+ISOLATED_PAWN = -2
+PASSED_PAWN = [0, 2, 2, 3, 5, 8, 12, 0]
+
+# a bonus for a piece standing on each square, written from white's side: the first row is row 0, white's back rank
+_PIECE_SQUARE_TABLES = {
+    "p": [0, 0, 0, 0, 0, 0, 0, 0,
+          0, 0, 0, -2, -2, 0, 0, 0,
+          1, 0, -1, 0, 0, -1, 0, 1,
+          0, 0, 0, 2, 2, 0, 0, 0,
+          1, 1, 1, 3, 3, 1, 1, 1,
+          1, 1, 2, 3, 3, 2, 1, 1,
+          5, 5, 5, 5, 5, 5, 5, 5,
+          0, 0, 0, 0, 0, 0, 0, 0],
+    "n": [-5, -4, -3, -3, -3, -3, -4, -5,
+          -4, -2, 0, 1, 1, 0, -2, -4,
+          -3, 1, 1, 2, 2, 1, 1, -3,
+          -3, 0, 2, 2, 2, 2, 0, -3,
+          -3, 1, 2, 2, 2, 2, 1, -3,
+          -3, 0, 1, 2, 2, 1, 0, -3,
+          -4, -2, 0, 0, 0, 0, -2, -4,
+          -5, -4, -3, -3, -3, -3, -4, -5],
+    "b": [-2, -1, -1, -1, -1, -1, -1, -2,
+          -1, 1, 0, 0, 0, 0, 1, -1,
+          -1, 1, 1, 1, 1, 1, 1, -1,
+          -1, 0, 1, 1, 1, 1, 0, -1,
+          -1, 1, 1, 1, 1, 1, 1, -1,
+          -1, 0, 1, 1, 1, 1, 0, -1,
+          -1, 0, 0, 0, 0, 0, 0, -1,
+          -2, -1, -1, -1, -1, -1, -1, -2],
+    "r": [0, 0, 0, 1, 1, 0, 0, 0,
+          -1, 0, 0, 0, 0, 0, 0, -1,
+          -1, 0, 0, 0, 0, 0, 0, -1,
+          -1, 0, 0, 0, 0, 0, 0, -1,
+          -1, 0, 0, 0, 0, 0, 0, -1,
+          -1, 0, 0, 0, 0, 0, 0, -1,
+          1, 1, 1, 1, 1, 1, 1, 1,
+          0, 0, 0, 0, 0, 0, 0, 0],
+    "q": [-2, -1, -1, 0, 0, -1, -1, -2,
+          -1, 0, 0, 0, 0, 0, 0, -1,
+          -1, 0, 1, 1, 1, 1, 0, -1,
+          0, 0, 1, 1, 1, 1, 0, 0,
+          0, 0, 1, 1, 1, 1, 0, 0,
+          -1, 0, 1, 1, 1, 1, 0, -1,
+          -1, 0, 0, 0, 0, 0, 0, -1,
+          -2, -1, -1, 0, 0, -1, -1, -2],
+    "k": [2, 3, 1, 0, 0, 1, 3, 2,
+          2, 2, 0, 0, 0, 0, 2, 2,
+          -1, -2, -2, -2, -2, -2, -2, -1,
+          -2, -3, -3, -4, -4, -3, -3, -2,
+          -3, -4, -4, -5, -5, -4, -4, -3,
+          -3, -4, -4, -5, -5, -4, -4, -3,
+          -3, -4, -4, -5, -5, -4, -4, -3,
+          -3, -4, -4, -5, -5, -4, -4, -3],
+}
+
+# PIECE_SQUARE_SCORES[player][piece name][square index], black's squares are white's mirrored across the board
+PIECE_SQUARE_SCORES = {
+    Player.PLAYER_1: {name: list(table) for name, table in _PIECE_SQUARE_TABLES.items()},
+    Player.PLAYER_2: {name: [table[square ^ 56] for square in range(64)]
+                      for name, table in _PIECE_SQUARE_TABLES.items()},
+}
+
+
+def compute_scores(game_state):
+    '''
+    the full scan: each side's material and piece-square score, as two dictionaries keyed by player
+    '''
+    material = {Player.PLAYER_1: 0, Player.PLAYER_2: 0}
+    piece_square = {Player.PLAYER_1: 0, Player.PLAYER_2: 0}
+    for row in range(8):
+        for col in range(8):
+            if game_state.is_valid_piece(row, col):
+                piece = game_state.get_piece(row, col)
+                player, name = piece.get_player(), piece.get_name()
+                material[player] += PIECE_VALUES[name]
+                piece_square[player] += PIECE_SQUARE_SCORES[player][name][row * 8 + col]
+    return material, piece_square
+
+
+_FILES = [sum(1 << (row * 8 + col) for row in range(8)) for col in range(8)]
+_NEIGHBOUR_FILES = [(_FILES[col - 1] if col > 0 else 0) | (_FILES[col + 1] if col < 7 else 0) for col in range(8)]
+# _PASSED_MASKS[player][square]: the squares an opponent pawn must not stand on for a pawn of player on square to be
+# passed, on its own file and the files next to it, in front of it
+_PASSED_MASKS = {
+    Player.PLAYER_1: [(_FILES[square % 8] | _NEIGHBOUR_FILES[square % 8]) & ~((1 << (square // 8 * 8 + 8)) - 1)
+                      for square in range(64)],
+    Player.PLAYER_2: [(_FILES[square % 8] | _NEIGHBOUR_FILES[square % 8]) & ((1 << (square // 8 * 8)) - 1)
+                      for square in range(64)],
+}
+
+
+def _side_pawn_structure(player, pawns, opponent_pawns):
+    score = 0
+    for col in range(8):
+        count = bin(pawns & _FILES[col]).count("1")
+        if count > 1:
+            score += DOUBLED_PAWN * (count - 1)
+        if count and not pawns & _NEIGHBOUR_FILES[col]:
+            score += ISOLATED_PAWN * count
+    for square in bitboard.bitboard_squares(pawns):
+        if not opponent_pawns & _PASSED_MASKS[player][square]:
+            score += PASSED_PAWN[square // 8 if player is Player.PLAYER_1 else 7 - square // 8]
+    return score
+
+
+def pawn_structure_score(white_pawns, black_pawns):
+    '''
+    the doubled, isolated and passed pawn terms for white minus those for black, from the two pawn bitboards
+    '''
+    return _side_pawn_structure(Player.PLAYER_1, white_pawns, black_pawns) - \
+        _side_pawn_structure(Player.PLAYER_2, black_pawns, white_pawns)
+
+
+# (player, piece name) of each plane of an encoded position
+PLANES = [(player, name) for player in (Player.PLAYER_1, Player.PLAYER_2) for name in ("p", "n", "b", "r", "q", "k")]
+# batch score term, per square a side attacks that its own pieces do not stand on
+MOBILITY = 1
+
+_ROOK_DIRECTIONS = [(0, +1), (0, -1), (+1, 0), (-1, 0)]
+_BISHOP_DIRECTIONS = [(+1, +1), (+1, -1), (-1, -1), (-1, +1)]
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("batch evaluation needs numpy")
+
+
+def encode_positions(game_states):
+    '''
+    encode game states for evaluate_batch
+    returns the planes as an array of shape (positions, 12, 64) with a 1 where a piece stands, and an array of
+    whether it is white's turn in each position
+    '''
+    _require_numpy()
+    bitboards = [[game_state.get_bitboard(player, name) for player, name in PLANES] for game_state in game_states]
+    white_turn = numpy.array([game_state.whose_turn() for game_state in game_states], dtype=bool)
+    return _unpack_planes(bitboards), white_turn
+
+
+def _unpack_planes(bitboards):
+    # a list of 12 bitboards per position to an array of shape (positions, 12, 64)
+    bitboards = numpy.array(bitboards, dtype="<u8").reshape(-1, len(PLANES))
+    return numpy.unpackbits(bitboards.view(numpy.uint8), bitorder="little").reshape(-1, len(PLANES), 64)
+
+
+def _weights():
+    # material and piece-square score of every plane and square, positive for white and negative for black
+    weights = numpy.zeros((len(PLANES), 64), dtype=numpy.int64)
+    for plane, (player, name) in enumerate(PLANES):
+        sign = 1 if player is Player.PLAYER_1 else -1
+        weights[plane] = sign * (PIECE_VALUES[name] + numpy.array(PIECE_SQUARE_SCORES[player][name]))
+    return weights
+
+
+def _attack_matrix(attacks):
+    # attacks[square] is a bitboard, the matrix has a row per square with a 1 for every square it attacks,
+    # in floating point so multiplying by it goes through the fast matrix routines
+    return numpy.array([[attacks[square] >> target & 1 for target in range(64)] for square in range(64)],
+                       dtype=numpy.float32)
+
+
+_tables = {}
+
+
+def _get_tables():
+    # built on first use so importing this module never needs numpy
+    if not _tables:
+        _tables["weights"] = _weights()
+        _tables["n"] = _attack_matrix(bitboard.KNIGHT_ATTACKS)
+        _tables["k"] = _attack_matrix(bitboard.KING_ATTACKS)
+        for player in (Player.PLAYER_1, Player.PLAYER_2):
+            _tables[player] = _attack_matrix(bitboard.PAWN_ATTACKS[player])
+        _tables["passed"] = numpy.array(PASSED_PAWN)
+    return _tables
+
+
+def _shift(squares, row_change, col_change):
+    # move every square of a (positions, 8, 8) array by row_change and col_change, dropping what leaves the board
+    shifted = numpy.zeros_like(squares)
+    rows, cols = squares.shape[1], squares.shape[2]
+    shifted[:, max(row_change, 0):rows + min(row_change, 0), max(col_change, 0):cols + min(col_change, 0)] = \
+        squares[:, max(-row_change, 0):rows + min(-row_change, 0), max(-col_change, 0):cols + min(-col_change, 0)]
+    return shifted
+
+
+def attack_maps_batch(planes):
+    '''
+    the squares each side attacks, as two boolean arrays of shape (positions, 64) for white and black,
+    the same squares game_state.get_attack_map gives
+    '''
+    _require_numpy()
+    tables = _get_tables()
+    counts = planes.astype(numpy.float32)
+    planes = planes.astype(bool)
+    empty = ~planes.any(axis=1).reshape(-1, 8, 8)
+    attack_maps = []
+    for offset, player in ((0, Player.PLAYER_1), (6, Player.PLAYER_2)):
+        bishops, rooks, queens = (planes[:, offset + index] for index in (2, 3, 4))
+        attacked = (counts[:, offset] @ tables[player] + counts[:, offset + 1] @ tables["n"] +
+                    counts[:, offset + 5] @ tables["k"]) > 0
+        attacked = attacked.reshape(-1, 8, 8)
+        for sliders, directions in (((bishops | queens).reshape(-1, 8, 8), _BISHOP_DIRECTIONS),
+                                    ((rooks | queens).reshape(-1, 8, 8), _ROOK_DIRECTIONS)):
+            for row_change, col_change in directions:
+                ray = sliders
+                for _ in range(7):
+                    ray = _shift(ray, row_change, col_change)
+                    attacked |= ray
+                    ray = ray & empty
+        attack_maps.append(attacked.reshape(-1, 64))
+    return attack_maps[0], attack_maps[1]
+
+
+def _pawn_structure(pawns, opponent_pawns, forward):
+    # the pawn terms of one side, pawns are (positions, 8, 8) and forward is +1 for white and -1 for black
+    tables = _get_tables()
+    files = pawns.sum(axis=1)
+    score = DOUBLED_PAWN * numpy.maximum(files - 1, 0).sum(axis=1)
+    has_pawns = files > 0
+    neighbours = numpy.zeros_like(has_pawns)
+    neighbours[:, 1:] |= has_pawns[:, :-1]
+    neighbours[:, :-1] |= has_pawns[:, 1:]
+    score += ISOLATED_PAWN * (files * ~neighbours).sum(axis=1)
+
+    # a pawn is passed when no opponent pawn on its file or the files next to it stands in front of it, so turn
+    # the board round for black and find the furthest row of each file an opponent pawn stands on
+    if forward < 0:
+        pawns, opponent_pawns = pawns[:, ::-1], opponent_pawns[:, ::-1]
+    rows = numpy.arange(8).reshape(1, 8, 1)
+    furthest = numpy.where(opponent_pawns, rows, -1).max(axis=1)
+    blocking = furthest.copy()
+    blocking[:, 1:] = numpy.maximum(blocking[:, 1:], furthest[:, :-1])
+    blocking[:, :-1] = numpy.maximum(blocking[:, :-1], furthest[:, 1:])
+    passed = pawns & (rows >= blocking[:, numpy.newaxis, :])
+    score += (passed * tables["passed"].reshape(1, 8, 1)).sum(axis=(1, 2))
+    return score
+
+
+def evaluate_batch(planes, white_turn, pawn_structure=True, mobility=True):
+    '''
+    score encoded positions from the side to move's point of view, as an array of one score per position
+    with pawn_structure and mobility off it is the material and piece-square score chess_ai.evaluate gives
+    '''
+    _require_numpy()
+    tables = _get_tables()
+    scores = numpy.einsum("npq,pq->n", planes.astype(numpy.int64), tables["weights"])
+    if pawn_structure:
+        white_pawns = planes[:, 0].reshape(-1, 8, 8).astype(bool)
+        black_pawns = planes[:, 6].reshape(-1, 8, 8).astype(bool)
+        scores += _pawn_structure(white_pawns, black_pawns, +1) - _pawn_structure(black_pawns, white_pawns, -1)
+    if mobility:
+        white_attacks, black_attacks = attack_maps_batch(planes)
+        white_pieces = planes[:, :6].any(axis=1)
+        black_pieces = planes[:, 6:].any(axis=1)
+        scores += MOBILITY * ((white_attacks & ~white_pieces).sum(axis=1) - (black_attacks & ~black_pieces).sum(axis=1))
+    return numpy.where(white_turn, scores, -scores)
+
@@ -0,0 +1,55 @@
+#
+# The Evaluation Cache class
+# Remembers scores by a 64 bit key so the AI does not work out the same evaluation twice: chess_ai keeps one keyed by
+# the zobrist key for whole evaluations, and a pawn hash table keyed by the pawn key for the pawn structure terms,
+# which stay the same over the many positions that share one pawn skeleton.
+#
+# Like the transposition table, entries live in two flat arrays of 64 bit integers sized by a fixed memory budget.
+# Every key has one slot and a new entry always replaces the old one.
+#
+from array import array
+
+_ENTRY_BYTES = 16  # 8 bytes of key and 8 bytes of score
+# scores are stored with this added, so an empty slot (0) is never mistaken for a score
+_SCORE_OFFSET = 1 << 31
+
+
+class evaluation_cache:
+    def __init__(self, size_kb=1024):
+        # The number of slots is the largest power of two that fits the budget, so a key maps to one with a mask
+        slots = 1
+        while slots * 2 * _ENTRY_BYTES <= size_kb * 1024:
+            slots *= 2
+        self._slot_mask = slots - 1
+        self._keys = array('Q', bytes(slots * 8))
+        self._scores = array('Q', bytes(slots * 8))
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys = array('Q', bytes(len(self._keys) * 8))
+        self._scores = array('Q', bytes(len(self._scores) * 8))
+        self.probes = 0
+        self.hits = 0
+
+    def hit_rate(self):
+        # the share of probes that found their key, 0 before the first probe
+        return self.hits / self.probes if self.probes else 0.0
+
+    def probe(self, key):
+        # the score stored for key, or None
+        self.probes += 1
+        slot = key & self._slot_mask
+        score = self._scores[slot]
+        if score and self._keys[slot] == key:
+            self.hits += 1
+            return score - _SCORE_OFFSET
+        return None
+
+    def store(self, key, score):
+        slot = key & self._slot_mask
+        self._keys[slot] = key
+        self._scores[slot] = score + _SCORE_OFFSET
@@ -2,8 +2,9 @@ import unittest
 from unittest.mock import patch
 
 import chess_engine
+import moves
 from enums import Player
-from ai_engine import chess_ai
+from ai_engine import chess_ai, search_options, MATE_SCORE
 
 class integration_tests(unittest.TestCase):
 
@@ -31,25 +32,25 @@ class integration_tests(unittest.TestCase):
         1. Place a knight piece on the board at position (3, 4).
         2. Place two opponent pawns on the board at positions (1, 3) and (5, 5).
         3. Define the expected peaceful moves and takes.
-        4. Mock the knight's 'get_valid_peaceful_moves' and 'get_valid_piece_takes' methods
-           to return the expected peaceful moves and takes.
+        4. Mock the Knight class's 'get_valid_peaceful_moves' and 'get_valid_piece_takes' methods
+           to return the expected peaceful moves and takes (pieces have no instance dictionary to patch).
         5. Call the knight's 'get_valid_piece_moves' method to get the actual moves.
         6. Assert that the actual moves match the expected moves.
         """
         knight = chess_engine.Knight('n', 3, 4, Player.PLAYER_1)
-        self.test_game_state.board[3][4] = knight
+        self.test_game_state.set_piece(3, 4, knight)
 
         pawn1 = chess_engine.Pawn('p', 1, 3, Player.PLAYER_2)
         pawn2 = chess_engine.Pawn('p', 5, 5, Player.PLAYER_2)
-        self.test_game_state.board[1][3] = pawn1
-        self.test_game_state.board[5][5] = pawn2
+        self.test_game_state.set_piece(1, 3, pawn1)
+        self.test_game_state.set_piece(5, 5, pawn2)
         expected_peaceful_moves = [(1, 5), (2, 2), (2, 6), (4, 2), (4, 6), (5, 3)]
         expected_takes = [(1, 3), (5, 5)]
         expected_moves = expected_peaceful_moves + expected_takes
 
         # mocking the two functions to check only the logic of get_valid_piece_moves
-        with patch.object(knight, 'get_valid_peaceful_moves', return_value=expected_peaceful_moves), \
-                patch.object(knight, 'get_valid_piece_takes', return_value=expected_takes):
+        with patch.object(chess_engine.Knight, 'get_valid_peaceful_moves', return_value=expected_peaceful_moves), \
+                patch.object(chess_engine.Knight, 'get_valid_piece_takes', return_value=expected_takes):
             valid_moves = knight.get_valid_piece_moves(self.test_game_state)
             self.assertEqual(set(valid_moves), set(expected_moves))
 
@@ -90,14 +91,257 @@ class integration_tests(unittest.TestCase):
         """
         board = self.test_game_state
         knight = chess_engine.Knight('n', 3, 4, Player.PLAYER_1)
-        board.board[3][4] = knight
+        board.set_piece(3, 4, knight)
         pawn1 = chess_engine.Pawn('p', 1, 3, Player.PLAYER_2)
-        self.test_game_state.board[1][3] = pawn1
+        self.test_game_state.set_piece(1, 3, pawn1)
 
         with patch.object(chess_ai, 'get_piece_value', side_effect=self.side_effect):
             evaluation = self.chess_ai.evaluate_board(board, Player.PLAYER_1)
             self.assertEqual(evaluation, -20)
 
+    def test_iterative_deepening_respects_node_budget(self):
+        """
+        Test that iterative deepening returns a legal move within its node budget and leaves the game as it was.
+
+        Steps:
+        1. Start a new game and play the pawn moves (1, 3) to (3, 3) and (6, 4) to (4, 4).
+        2. Run the AI's 'iterative_deepening' with a budget of 200 nodes.
+        3. Assert that the returned move is one of white's legal moves.
+        4. Assert that the search stopped at the budget and that the move log and zobrist key are unchanged.
+        """
+        game = chess_engine.game_state()
+        game.move_piece((1, 3), (3, 3), True)
+        game.move_piece((6, 4), (4, 4), True)
+        zobrist_key = game.zobrist_key
+
+        move = self.chess_ai.iterative_deepening(game, node_limit=200)
+        self.assertIn(move, game.get_all_legal_moves(Player.PLAYER_1))
+        self.assertLessEqual(self.chess_ai.nodes, 201)
+        self.assertEqual(2, len(game.move_log))
+        self.assertEqual(zobrist_key, game.zobrist_key)
+
+    def test_move_ordering(self):
+        """
+        Test that the AI orders moves as hash move, captures by MVV-LVA, killer moves and then quiet moves by history.
+
+        Steps:
+        1. Place a white queen at (3, 3) and a white pawn at (2, 2), with black pawns at (4, 3) and (3, 1) and a black rook at (3, 6).
+        2. Record a killer move and a history score for two of the queen's quiet moves.
+        3. Order white's moves, packed, with a quiet move given as the hash move.
+        4. Assert that the hash move comes first, then the rook capture, then the pawn captures with the pawn's own
+           capture before the queen's, then the killer move, then the quiet move with the history score.
+        """
+        board = self.test_game_state
+        board.set_piece(3, 3, chess_engine.Queen('q', 3, 3, Player.PLAYER_1))
+        board.set_piece(2, 2, chess_engine.Pawn('p', 2, 2, Player.PLAYER_1))
+        board.set_piece(4, 3, chess_engine.Pawn('p', 4, 3, Player.PLAYER_2))
+        board.set_piece(3, 1, chess_engine.Pawn('p', 3, 1, Player.PLAYER_2))
+        board.set_piece(3, 6, chess_engine.Rook('r', 3, 6, Player.PLAYER_2))
+        self.chess_ai.killer_moves[0][0] = board.pack_move((3, 3), (5, 5))
+        self.chess_ai.history[(3 * 8 + 3) + (0 * 8 + 3) * 64] = 50
+
+        packed_moves = [board.pack_move((row, col), move) for row, col in ((3, 3), (2, 2))
+                        for move in board.get_piece(row, col).get_valid_piece_moves(board)]
+        ordered = [moves.decode_move(move) for move in
+                   self.chess_ai._order_moves(board, packed_moves, board.pack_move((3, 3), (3, 4)), 0)]
+        self.assertEqual([((3, 3), (3, 4)), ((3, 3), (3, 6)), ((2, 2), (3, 1)), ((3, 3), (3, 1)),
+                          ((3, 3), (4, 3)), ((3, 3), (5, 5)), ((3, 3), (0, 3))], ordered[:7])
+
+    def test_quiescence_search_sees_recapture(self):
+        """
+        Test that the quiescence search plays out captures and stops when taking would lose material.
+
+        Steps:
+        1. Place a white queen at (3, 3) and a black pawn at (4, 4), defended by a black pawn at (5, 5).
+        2. Assert that the captures-only generator lists the queen taking the pawn.
+        3. Assert that the quiescence score for white, the side to move, stays at the standing material (100 - 20),
+           because the queen would be taken back.
+        4. Remove the defending pawn and assert that the score now includes winning the pawn (100).
+        The AI evaluates material only, so the scores do not depend on the positional terms.
+        """
+        material_ai = chess_ai(options=search_options(piece_square_tables=False, pawn_structure=False))
+        board = self.test_game_state
+        board.set_piece(3, 3, chess_engine.Queen('q', 3, 3, Player.PLAYER_1))
+        board.set_piece(4, 4, chess_engine.Pawn('p', 4, 4, Player.PLAYER_2))
+        board.set_piece(5, 5, chess_engine.Pawn('p', 5, 5, Player.PLAYER_2))
+        self.assertEqual([((3, 3), (4, 4))], board.get_all_legal_captures(Player.PLAYER_1))
+        self.assertEqual(80, material_ai.quiescence_search(board, -100000, 100000))
+
+        board.set_piece(5, 5, Player.EMPTY)
+        self.assertEqual(100, material_ai.quiescence_search(board, -100000, 100000))
+        self.assertEqual(0, len(board.move_log))
+
+    def test_quiescence_search_scores_mate_after_capture(self):
+        """
+        Test that the quiescence search scores a capture that checkmates as a mate, not as the material it wins.
+
+        Steps:
+        1. Place the black king at (7, 0) behind black pawns at (6, 0) and (6, 1), a black knight at (7, 5),
+           a white rook at (2, 5) and the white king at (0, 3), with no castling rights, white to move.
+        2. Assert that the rook taking the knight is white's only capture.
+        3. Assert that the quiescence score for white is a mate one ply away, since black is in check after the
+           capture and has no evasion, instead of standing pat.
+        """
+        board = self.test_game_state
+        board.set_piece(7, 0, chess_engine.King('k', 7, 0, Player.PLAYER_2))
+        board.set_piece(6, 0, chess_engine.Pawn('p', 6, 0, Player.PLAYER_2))
+        board.set_piece(6, 1, chess_engine.Pawn('p', 6, 1, Player.PLAYER_2))
+        board.set_piece(7, 5, chess_engine.Knight('n', 7, 5, Player.PLAYER_2))
+        board.set_piece(2, 5, chess_engine.Rook('r', 2, 5, Player.PLAYER_1))
+        board.set_piece(0, 3, chess_engine.King('k', 0, 3, Player.PLAYER_1))
+        board.white_king_can_castle = [False, False, False]
+        board.black_king_can_castle = [False, False, False]
+
+        self.assertEqual([((2, 5), (7, 5))], board.get_all_legal_captures(Player.PLAYER_1))
+        self.assertEqual(MATE_SCORE - 1, self.chess_ai.quiescence_search(board, -MATE_SCORE - 1, MATE_SCORE + 1))
+        self.assertEqual(0, len(board.move_log))
+
+    def test_search_finds_mate_in_one(self):
+        """
+        Test that the negamax search finds a mate in one for black and reports it in its result.
+
+        Steps:
+        1. Start a new game and play (1, 2) to (2, 2), (6, 3) to (4, 3) and (1, 1) to (3, 1), leaving black to move.
+        2. Call the AI's 'search' method with depth 2.
+        3. Assert that the best move is the queen moving from (7, 4) to (3, 0), scored as a mate one ply away,
+           with the principal variation starting with that move.
+        4. Assert that the search reports the depth it completed and the nodes it visited.
+        """
+        game = chess_engine.game_state()
+        game.move_piece((1, 2), (2, 2), True)
+        game.move_piece((6, 3), (4, 3), True)
+        game.move_piece((1, 1), (3, 1), True)
+
+        result = self.chess_ai.search(game, 2)
+        self.assertEqual(((7, 4), (3, 0)), result.move)
+        self.assertEqual(MATE_SCORE - 1, result.score)
+        self.assertEqual(((7, 4), (3, 0)), result.principal_variation[0])
+        self.assertEqual(2, result.depth)
+        self.assertGreater(result.nodes, 0)
+
+    def test_search_options_keep_the_score(self):
+        """
+        Test that principal variation search and aspiration windows change how the search runs but not its score.
+
+        Steps:
+        1. Start a new game and play the pawn moves (1, 3) to (3, 3) and (6, 4) to (4, 4).
+        2. Search the position to depth 3 with both options turned off and with both turned on, leaving the
+           selective search options off since they may change the score.
+        3. Assert that both searches return the same score.
+        """
+        game = chess_engine.game_state()
+        game.move_piece((1, 3), (3, 3), True)
+        game.move_piece((6, 4), (4, 4), True)
+
+        plain_ai = chess_ai(options=search_options(principal_variation_search=False, aspiration_windows=False,
+                                                   null_move_pruning=False, late_move_reductions=False,
+                                                   futility_pruning=False, razoring=False))
+        plain_result = plain_ai.search(game, 3)
+        self.assertEqual(0, plain_ai.re_searches)
+        result = chess_ai(options=search_options(null_move_pruning=False, late_move_reductions=False,
+                                                 futility_pruning=False, razoring=False)).search(game, 3)
+        self.assertEqual(plain_result.score, result.score)
+
+    def test_selective_search_statistics(self):
+        """
+        Test that null move pruning and late move reductions are used when switched on and skipped when switched off.
+
+        Steps:
+        1. Start a new game and play the knight moves (0, 1) to (2, 2) and (7, 1) to (5, 2).
+        2. Search the position to depth 4 with the default options and assert that null moves were tried
+           and moves were reduced.
+        3. Search it again with both switched off and assert that neither was used.
+        """
+        game = chess_engine.game_state()
+        game.move_piece((0, 1), (2, 2), True)
+        game.move_piece((7, 1), (5, 2), True)
+
+        self.assertIsNotNone(self.chess_ai.search(game, 4).move)
+        self.assertGreater(self.chess_ai.null_move_searches, 0)
+        self.assertGreater(self.chess_ai.reductions, 0)
+
+        plain_ai = chess_ai(options=search_options(null_move_pruning=False, late_move_reductions=False))
+        self.assertIsNotNone(plain_ai.search(game, 4).move)
+        self.assertEqual(0, plain_ai.null_move_searches)
+        self.assertEqual(0, plain_ai.reductions)
+        self.assertEqual(2, len(game.move_log))
+
+    def test_frontier_pruning_statistics(self):
+        """
+        Test that futility pruning and razoring skip work near the leaves only when switched on.
+
+        Steps:
+        1. Start a new game and play the pawn moves (1, 3) to (3, 3) and (6, 4) to (4, 4), so the pawns attack each other.
+        2. Search the position to depth 4 with the default options and assert that quiet moves were pruned
+           and nodes were razored.
+        3. Search it again with both switched off, assert that neither was used and that more nodes were searched.
+        """
+        game = chess_engine.game_state()
+        game.move_piece((1, 3), (3, 3), True)
+        game.move_piece((6, 4), (4, 4), True)
+
+        result = self.chess_ai.search(game, 4)
+        self.assertGreater(self.chess_ai.futility_prunes, 0)
+        self.assertGreater(self.chess_ai.razor_cutoffs, 0)
+
+        plain_ai = chess_ai(options=search_options(futility_pruning=False, razoring=False))
+        plain_result = plain_ai.search(game, 4)
+        self.assertEqual(0, plain_ai.futility_prunes)
+        self.assertEqual(0, plain_ai.razor_cutoffs)
+        self.assertGreater(plain_result.nodes, result.nodes)
+
+    def test_futility_pruning_keeps_checking_moves(self):
+        """
+        Test that futility pruning does not skip a quiet move that gives check.
+
+        Steps:
+        1. Place the black king at (7, 0) behind black pawns at (6, 0) and (6, 1), a white rook at (2, 5) and the
+           white king at (0, 3), with no castling rights, white to move.
+        2. Search the position one ply from the leaves with razoring off and an alpha far enough above the static
+           evaluation that the quiet moves are futile.
+        3. Assert that quiet moves were pruned, but that the rook moving to (7, 5), a quiet move that mates, was
+           still searched and scores as a mate two plies away.
+        """
+        board = self.test_game_state
+        board.set_piece(7, 0, chess_engine.King('k', 7, 0, Player.PLAYER_2))
+        board.set_piece(6, 0, chess_engine.Pawn('p', 6, 0, Player.PLAYER_2))
+        board.set_piece(6, 1, chess_engine.Pawn('p', 6, 1, Player.PLAYER_2))
+        board.set_piece(2, 5, chess_engine.Rook('r', 2, 5, Player.PLAYER_1))
+        board.set_piece(0, 3, chess_engine.King('k', 0, 3, Player.PLAYER_1))
+        board.white_king_can_castle = [False, False, False]
+        board.black_king_can_castle = [False, False, False]
+
+        futility_ai = chess_ai(options=search_options(razoring=False))
+        alpha = futility_ai.evaluate(board) + 1000
+        self.assertEqual(MATE_SCORE - 2, futility_ai._negamax(board, 1, alpha, alpha + 1, 1))
+        self.assertGreater(futility_ai.futility_prunes, 0)
+        self.assertEqual(0, len(board.move_log))
+
+    def test_parallel_search_finds_mate_in_one(self):
+        """
+        Test that the parallel root split search finds the same mate in one as the search on a single process.
+
+        Steps:
+        1. Start a new game and play (1, 2) to (2, 2), (6, 3) to (4, 3) and (1, 1) to (3, 1), leaving black to move.
+        2. Call the AI's 'parallel_search' method with depth 2 and two worker processes.
+        3. Assert that the best move is the queen moving from (7, 4) to (3, 0), scored as a mate one ply away.
+        4. Assert that the workers' nodes are counted and the game is left as it was.
+        """
+        game = chess_engine.game_state()
+        game.move_piece((1, 2), (2, 2), True)
+        game.move_piece((6, 3), (4, 3), True)
+        game.move_piece((1, 1), (3, 1), True)
+
+        try:
+            result = self.chess_ai.parallel_search(game, 2, workers=2)
+        finally:
+            self.chess_ai.close()
+        self.assertEqual(((7, 4), (3, 0)), result.move)
+        self.assertEqual(MATE_SCORE - 1, result.score)
+        self.assertEqual(2, result.depth)
+        self.assertGreater(result.nodes, 0)
+        self.assertEqual(3, len(game.move_log))
+
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,52 @@
+#
+# Packed integer moves
+# A move is a single int: the starting square index in bits 0-5, the ending square index in bits 6-11, the piece a
+# pawn promotes to in bits 12-14 (0 when it does not promote) and what kind of move it is in bits 15-18.
+# Square indexes are row * 8 + col, as for the bitboards.
+# Ints compare and hash faster than ((row, col), (row, col)) tuples, the search can tell captures and promotions
+# from quiet moves without looking at the board, and a game kept as ints is a list of small numbers.
+# 0 is never a move, since a move always ends on a different square than it starts on, so it stands for a null move.
+#
+NULL_MOVE = 0
+CAPTURE = 1 << 15
+CASTLE = 1 << 16
+EN_PASSANT = 1 << 17
+DOUBLE_PUSH = 1 << 18
+
+# the starting and ending squares together, which is also the index of chess_ai's history table
+SQUARES_MASK = 0xFFF
+_PROMOTION_SHIFT = 12
+PROMOTION_MASK = 0x7 << _PROMOTION_SHIFT
+PROMOTION_PIECES = (None, "n", "b", "r", "q")
+QUEEN_PROMOTION = PROMOTION_PIECES.index("q") << _PROMOTION_SHIFT
+
+
+def encode_move(starting_square, ending_square, promotion=None, flags=0):
+    # starting_square and ending_square are (row, col), promotion is a piece name, flags are the kinds of move above
+    move = starting_square[0] * 8 + starting_square[1] | (ending_square[0] * 8 + ending_square[1]) << 6 | flags
+    if promotion is not None:
+        move |= PROMOTION_PIECES.index(promotion) << _PROMOTION_SHIFT
+    return move
+
+
+def decode_move(move):
+    # the ((row, col), (row, col)) pair move_piece takes
+    return divmod(move & 0x3F, 8), divmod(move >> 6 & 0x3F, 8)
+
+
+def starting_index(move):
+    return move & 0x3F
+
+
+def ending_index(move):
+    return move >> 6 & 0x3F
+
+
+def with_promotion(move, promotion):
+    # the same move with the pawn promoting to the piece named promotion instead
+    return move & ~PROMOTION_MASK | PROMOTION_PIECES.index(promotion) << _PROMOTION_SHIFT
+
+
+def promotion_piece(move):
+    # the name of the piece the pawn promotes to, None if the move is not a promotion
+    return PROMOTION_PIECES[(move & PROMOTION_MASK) >> _PROMOTION_SHIFT]
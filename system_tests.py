@@ -1,5 +1,10 @@
+import random
 import unittest
 import chess_engine
+import moves
+import zobrist
+from ai_engine import chess_ai, search_options
+from enums import Player, Backend
 
 
 class system_tests(unittest.TestCase):
@@ -34,5 +39,310 @@ class system_tests(unittest.TestCase):
         board.move_piece((7, 4), (3, 0), False)
         self.assertEqual(board.checkmate_stalemate_checker(), 0)
 
+    def test_bitboard_backend_matches_board_backend(self):
+        """
+        Test that the bitboard backend generates exactly the same legal moves as the board backend.
+
+        Steps:
+        1. Create one game state per backend.
+        2. Play seeded random games on both, choosing from the board backend's legal moves.
+        3. Assert that both backends list the same legal moves before every move.
+        """
+        for seed in range(10):
+            randomizer = random.Random(seed)
+            board_game = chess_engine.game_state()
+            bitboard_game = chess_engine.game_state(Backend.BITBOARD)
+            for _ in range(60):
+                player = Player.PLAYER_1 if board_game.whose_turn() else Player.PLAYER_2
+                board_moves = board_game.get_all_legal_moves(player)
+                self.assertEqual(sorted(board_moves), sorted(bitboard_game.get_all_legal_moves(player)))
+                if not board_moves:
+                    break
+                move = randomizer.choice(board_moves)
+                board_game.move_piece(move[0], move[1], True)
+                bitboard_game.move_piece(move[0], move[1], True)
+
+    def test_full_game_bitboard_backend(self):
+        """
+        Test the checkmate sequence of test_full_game on the bitboard backend.
+        """
+        board = chess_engine.game_state(Backend.BITBOARD)
+        board.move_piece((1, 2), (2, 2), False)
+        board.move_piece((6, 3), (4, 3), False)
+        board.move_piece((1, 1), (3, 1), False)
+        board.move_piece((7, 4), (3, 0), False)
+        self.assertEqual(board.checkmate_stalemate_checker(), 0)
+
+    def test_zobrist_key_follows_moves_and_undos(self):
+        """
+        Test that the zobrist key identifies positions and is restored by undo_move.
+
+        Steps:
+        1. Play the knight moves (0, 1) to (2, 2) and (7, 1) to (5, 2), then (0, 6) to (2, 5) and (7, 6) to (5, 5).
+        2. Play the same moves on a second game in the other order and assert that both keys are equal.
+        3. Play seeded random moves and undo them with the debug check on, asserting that every undo restores the key
+           the position had before the move.
+        """
+        first_game = chess_engine.game_state(zobrist_debug=True)
+        second_game = chess_engine.game_state(zobrist_debug=True)
+        for move in (((0, 1), (2, 2)), ((7, 1), (5, 2)), ((0, 6), (2, 5)), ((7, 6), (5, 5))):
+            first_game.move_piece(move[0], move[1], True)
+        for move in (((0, 6), (2, 5)), ((7, 6), (5, 5)), ((0, 1), (2, 2)), ((7, 1), (5, 2))):
+            second_game.move_piece(move[0], move[1], True)
+        self.assertEqual(first_game.zobrist_key, second_game.zobrist_key)
+        self.assertNotEqual(chess_engine.game_state().zobrist_key, first_game.zobrist_key)
+
+        randomizer = random.Random(3)
+        keys = [first_game.zobrist_key]
+        for _ in range(80):
+            player = Player.PLAYER_1 if first_game.whose_turn() else Player.PLAYER_2
+            moves = first_game.get_all_legal_moves(player)
+            if not moves:
+                break
+            move = randomizer.choice(moves)
+            first_game.move_piece(move[0], move[1], True)
+            keys.append(first_game.zobrist_key)
+        while len(keys) > 1:
+            keys.pop()
+            first_game.undo_move()
+            self.assertEqual(keys[-1], first_game.zobrist_key)
+
+    def test_black_rook_move_changes_black_castling_rights(self):
+        """
+        Test that moving a black rook takes away black's castling on that side, in the flags and in the zobrist key.
+
+        Steps:
+        1. Play (1, 7) to (2, 7), (6, 0) to (4, 0) and (2, 7) to (3, 7), then move the black rook from (7, 0) to (5, 0).
+        2. Assert that only black's castling to the left is gone and that the zobrist key equals a full recompute.
+        3. Undo the rook move and assert that black's castling rights and the zobrist key are the ones from before it.
+        """
+        board = chess_engine.game_state()
+        for move in (((1, 7), (2, 7)), ((6, 0), (4, 0)), ((2, 7), (3, 7))):
+            board.move_piece(move[0], move[1], True)
+        zobrist_key = board.zobrist_key
+
+        board.move_piece((7, 0), (5, 0), True)
+        self.assertEqual([True, True, True], board.white_king_can_castle)
+        self.assertEqual([True, False, True], board.black_king_can_castle)
+        self.assertEqual(zobrist.compute_key(board), board.zobrist_key)
+
+        board.undo_move()
+        self.assertEqual([True, True, True], board.black_king_can_castle)
+        self.assertEqual(zobrist.compute_key(board), board.zobrist_key)
+        self.assertEqual(zobrist_key, board.zobrist_key)
+
+    def test_null_move_is_undone(self):
+        """
+        Test that a null move only passes the turn and that undo_move takes it back.
+
+        Steps:
+        1. Play the pawn move (1, 3) to (3, 3) with the zobrist debug check on.
+        2. Make a null move and assert that it is white's turn again, with a different zobrist key and the same pieces.
+        3. Undo the null move and assert that it is black's turn and the key is the one from before the null move.
+        """
+        board = chess_engine.game_state(zobrist_debug=True)
+        board.move_piece((1, 3), (3, 3), True)
+        zobrist_key = board.zobrist_key
+        pieces = [row[:] for row in board.board]
+
+        board.make_null_move()
+        self.assertTrue(board.whose_turn())
+        self.assertNotEqual(zobrist_key, board.zobrist_key)
+        self.assertEqual(pieces, [row[:] for row in board.board])
+
+        board.undo_move()
+        self.assertFalse(board.whose_turn())
+        self.assertEqual(zobrist_key, board.zobrist_key)
+        self.assertEqual(1, len(board.move_log))
+
+    def test_serialized_game_is_restored(self):
+        """
+        Test that a game sent to another process as its serialized form comes back as the same position.
+
+        Steps:
+        1. Play the pawn moves (1, 3) to (3, 3), (6, 4) to (4, 4) and (3, 3) to (4, 3) on the bitboard backend,
+           and the king move (7, 3) to (6, 4).
+        2. Serialize the game and deserialize it into a new game state.
+        3. Assert that the new game state has the same pieces, turn, castling flags, zobrist key and legal moves,
+           and serializes to the same data.
+        """
+        board = chess_engine.game_state(Backend.BITBOARD)
+        for move in (((1, 3), (3, 3)), ((6, 4), (4, 4)), ((3, 3), (4, 3)), ((7, 3), (6, 4))):
+            board.move_piece(move[0], move[1], True)
+
+        restored = chess_engine.game_state.deserialize(board.serialize())
+        self.assertEqual(board.serialize(), restored.serialize())
+        self.assertEqual(board.zobrist_key, restored.zobrist_key)
+        self.assertEqual(board.whose_turn(), restored.whose_turn())
+        self.assertEqual(board.black_king_can_castle, restored.black_king_can_castle)
+        self.assertEqual(sorted(board.get_all_legal_moves(Player.PLAYER_1)),
+                         sorted(restored.get_all_legal_moves(Player.PLAYER_1)))
+
+    def test_evaluation_sums_follow_random_games(self):
+        """
+        Test that the material and piece-square sums kept by the game state stay exact through whole random games.
+
+        Steps:
+        1. Play random legal moves for up to 150 plies with the evaluation debug check on, so every move and undo
+           compares the sums with a full scan, on both backends.
+        2. After every move assert that the AI's material only evaluation equals evaluate_board's full scan
+           for the side to move.
+        3. Undo every move and assert that the sums are back to the starting position's.
+        """
+        material_ai = chess_ai(options=search_options(piece_square_tables=False, pawn_structure=False))
+        rng = random.Random(5)
+        for backend in (Backend.BOARD, Backend.BITBOARD):
+            board = chess_engine.game_state(backend, evaluation_debug=True)
+            for _ in range(150):
+                player = Player.PLAYER_1 if board.whose_turn() else Player.PLAYER_2
+                moves = board.get_all_legal_moves(player)
+                if not moves:
+                    break
+                move = rng.choice(moves)
+                board.move_piece(move[0], move[1], True)
+                opponent = Player.PLAYER_2 if board.whose_turn() else Player.PLAYER_1
+                self.assertEqual(material_ai.evaluate_board(board, opponent), material_ai.evaluate(board))
+            while board.move_log:
+                board.undo_move()
+            self.assertEqual(1000 + 100 + 2 * 50 + 4 * 30 + 8 * 10, board.get_material(Player.PLAYER_1))
+            self.assertEqual(board.get_piece_square_score(Player.PLAYER_1),
+                             board.get_piece_square_score(Player.PLAYER_2))
+
+    def test_piece_lists_follow_random_games(self):
+        """
+        Test that each side's piece list stays exactly the pieces it has on the board through random games.
+
+        Steps:
+        1. Play random legal moves for up to 200 plies on both backends, so captures, castling, en passant and
+           promotions can all happen.
+        2. After every move and every undo, assert that white_pieces and black_pieces hold the same piece objects
+           as a scan of the board, that each piece is on the square it reports, and that get_pieces by name
+           matches the bitboard of that piece type.
+        """
+        def assert_piece_lists(board):
+            for player, pieces in ((Player.PLAYER_1, board.white_pieces), (Player.PLAYER_2, board.black_pieces)):
+                on_board = [piece for row in board.board for piece in row
+                            if piece is not Player.EMPTY and piece.get_player() is player]
+                self.assertEqual(sorted(map(id, on_board)), sorted(map(id, pieces)))
+                for piece in pieces:
+                    self.assertIs(piece, board.get_piece(piece.get_row_number(), piece.get_col_number()))
+                queens = board.get_pieces(player, "q")
+                self.assertEqual(bin(board.get_bitboard(player, "q")).count("1"), len(queens))
+                self.assertTrue(all(queen.get_name() == "q" for queen in queens))
+
+        rng = random.Random(11)
+        for backend in (Backend.BOARD, Backend.BITBOARD):
+            board = chess_engine.game_state(backend)
+            for _ in range(200):
+                player = Player.PLAYER_1 if board.whose_turn() else Player.PLAYER_2
+                moves = board.get_all_legal_moves(player)
+                if not moves:
+                    break
+                move = rng.choice(moves)
+                board.move_piece(move[0], move[1], True)
+                assert_piece_lists(board)
+            while board.move_log:
+                board.undo_move()
+                assert_piece_lists(board)
+            self.assertEqual(16, len(board.white_pieces))
+
+    def test_packed_moves_replay_a_game(self):
+        """
+        Test that packed moves describe the same moves as the (row, col) pairs and that a game can be replayed
+        from its packed move log.
+
+        Steps:
+        1. Play random legal moves for up to 120 plies on both backends, asserting before each move that the packed
+           legal moves decode to the same moves as the pairs and that the packed move log grows with the move played.
+        2. Replay the packed move log on a new game with make_move.
+        3. Assert that the replayed game reaches the same position and has the same packed move log.
+        """
+        rng = random.Random(23)
+        for backend in (Backend.BOARD, Backend.BITBOARD):
+            board = chess_engine.game_state(backend)
+            for _ in range(120):
+                player = Player.PLAYER_1 if board.whose_turn() else Player.PLAYER_2
+                pairs = board.get_all_legal_moves(player)
+                packed = board.get_all_legal_moves(player, packed=True)
+                self.assertEqual(pairs, [moves.decode_move(move) for move in packed])
+                if not packed:
+                    break
+                move = rng.choice(packed)
+                board.make_move(move)
+                self.assertEqual(move, board.get_packed_move_log()[-1])
+
+            replayed = chess_engine.game_state(backend)
+            for move in board.get_packed_move_log():
+                replayed.make_move(move)
+            self.assertEqual(board.serialize(), replayed.serialize())
+            self.assertEqual(board.zobrist_key, replayed.zobrist_key)
+            self.assertEqual(board.get_packed_move_log(), replayed.get_packed_move_log())
+
+    def test_move_log_is_packed_and_shown_on_demand(self):
+        """
+        Test that the move log keeps packed ints and that get_move_log builds the same moves as chess_move objects.
+
+        Steps:
+        1. Play random legal moves for up to 150 plies on both backends, making a null move every tenth ply.
+        2. Assert that every entry of the move log is an int.
+        3. Build the chess_move objects with get_move_log and assert that they pack back to the move log, with the
+           null moves marked as passed, the castling moves as castled and the promotions as promoted.
+        """
+        rng = random.Random(13)
+        for backend in (Backend.BOARD, Backend.BITBOARD):
+            board = chess_engine.game_state(backend)
+            for ply in range(150):
+                player = Player.PLAYER_1 if board.whose_turn() else Player.PLAYER_2
+                legal_moves = board.get_all_legal_moves(player, packed=True)
+                if not legal_moves:
+                    break
+                if ply % 10 == 9:
+                    board.make_null_move()
+                else:
+                    board.make_move(rng.choice(legal_moves))
+            self.assertTrue(all(type(move) is int for move in board.move_log))
+
+            logged_moves = board.get_move_log()
+            self.assertEqual(board.move_log, [logged_move.packed_move() for logged_move in logged_moves])
+            for move, logged_move in zip(board.move_log, logged_moves):
+                self.assertEqual(move == moves.NULL_MOVE, logged_move.passed)
+                self.assertEqual(bool(move & moves.CASTLE), logged_move.castled)
+                self.assertEqual(moves.promotion_piece(move) is not None, logged_move.pawn_promoted)
+
+    def test_undo_restores_every_position_exactly(self):
+        """
+        Test that undoing moves, null moves included, brings back every earlier position exactly.
+
+        Steps:
+        1. Play random legal moves for up to 120 plies on both backends, making a null move every tenth ply,
+           and record the serialized position, both zobrist keys, the material and the piece-square sums before
+           each one.
+        2. Undo every move and null move one at a time.
+        3. After each undo assert that the position and all of the recorded state are the ones from before that move.
+        """
+        def snapshot(board):
+            return (board.serialize(), board.zobrist_key, board.pawn_key,
+                    board.get_material(Player.PLAYER_1), board.get_material(Player.PLAYER_2),
+                    board.get_piece_square_score(Player.PLAYER_1), board.get_piece_square_score(Player.PLAYER_2))
+
+        rng = random.Random(31)
+        for backend in (Backend.BOARD, Backend.BITBOARD):
+            board = chess_engine.game_state(backend)
+            snapshots = []
+            for ply in range(120):
+                player = Player.PLAYER_1 if board.whose_turn() else Player.PLAYER_2
+                legal_moves = board.get_all_legal_moves(player, packed=True)
+                if not legal_moves:
+                    break
+                snapshots.append(snapshot(board))
+                if ply % 10 == 9:
+                    board.make_null_move()
+                else:
+                    board.make_move(rng.choice(legal_moves))
+            while snapshots:
+                board.undo_move()
+                self.assertEqual(snapshots.pop(), snapshot(board))
+            self.assertEqual([], board.move_log)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,147 @@
+#
+# The Transposition Table class
+# Remembers the result of searching a position so the AI does not search it again when a different move order
+# leads back to it.
+#
+# Entries live in two flat arrays of 64 bit integers, one for the zobrist keys and one for the packed data,
+# so the memory used is fixed by the size given in MB no matter how many positions are stored.
+# Every bucket has two slots: the first keeps the deepest search seen for its bucket, the second always takes the
+# newest entry that did not go into the first.
+#
+# shared_transposition_table keeps the same entries in a multiprocessing shared memory block so the worker processes
+# of a parallel search all probe and store into one table. It takes no locks: every slot stores the zobrist key
+# XORed with its data, so an entry torn by two processes writing the same slot at once no longer matches its key
+# and is treated as missing.
+#
+from array import array
+from multiprocessing import shared_memory
+
+_ENTRY_BYTES = 16  # 8 bytes of key and 8 bytes of data
+_SLOTS_PER_BUCKET = 2
+
+# Packed data layout, low bits first: move (19 bits), bound (2 bits), depth (8 bits), score (32 bits)
+# the move is a packed int of the moves module, which is never 0, so 0 means no move
+_MOVE_BITS = 19
+_BOUND_SHIFT = 19
+_DEPTH_SHIFT = 21
+_SCORE_SHIFT = 29
+_SCORE_OFFSET = 1 << 31
+
+
+class transposition_table:
+    def __init__(self, size_mb=16):
+        # The number of buckets is the largest power of two that fits the budget, so a key maps to one with a mask
+        buckets = 1
+        while buckets * 2 * _SLOTS_PER_BUCKET * _ENTRY_BYTES <= size_mb * 1024 * 1024:
+            buckets *= 2
+        self._bucket_mask = buckets - 1
+        self._keys = array('Q', bytes(buckets * _SLOTS_PER_BUCKET * 8))
+        self._data = array('Q', bytes(buckets * _SLOTS_PER_BUCKET * 8))
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def clear(self):
+        self._keys = array('Q', bytes(len(self._keys) * 8))
+        self._data = array('Q', bytes(len(self._data) * 8))
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, key):
+        '''
+        look up a position by its zobrist key
+        returns (depth, score, bound, move) or None if the position is not stored
+        '''
+        self.probes += 1
+        slot = (key & self._bucket_mask) * _SLOTS_PER_BUCKET
+        for index in (slot, slot + 1):
+            data = self._data[index]
+            if data and self._keys[index] == key:
+                self.hits += 1
+                return ((data >> _DEPTH_SHIFT) & 0xFF,
+                        ((data >> _SCORE_SHIFT) & 0xFFFFFFFF) - _SCORE_OFFSET,
+                        (data >> _BOUND_SHIFT) & 0x3,
+                        data & ((1 << _MOVE_BITS) - 1) or None)
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        # bound is one of Bound.EXACT, Bound.LOWER and Bound.UPPER, move is a packed move or None
+        data = ((score + _SCORE_OFFSET) << _SCORE_SHIFT) | (min(depth, 0xFF) << _DEPTH_SHIFT) | \
+               (bound << _BOUND_SHIFT) | (move or 0)
+        slot = (key & self._bucket_mask) * _SLOTS_PER_BUCKET
+        stored_data = self._data[slot]
+        if not stored_data or self._keys[slot] == key or depth >= (stored_data >> _DEPTH_SHIFT) & 0xFF:
+            index = slot
+        else:
+            index = slot + 1
+        self._keys[index] = key
+        self._data[index] = data
+
+
+class shared_transposition_table(transposition_table):
+    # name is None to create a new block of size_mb, or the name of a block created by another process to attach to it
+    def __init__(self, size_mb=16, name=None):
+        if name is None:
+            buckets = 1
+            while buckets * 2 * _SLOTS_PER_BUCKET * _ENTRY_BYTES <= size_mb * 1024 * 1024:
+                buckets *= 2
+            self._memory = shared_memory.SharedMemory(create=True, size=buckets * _SLOTS_PER_BUCKET * _ENTRY_BYTES)
+            self._memory.buf[:] = bytes(self._memory.size)
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        # the first half of the block holds the XORed keys and the second half the data
+        entries = self._memory.buf.cast('Q')
+        slots = len(entries) // 2
+        self._keys = entries[:slots]
+        self._data = entries[slots:]
+        self._bucket_mask = slots // _SLOTS_PER_BUCKET - 1
+        self.probes = 0
+        self.hits = 0
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def clear(self):
+        self._memory.buf[:] = bytes(self._memory.size)
+        self.probes = 0
+        self.hits = 0
+
+    def close(self):
+        # detach this process from the block, the process that created it must also call unlink() to free it
+        if self._keys is not None:
+            self._keys.release()
+            self._data.release()
+            self._keys = self._data = None
+            self._memory.close()
+
+    def unlink(self):
+        self._memory.unlink()
+
+    def probe(self, key):
+        self.probes += 1
+        slot = (key & self._bucket_mask) * _SLOTS_PER_BUCKET
+        for index in (slot, slot + 1):
+            data = self._data[index]
+            if data and self._keys[index] ^ data == key:
+                self.hits += 1
+                return ((data >> _DEPTH_SHIFT) & 0xFF,
+                        ((data >> _SCORE_SHIFT) & 0xFFFFFFFF) - _SCORE_OFFSET,
+                        (data >> _BOUND_SHIFT) & 0x3,
+                        data & ((1 << _MOVE_BITS) - 1) or None)
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        data = ((score + _SCORE_OFFSET) << _SCORE_SHIFT) | (min(depth, 0xFF) << _DEPTH_SHIFT) | \
+               (bound << _BOUND_SHIFT) | (move or 0)
+        slot = (key & self._bucket_mask) * _SLOTS_PER_BUCKET
+        stored_data = self._data[slot]
+        if not stored_data or self._keys[slot] ^ stored_data == key or \
+                depth >= (stored_data >> _DEPTH_SHIFT) & 0xFF:
+            index = slot
+        else:
+            index = slot + 1
+        self._keys[index] = key ^ data
+        self._data[index] = data
@@ -1,8 +1,18 @@
+import os
+import random
+import tempfile
 import unittest
 from unittest.mock import patch
 
+import bitboard
 import chess_engine
-from enums import Player
+import evaluation
+import moves
+import zobrist
+from ai_engine import chess_ai
+from enums import Player, Bound
+from evaluation_cache import evaluation_cache
+from transposition_table import transposition_table, shared_transposition_table
 
 
 class unit_tests(unittest.TestCase):
@@ -39,14 +49,14 @@ class unit_tests(unittest.TestCase):
         pawn6 = chess_engine.Pawn('p', 1, 5, Player.PLAYER_2)
         pawn7 = chess_engine.Pawn('p', 2, 6, Player.PLAYER_2)
         pawn8 = chess_engine.Pawn('p', 4, 6, Player.PLAYER_2)
-        board.board[5][3] = pawn1
-        board.board[5][5] = pawn2
-        board.board[4][2] = pawn3
-        board.board[2][2] = pawn4
-        board.board[1][3] = pawn5
-        board.board[1][5] = pawn6
-        board.board[2][6] = pawn7
-        board.board[4][6] = pawn8
+        board.set_piece(5, 3, pawn1)
+        board.set_piece(5, 5, pawn2)
+        board.set_piece(4, 2, pawn3)
+        board.set_piece(2, 2, pawn4)
+        board.set_piece(1, 3, pawn5)
+        board.set_piece(1, 5, pawn6)
+        board.set_piece(2, 6, pawn7)
+        board.set_piece(4, 6, pawn8)
         return board
 
     def test_knight_valid_piece_takes_1(self):
@@ -66,7 +76,7 @@ class unit_tests(unittest.TestCase):
         with patch.object(chess_engine.game_state, 'is_valid_piece', return_value=False):
             board = self.test_game_state
             knight = chess_engine.Knight('n', 3, 4, Player.PLAYER_1)
-            board.board[3][4] = knight
+            board.set_piece(3, 4, knight)
             expected_takes = []
             valid_takes = knight.get_valid_piece_takes(board)
             self.assertEqual(expected_takes, valid_takes)
@@ -89,7 +99,7 @@ class unit_tests(unittest.TestCase):
         with patch.object(chess_engine.game_state, 'is_valid_piece', return_value=False):
             board = self.test_game_state
             knight = chess_engine.Knight('n', 3, 4, Player.PLAYER_1)
-            board.board[3][4] = knight
+            board.set_piece(3, 4, knight)
             expected_moves = {(5, 3), (5, 5), (4, 6), (4, 2), (2, 2), (2, 6), (1, 3), (1, 5)}
             valid_moves = set(knight.get_valid_peaceful_moves(board))
             self.assertEqual(expected_moves, valid_moves)
@@ -111,8 +121,8 @@ class unit_tests(unittest.TestCase):
         board = self.test_game_state
         knight = chess_engine.Knight('n', 3, 4, Player.PLAYER_1)
         pawn = chess_engine.Pawn('p', 5, 3, Player.PLAYER_2)
-        board.board[3][4] = knight
-        board.board[5][3] = pawn
+        board.set_piece(3, 4, knight)
+        board.set_piece(5, 3, pawn)
         expected_takes = [(5, 3)]
         valid_takes = knight.get_valid_piece_takes(board)
         self.assertEqual(expected_takes, valid_takes)
@@ -135,8 +145,8 @@ class unit_tests(unittest.TestCase):
         board = self.test_game_state
         knight = chess_engine.Knight('n', 3, 4, Player.PLAYER_1)
         pawn = chess_engine.Pawn('p', 5, 3, Player.PLAYER_2)
-        board.board[3][4] = knight
-        board.board[5][3] = pawn
+        board.set_piece(3, 4, knight)
+        board.set_piece(5, 3, pawn)
         expected_takes = {(5, 5), (4, 6), (4, 2), (2, 2), (2, 6), (1, 3), (1, 5)}
         valid_takes = set(knight.get_valid_peaceful_moves(board))
         self.assertEqual(expected_takes, valid_takes)
@@ -159,7 +169,7 @@ class unit_tests(unittest.TestCase):
        """
         board = self._set_full_takes()
         knight = chess_engine.Knight('n', 3, 4, Player.PLAYER_1)
-        board.board[3][4] = knight
+        board.set_piece(3, 4, knight)
         expected_takes = {(5, 3), (5, 5), (4, 2), (2, 2), (1, 3), (1, 5), (2, 6), (4, 6)}
         valid_takes = set(knight.get_valid_piece_takes(board))
         self.assertEqual(expected_takes, valid_takes)
@@ -181,10 +191,375 @@ class unit_tests(unittest.TestCase):
        """
         board = self._set_full_takes()
         knight = chess_engine.Knight('n', 3, 4, Player.PLAYER_1)
-        board.board[3][4] = knight
+        board.set_piece(3, 4, knight)
         expected_takes = []
         valid_takes = knight.get_valid_peaceful_moves(board)
         self.assertEqual(expected_takes, valid_takes)
 
+    def test_rook_traverse(self):
+        """
+        Test the rook's peaceful moves and takes when its rays are blocked.
+
+        Steps:
+        1. Place a white rook at (3, 4), a white pawn at (3, 6) and a black pawn at (1, 4).
+        2. Call the rook's 'traverse' method.
+        3. Assert that the rook stops before its own pawn and takes the opposing pawn.
+        """
+        board = self.test_game_state
+        rook = chess_engine.Rook('r', 3, 4, Player.PLAYER_1)
+        board.set_piece(3, 4, rook)
+        board.set_piece(3, 6, chess_engine.Pawn('p', 3, 6, Player.PLAYER_1))
+        board.set_piece(1, 4, chess_engine.Pawn('p', 1, 4, Player.PLAYER_2))
+        peaceful_moves, piece_takes = rook.traverse(board)
+        self.assertEqual({(3, 3), (3, 2), (3, 1), (3, 0), (3, 5), (4, 4), (5, 4), (6, 4), (7, 4), (2, 4)},
+                         set(peaceful_moves))
+        self.assertEqual([(1, 4)], piece_takes)
+
+    def test_bishop_traverse_from_corner(self):
+        """
+        Test the bishop's moves from a corner, where three of its four rays are off the board.
+
+        Steps:
+        1. Place a black bishop at (7, 7) and a white pawn at (4, 4).
+        2. Call the bishop's 'traverse' method.
+        3. Assert that the bishop only moves along the one diagonal and takes the pawn.
+        """
+        board = self.test_game_state
+        bishop = chess_engine.Bishop('b', 7, 7, Player.PLAYER_2)
+        board.set_piece(7, 7, bishop)
+        board.set_piece(4, 4, chess_engine.Pawn('p', 4, 4, Player.PLAYER_1))
+        peaceful_moves, piece_takes = bishop.traverse(board)
+        self.assertEqual({(6, 6), (5, 5)}, set(peaceful_moves))
+        self.assertEqual([(4, 4)], piece_takes)
+
+    def test_queen_moves_combine_rook_and_bishop_lines(self):
+        """
+        Test that the queen's moves are the union of a rook's and a bishop's moves from the same square.
+
+        Steps:
+        1. Place a white queen at (3, 3) with a black knight at (5, 5) and a white pawn at (3, 6).
+        2. Assert that the queen's moves equal the rook's moves plus the bishop's moves from (3, 3).
+        """
+        board = self.test_game_state
+        queen = chess_engine.Queen('q', 3, 3, Player.PLAYER_1)
+        board.set_piece(3, 3, queen)
+        board.set_piece(5, 5, chess_engine.Knight('n', 5, 5, Player.PLAYER_2))
+        board.set_piece(3, 6, chess_engine.Pawn('p', 3, 6, Player.PLAYER_1))
+        rook_moves = chess_engine.Rook('r', 3, 3, Player.PLAYER_1).get_valid_piece_moves(board)
+        bishop_moves = chess_engine.Bishop('b', 3, 3, Player.PLAYER_1).get_valid_piece_moves(board)
+        self.assertEqual(set(rook_moves) | set(bishop_moves), set(queen.get_valid_piece_moves(board)))
+        self.assertIn((5, 5), queen.get_valid_piece_takes(board))
+
+    def test_pieces_use_slots(self):
+        """
+        Test that no kind of piece keeps a per-instance attribute dictionary.
+
+        Steps:
+        1. Make one piece of every kind.
+        2. Assert that none of them has a __dict__ and that setting an attribute the class does not declare fails.
+        """
+        for piece_class, name in ((chess_engine.Rook, 'r'), (chess_engine.Knight, 'n'), (chess_engine.Bishop, 'b'),
+                                  (chess_engine.Queen, 'q'), (chess_engine.King, 'k'), (chess_engine.Pawn, 'p')):
+            piece = piece_class(name, 3, 3, Player.PLAYER_1)
+            self.assertFalse(hasattr(piece, '__dict__'))
+            with self.assertRaises(AttributeError):
+                piece.scratch = 0
+
+    def test_pinned_piece_only_moves_along_pin(self):
+        """
+        Test that get_valid_moves drops the moves that would leave the king attacked.
+
+        Steps:
+        1. Place a white king at (0, 3), a white rook at (2, 3) and a black queen at (6, 3), pinning the rook.
+        2. Assert that the rook may only move along the column it is pinned on, including taking the queen.
+        3. Assert that the king may not step onto (1, 3), the square the queen would attack through the rook's line.
+        """
+        board = self.test_game_state
+        board.set_piece(0, 3, chess_engine.King('k', 0, 3, Player.PLAYER_1))
+        board.set_piece(2, 3, chess_engine.Rook('r', 2, 3, Player.PLAYER_1))
+        board.set_piece(6, 3, chess_engine.Queen('q', 6, 3, Player.PLAYER_2))
+        self.assertEqual({(1, 3), (3, 3), (4, 3), (5, 3), (6, 3)}, set(board.get_valid_moves((2, 3))))
+        board.set_piece(2, 3, Player.EMPTY)
+        self.assertNotIn((1, 3), board.get_valid_moves((0, 3)))
+        self.assertIn((1, 2), board.get_valid_moves((0, 3)))
+
+    def test_check_analysis_is_cached_per_position(self):
+        """
+        Test that the check and pin analysis is computed once per position and dropped when the position changes.
+
+        Steps:
+        1. Place a white king at (0, 3), a white rook at (2, 3) and a black queen at (6, 3).
+        2. Assert that the analysis reports the rook as pinned by the queen and that asking again returns the same object.
+        3. Move the rook off the column with set_piece and assert that the fresh analysis reports the queen's check.
+        """
+        board = self.test_game_state
+        board.set_piece(0, 3, chess_engine.King('k', 0, 3, Player.PLAYER_1))
+        board.set_piece(2, 3, chess_engine.Rook('r', 2, 3, Player.PLAYER_1))
+        board.set_piece(6, 3, chess_engine.Queen('q', 6, 3, Player.PLAYER_2))
+        analysis = board.get_check_analysis(Player.PLAYER_1)
+        self.assertEqual([[], [(2, 3)], [(6, 3)]], analysis)
+        board.get_valid_moves((2, 3))
+        self.assertIs(analysis, board.get_check_analysis(Player.PLAYER_1))
+        board.set_piece(2, 4, board.get_piece(2, 3))
+        board.set_piece(2, 3, Player.EMPTY)
+        self.assertEqual([[(6, 3)], [], []], board.get_check_analysis(Player.PLAYER_1))
+
+    def test_attack_maps_follow_board_changes(self):
+        """
+        Test that the attack maps are kept up to date and that castling reads them.
+
+        Steps:
+        1. Place a white king at (0, 3), a white rook at (0, 0) and a black rook at (5, 2).
+        2. Assert that (0, 2) is attacked once by black and that the king may not castle left across it.
+        3. Put a white pawn on (1, 2), blocking the black rook, and assert that (0, 2) is no longer attacked and castling left is allowed.
+        """
+        board = self.test_game_state
+        board.set_piece(0, 3, chess_engine.King('k', 0, 3, Player.PLAYER_1))
+        board.set_piece(0, 0, chess_engine.Rook('r', 0, 0, Player.PLAYER_1))
+        board.set_piece(5, 2, chess_engine.Rook('r', 5, 2, Player.PLAYER_2))
+        self.assertTrue(board.is_square_attacked((0, 2), Player.PLAYER_2))
+        self.assertEqual(1, board.get_attacker_count((0, 2), Player.PLAYER_2))
+        self.assertFalse(board.king_can_castle_left(Player.PLAYER_1))
+        self.assertNotIn((0, 1), board.get_valid_moves((0, 3)))
+        board.set_piece(1, 2, chess_engine.Pawn('p', 1, 2, Player.PLAYER_1))
+        self.assertFalse(board.is_square_attacked((0, 2), Player.PLAYER_2))
+        self.assertTrue(board.king_can_castle_left(Player.PLAYER_1))
+        self.assertIn((0, 1), board.get_valid_moves((0, 3)))
+
+    def test_game_status_is_pure(self):
+        """
+        Test that game_status tells stalemate from checkmate without printing or changing the game state,
+        and that checkmate_stalemate_checker still reports the end of the game.
+
+        Steps:
+        1. On the empty board, place the black king at (7, 0), a white queen at (5, 1) and the white king at (5, 2),
+           with black to move and no castling rights.
+        2. Assert that game_status returns 2 (stalemate), prints nothing and leaves the check flag unset.
+        3. Move the queen to (6, 1) and assert that game_status now returns 1 (black is checkmated).
+        4. Assert that checkmate_stalemate_checker returns the same and prints that black lost.
+        """
+        board = self.test_game_state
+        board.set_piece(7, 0, chess_engine.King('k', 7, 0, Player.PLAYER_2))
+        board.set_piece(5, 1, chess_engine.Queen('q', 5, 1, Player.PLAYER_1))
+        board.set_piece(5, 2, chess_engine.King('k', 5, 2, Player.PLAYER_1))
+        board.white_turn = False
+        board.white_king_can_castle = [False, False, False]
+        board.black_king_can_castle = [False, False, False]
+        with patch('builtins.print') as mock_print:
+            self.assertEqual(2, board.game_status())
+            self.assertEqual(2, board.game_status())
+        mock_print.assert_not_called()
+        self.assertFalse(board._is_check)
+
+        board.set_piece(5, 1, Player.EMPTY)
+        board.set_piece(6, 1, chess_engine.Queen('q', 6, 1, Player.PLAYER_1))
+        self.assertEqual(1, board.game_status())
+        with patch('builtins.print') as mock_print:
+            self.assertEqual(1, board.checkmate_stalemate_checker())
+        mock_print.assert_any_call("black lost")
+
+    def test_transposition_table_store_and_replace(self):
+        """
+        Test that the transposition table returns stored entries and follows its replacement scheme.
+
+        Steps:
+        1. Create a table of 1 MB and store an exact depth 4 entry with a packed best move.
+        2. Assert that probing the key returns the depth, score, bound and move, and that an unknown key returns None.
+        3. Store a shallower entry for a second key in the same bucket and assert that both keys can still be found.
+        4. Store a third key in the bucket and assert that it replaced the shallow entry, not the deep one.
+        """
+        table = transposition_table(1)
+        buckets = len(table) // 2
+        pawn_move = moves.encode_move((1, 3), (3, 3), flags=moves.DOUBLE_PUSH)
+        table.store(12345, 4, -250, Bound.EXACT, pawn_move)
+        self.assertEqual((4, -250, Bound.EXACT, pawn_move), table.probe(12345))
+        self.assertIsNone(table.probe(54321))
+
+        table.store(12345 + buckets, 1, 70, Bound.LOWER, None)
+        self.assertEqual((1, 70, Bound.LOWER, None), table.probe(12345 + buckets))
+        self.assertEqual(4, table.probe(12345)[0])
+
+        promotion = moves.encode_move((6, 0), (7, 1), "q", moves.CAPTURE)
+        table.store(12345 + 2 * buckets, 2, 0, Bound.UPPER, promotion)
+        self.assertEqual(4, table.probe(12345)[0])
+        self.assertIsNone(table.probe(12345 + buckets))
+        self.assertEqual((2, 0, Bound.UPPER, promotion), table.probe(12345 + 2 * buckets))
+
+    def test_shared_transposition_table(self):
+        """
+        Test that entries stored in a shared transposition table are found through another attachment to it,
+        and that an entry whose key and data no longer belong together is ignored.
+
+        Steps:
+        1. Create a shared table of 1 MB and attach a second table to it by name.
+        2. Store an entry through the first table and assert that the second one returns it.
+        3. Overwrite the data of that slot without its key, as a write torn between two processes would,
+           and assert that probing the key now returns None.
+        4. Clear the table through the second attachment and assert that the first one finds nothing.
+        """
+        table = shared_transposition_table(1)
+        attached = shared_transposition_table(name=table.name)
+        try:
+            self.assertEqual(len(table), len(attached))
+            pawn_move = moves.encode_move((6, 4), (4, 4), flags=moves.DOUBLE_PUSH)
+            table.store(12345, 3, -40, Bound.LOWER, pawn_move)
+            self.assertEqual((3, -40, Bound.LOWER, pawn_move), attached.probe(12345))
+
+            slot = (12345 & table._bucket_mask) * 2
+            attached._data[slot] ^= 1 << 40
+            self.assertIsNone(table.probe(12345))
+
+            table.store(12345, 3, -40, Bound.LOWER, None)
+            attached.clear()
+            self.assertIsNone(table.probe(12345))
+        finally:
+            attached.close()
+            table.close()
+            table.unlink()
+
+    def test_evaluation_cache_and_pawn_hash(self):
+        """
+        Test the evaluation cache on its own and the pawn hash table the AI fills while evaluating.
+
+        Steps:
+        1. Create a cache of 1 KB, store a score of 0 and a negative score and assert that both are found,
+           that an unknown key returns None and that the hit rate counts the probes.
+        2. Store a third key in the slot of the first and assert that it replaced it.
+        3. On the empty board, place white pawns at (1, 0) and (2, 0) and black pawns at (5, 1) and (6, 7) and
+           kings at (0, 3) and (7, 3), and assert that the pawn structure score is -4 for white.
+        4. Evaluate the position twice with the AI and assert that the pawn hash table was filled by the first
+           evaluation and the evaluation cache answered the second.
+        """
+        cache = evaluation_cache(1)
+        cache.store(7, 0)
+        cache.store(8, -35)
+        self.assertEqual(0, cache.probe(7))
+        self.assertEqual(-35, cache.probe(8))
+        self.assertIsNone(cache.probe(9))
+        self.assertAlmostEqual(2 / 3, cache.hit_rate())
+        cache.store(7 + len(cache), 12)
+        self.assertIsNone(cache.probe(7))
+        self.assertEqual(12, cache.probe(7 + len(cache)))
+
+        board = self.test_game_state
+        board.set_piece(1, 0, chess_engine.Pawn('p', 1, 0, Player.PLAYER_1))
+        board.set_piece(2, 0, chess_engine.Pawn('p', 2, 0, Player.PLAYER_1))
+        board.set_piece(5, 1, chess_engine.Pawn('p', 5, 1, Player.PLAYER_2))
+        board.set_piece(6, 7, chess_engine.Pawn('p', 6, 7, Player.PLAYER_2))
+        board.set_piece(0, 3, chess_engine.King('k', 0, 3, Player.PLAYER_1))
+        board.set_piece(7, 3, chess_engine.King('k', 7, 3, Player.PLAYER_2))
+        self.assertEqual(-4, evaluation.pawn_structure_score(board.get_bitboard(Player.PLAYER_1, "p"),
+                                                             board.get_bitboard(Player.PLAYER_2, "p")))
+        ai = chess_ai()
+        score = ai.evaluate(board)
+        self.assertEqual(-4, ai.pawn_hash_table.probe(board.pawn_key))
+        self.assertEqual(score, ai.evaluate(board))
+        self.assertEqual(1, ai.evaluation_cache.hits)
+
+    @unittest.skipIf(evaluation.numpy is None, "numpy is not installed")
+    def test_batch_evaluation(self):
+        """
+        Test the NumPy batch evaluation against the game state's own attack maps and running sums,
+        and its pawn structure terms on a small position.
+
+        Steps:
+        1. Encode the starting position and the position after the pawn move (1, 3) to (3, 3) in one batch.
+        2. Assert that the batch attack maps equal each game state's attack maps for both sides.
+        3. Assert that the batch score without the pawn structure and mobility terms equals the AI's evaluation.
+        4. On the empty board, place white pawns at (1, 0) and (2, 0) and black pawns at (5, 1) and (6, 7).
+        5. Assert that the pawn structure term for white to move is -4: white's pawns are doubled (-2) and
+           isolated (-4) and not passed, black's are isolated (-4) and the pawn at (6, 7) is passed (+2).
+        """
+        start = chess_engine.game_state()
+        moved = chess_engine.game_state()
+        moved.move_piece((1, 3), (3, 3), True)
+        planes, white_turn = evaluation.encode_positions([start, moved])
+        white_attacks, black_attacks = evaluation.attack_maps_batch(planes)
+        for index, game in enumerate((start, moved)):
+            self.assertEqual(game.get_attack_map(Player.PLAYER_1),
+                             sum(1 << square for square in range(64) if white_attacks[index][square]))
+            self.assertEqual(game.get_attack_map(Player.PLAYER_2),
+                             sum(1 << square for square in range(64) if black_attacks[index][square]))
+        scores = evaluation.evaluate_batch(planes, white_turn, pawn_structure=False, mobility=False)
+        ai = chess_ai()
+        self.assertEqual([ai.evaluate(start), ai.evaluate(moved)], list(scores))
+
+        board = self.test_game_state
+        board.set_piece(1, 0, chess_engine.Pawn('p', 1, 0, Player.PLAYER_1))
+        board.set_piece(2, 0, chess_engine.Pawn('p', 2, 0, Player.PLAYER_1))
+        board.set_piece(5, 1, chess_engine.Pawn('p', 5, 1, Player.PLAYER_2))
+        board.set_piece(6, 7, chess_engine.Pawn('p', 6, 7, Player.PLAYER_2))
+        planes, white_turn = evaluation.encode_positions([board])
+        with_pawns = evaluation.evaluate_batch(planes, white_turn, mobility=False)
+        without_pawns = evaluation.evaluate_batch(planes, white_turn, pawn_structure=False, mobility=False)
+        self.assertEqual(-4, with_pawns[0] - without_pawns[0])
+
+    def test_magic_lookups_match_ray_walk(self):
+        """
+        Test the magic bitboard lookups against the ray walking reference on random occupancies.
+
+        Steps:
+        1. Build the magic tables, going through a cache file so that reading the cache is covered too.
+        2. Assert that the rook and bishop lookups equal the ray walk for random squares and occupancies.
+        """
+        with tempfile.TemporaryDirectory() as cache_directory:
+            cache_path = os.path.join(cache_directory, "magic_tables.bin")
+            bitboard.load_magic_tables(cache_path)
+            bitboard.load_magic_tables(cache_path)
+        randomizer = random.Random(0)
+        for _ in range(2000):
+            square = randomizer.randrange(64)
+            occupied = randomizer.getrandbits(64) & randomizer.getrandbits(64)
+            self.assertEqual(bitboard.ray_rook_attacks(square, occupied), bitboard.rook_attacks(square, occupied))
+            self.assertEqual(bitboard.ray_bishop_attacks(square, occupied),
+                             bitboard.bishop_attacks(square, occupied))
+
+    def test_magic_cache_for_other_magics_is_rebuilt(self):
+        """
+        Test that a magic table cache written for different magic numbers is not loaded.
+
+        Steps:
+        1. Build the magic tables through a cache file and assert that the cache reads back.
+        2. Change one rook magic without changing the shifts and assert that the cache is rejected.
+        3. Load the tables with the changed magic and assert that the cache is rewritten for it, and so is rejected
+           once the magic is back.
+        """
+        with tempfile.TemporaryDirectory() as cache_directory:
+            cache_path = os.path.join(cache_directory, "magic_tables.bin")
+            bitboard.load_magic_tables(cache_path)
+            self.assertIsNotNone(bitboard._read_magic_cache(cache_path))
+
+            rook_magics = list(bitboard.ROOK_MAGICS)
+            rook_magics[0] ^= 1
+            with patch.object(bitboard, 'ROOK_MAGICS', rook_magics):
+                self.assertIsNone(bitboard._read_magic_cache(cache_path))
+                bitboard.load_magic_tables(cache_path)
+                self.assertIsNotNone(bitboard._read_magic_cache(cache_path))
+            self.assertIsNone(bitboard._read_magic_cache(cache_path))
+        # rebuild the tables for the real magics
+        bitboard.load_magic_tables()
+
+    def test_board_rows_are_read_only(self):
+        """
+        Test that pieces can only be placed through set_piece, so the derived state never goes stale.
+
+        Steps:
+        1. Assert that writing a piece straight into a row of the board raises a TypeError and changes nothing.
+        2. Place the same piece with set_piece.
+        3. Assert that the piece is on the board, in the piece list and the occupancy, and that the zobrist key
+           equals a full recompute.
+        """
+        board = self.test_game_state
+        rook = chess_engine.Rook('r', 3, 3, Player.PLAYER_1)
+        with self.assertRaises(TypeError):
+            board.board[3][3] = rook
+        self.assertEqual(Player.EMPTY, board.get_piece(3, 3))
+
+        board.set_piece(3, 3, rook)
+        self.assertIs(rook, board.get_piece(3, 3))
+        self.assertEqual([rook], board.get_pieces(Player.PLAYER_1))
+        self.assertEqual(bitboard.square_bit(3, 3), board.get_occupancy())
+        self.assertEqual(zobrist.compute_key(board), board.zobrist_key)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,65 @@
+#
+# Zobrist keys for identifying chess positions
+# Every piece on every square, the side to move, each castling flag and the en passant file get a random 64 bit key.
+# A position's key is the XOR of the keys of everything true about it, so a move only XORs the keys that change.
+# The keys come from a fixed seed so the same position has the same key in every run.
+#
+import random
+
+from enums import Player
+
+_random = random.Random(0x5A0B1157)
+
+# PIECE_KEYS[player][piece name][square index]
+PIECE_KEYS = {player: {name: [_random.getrandbits(64) for _ in range(64)] for name in ("r", "n", "b", "q", "k", "p")}
+              for player in (Player.PLAYER_1, Player.PLAYER_2)}
+# XORed in while it is black's turn
+SIDE_KEY = _random.getrandbits(64)
+# CASTLING_KEYS[player][flag], one per entry of white_king_can_castle / black_king_can_castle
+CASTLING_KEYS = {player: [_random.getrandbits(64) for _ in range(3)] for player in (Player.PLAYER_1, Player.PLAYER_2)}
+# EN_PASSANT_KEYS[col] of the pawn that just moved forward by two
+EN_PASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)]
+
+
+def castling_key(white_king_can_castle, black_king_can_castle):
+    key = 0
+    for flag in range(3):
+        if white_king_can_castle[flag]:
+            key ^= CASTLING_KEYS[Player.PLAYER_1][flag]
+        if black_king_can_castle[flag]:
+            key ^= CASTLING_KEYS[Player.PLAYER_2][flag]
+    return key
+
+
+def en_passant_key(en_passant_previous):
+    # (-1, -1) when the last move was not a pawn moving forward by two
+    if en_passant_previous[0] < 0:
+        return 0
+    return EN_PASSANT_KEYS[en_passant_previous[1]]
+
+
+def compute_key(game_state):
+    # The full recompute, the incremental key kept by game_state must always equal it
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            if game_state.is_valid_piece(row, col):
+                piece = game_state.get_piece(row, col)
+                key ^= PIECE_KEYS[piece.get_player()][piece.get_name()][row * 8 + col]
+    if not game_state.whose_turn():
+        key ^= SIDE_KEY
+    key ^= castling_key(game_state.white_king_can_castle, game_state.black_king_can_castle)
+    key ^= en_passant_key(game_state.previous_piece_en_passant())
+    return key
+
+
+def compute_pawn_key(game_state):
+    # the key of the pawns alone, which the pawn hash table of the evaluation is indexed by
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            if game_state.is_valid_piece(row, col):
+                piece = game_state.get_piece(row, col)
+                if piece.get_name() == "p":
+                    key ^= PIECE_KEYS[piece.get_player()]["p"][row * 8 + col]
+    return key